@@ -0,0 +1,142 @@
+"""大きなテーブルの Admin 一覧向けページング（推定件数 + キーセットの「次へ」）。
+
+EstimatedCountPaginator は PostgreSQL のプランナ統計から件数を推定し、毎回の COUNT(*) を避ける。
+絞り込みなしは pg_class.reltuples、絞り込みありは EXPLAIN の推定行数を使う。
+推定が ESTIMATED_COUNT_THRESHOLD 未満のとき（と PostgreSQL 以外）は正確に数える。
+
+KeysetPaginationAdmin はログ系モデル用。主キーの降順で並べ、「次へ」は OFFSET ではなく
+?after=<最後の行の pk> で続きを読む（深いページでも先頭ページと同じコスト）。
+件数は after を掛けない一覧全体で数えるので、どのページでも同じ「約 n 件」を表示する。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+# これ未満と推定された一覧は正確に数える（小さい件数のずれは目立つため）
+ESTIMATED_COUNT_THRESHOLD = 10000
+KEYSET_VAR = "after"
+
+
+class EstimatedCountPaginator(Paginator):
+    """件数を PostgreSQL の統計から推定する Paginator（推定時は最終ページを切り詰めない）。"""
+
+    count_is_estimated = False
+
+    def _estimated_count(self) -> int | None:
+        queryset = self.object_list
+        if not hasattr(queryset, "query"):
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        try:
+            if not queryset.query.where:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                estimate = row[0] if row else None
+            else:
+                plan = json.loads(queryset.order_by().explain(format="json"))
+                estimate = int(plan[0]["Plan"]["Plan Rows"])
+        except (DatabaseError, KeyError, IndexError, TypeError, ValueError):
+            logger.warning("Admin count estimate failed for %s", queryset.model._meta.label)
+            return None
+        # reltuples は ANALYZE 前だと -1
+        if estimate is None or estimate < ESTIMATED_COUNT_THRESHOLD:
+            return None
+        return estimate
+
+    @cached_property
+    def count(self) -> int:
+        estimate = self._estimated_count()
+        if estimate is None:
+            return super().count
+        self.count_is_estimated = True
+        return estimate
+
+    def _counted_by_estimate(self) -> bool:
+        return bool(self.count) and self.count_is_estimated
+
+    def validate_number(self, number):
+        if not self._counted_by_estimate():
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer") from None
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if not self._counted_by_estimate():
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom : bottom + self.per_page], number, self)
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):  # type: ignore
+    """推定件数で数える一覧（「全 n 件」の 2 回目の COUNT も出さない）。"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/estimated_change_list.html"
+
+
+class KeysetChangeList(ChangeList):
+    """?after=<pk> で pk より古い行から表示する ChangeList（既定の並び順のときだけ有効）。"""
+
+    def __init__(self, request, *args, **kwargs):
+        # after は絞り込み条件ではないので、ChangeList が読む前に取り除く
+        params = request.GET.copy()
+        raw_after = params.pop(KEYSET_VAR, [""])[-1]
+        request.GET = params
+        self.keyset_enabled = ORDER_VAR not in params
+        self.keyset_after = None
+        if self.keyset_enabled and raw_after.isdigit():
+            self.keyset_after = int(raw_after)
+        self.keyset_first_url = None
+        self.keyset_next_url = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_results(self, request):
+        # 件数（result_count）は after を掛けない一覧全体で数える
+        super().get_results(request)
+        if not self.keyset_enabled or self.show_all:
+            return
+        # キーセットでは常に 1 ページ目（after より古い先頭 list_per_page 件）を表示する
+        self.page_num = 1
+        queryset = self.queryset
+        if self.keyset_after is not None:
+            queryset = queryset.filter(pk__lt=self.keyset_after)
+        rows = list(queryset[: self.list_per_page])
+        self.result_list = rows
+        if self.keyset_after is not None:
+            self.keyset_first_url = self.get_query_string(remove=[PAGE_VAR])
+        if len(rows) == self.list_per_page:
+            self.keyset_next_url = self.get_query_string(
+                {KEYSET_VAR: rows[-1].pk}, remove=[PAGE_VAR]
+            )
+
+
+class KeysetPaginationAdmin(EstimatedCountAdmin):
+    """ログ系モデルの一覧: 推定件数 + 主キー降順のキーセットページング。"""
+
+    ordering = ("-pk",)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
@@ -0,0 +1,98 @@
+"""大きなテーブルの Admin 検索（インデックスが効く形のクエリを組み立てる）。
+
+- UUID / メールアドレスそのものの検索語は、一意インデックスへの完全一致だけで引く。
+- 8 桁以上の 16 進数（一覧の「3f2a1b9c…」表示の貼り付け）は UUID の前方一致（範囲検索）も足す。
+- それ以外は search_fields の icontains。PostgreSQL では UPPER(col::text) LIKE になるので、
+  同じ式の pg_trgm GIN インデックス（各アプリの migration）がそのまま使われる。SQLite はそのまま走査。
+- 関連モデルの列は JOIN + OR ではなく search_related_fields のサブクエリ（pk__in）で絞る。
+  JOIN しないので DISTINCT も不要。
+"""
+
+from __future__ import annotations
+
+import operator
+import re
+import uuid
+from functools import reduce
+
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+UUID_PREFIX_RE = re.compile(r"^[0-9a-f]{8,31}$")
+
+
+def _parse_uuid(term: str) -> uuid.UUID | None:
+    try:
+        return uuid.UUID(term)
+    except ValueError:
+        return None
+
+
+def _uuid_prefix_range(term: str) -> tuple[uuid.UUID, uuid.UUID] | None:
+    digits = term.rstrip("…").replace("-", "").lower()
+    if not UUID_PREFIX_RE.match(digits):
+        return None
+    return uuid.UUID(digits.ljust(32, "0")), uuid.UUID(digits.ljust(32, "f"))
+
+
+def _search_terms(search_term: str) -> list[str]:
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            terms.append(bit)
+    return terms
+
+
+def _any_of(queries: list[Q]) -> Q:
+    return reduce(operator.or_, queries, Q(pk__in=[]))
+
+
+class IndexedSearchMixin:
+    """ModelAdmin に混ぜて使う検索（search_fields はこのモデル自身の文字列列だけにする）。"""
+
+    # 完全一致で引く UUID 列 / メールアドレス列（"creator__email" のような関連も可）
+    search_uuid_fields: tuple[str, ...] = ()
+    search_email_fields: tuple[str, ...] = ()
+    # {外部キー名: 関連モデル側の icontains 対象列}
+    search_related_fields: dict[str, tuple[str, ...]] = {}
+
+    def _exact_search_q(self, search_term: str) -> Q | None:
+        value = _parse_uuid(search_term)
+        if value is not None and self.search_uuid_fields:
+            return _any_of([Q(**{field: value}) for field in self.search_uuid_fields])
+        if EMAIL_RE.match(search_term) and self.search_email_fields:
+            return _any_of(
+                [Q(**{f"{field}__iexact": search_term}) for field in self.search_email_fields]
+            )
+        return None
+
+    def _term_q(self, term: str) -> Q:
+        queries = [Q(**{f"{field}__icontains": term}) for field in self.search_fields]
+        for relation, fields in self.search_related_fields.items():
+            related_model = self.model._meta.get_field(relation).related_model
+            matches = related_model._default_manager.filter(
+                _any_of([Q(**{f"{field}__icontains": term}) for field in fields])
+            ).values("pk")
+            queries.append(Q(**{f"{relation}__in": matches}))
+        prefix_range = _uuid_prefix_range(term)
+        if prefix_range:
+            queries.extend(
+                Q(**{f"{field}__range": prefix_range})
+                for field in self.search_uuid_fields
+                if "__" not in field
+            )
+        return _any_of(queries)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        exact = self._exact_search_q(search_term)
+        if exact is not None:
+            return queryset.filter(exact), False
+        for term in _search_terms(search_term):
+            queryset = queryset.filter(self._term_q(term))
+        return queryset, False
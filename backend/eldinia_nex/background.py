@@ -0,0 +1,89 @@
+"""リクエストの応答後に走らせる後続処理（プロセス内のスレッドプール）。
+
+submit_deduplicated はキーごとに cache.add で重複を排除するので、同じキーで
+window 秒以内に何度呼ばれても実行は 1 回にまとまる（複数プロセスでもキャッシュ共有なら有効）。
+キーの確保と投入はトランザクションのコミット後に行う（ロールバックされた呼び出しはキーを残さない）。
+DB 接続は実行の前後で close_old_connections する。
+
+タスクはプロセス内のキューにしか無いので、投入後・完了前にプロセスが再起動すると失われる。
+失われても後から追いつける処理だけをここに載せること:
+- 告知配信は AnnouncementDelivery の行が正なので、deliver_announcements（cron）が再実行する
+- クリエイター作品同期は sync_supabase_catalog（定期実行）が全件を同期し直す
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEDUPE_WINDOW_SECONDS = 60
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, getattr(settings, "BACKGROUND_TASK_WORKERS", 2)),
+                thread_name_prefix="eldinia-bg",
+            )
+        return _executor
+
+
+def _run(name: str, func: Callable[..., Any], args: tuple, kwargs: dict[str, Any]) -> None:
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:  # noqa: BLE001 — 後続処理の失敗で他のタスクを止めない
+        logger.exception("background task %s failed", name)
+    finally:
+        close_old_connections()
+
+
+def _dispatch(name: str, func: Callable[..., Any], args: tuple, kwargs: dict[str, Any]) -> None:
+    if getattr(settings, "BACKGROUND_TASKS_EAGER", False):
+        try:
+            func(*args, **kwargs)
+        except Exception:  # noqa: BLE001
+            logger.exception("background task %s failed", name)
+        return
+    _get_executor().submit(_run, name, func, args, kwargs)
+
+
+def submit(name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+    """func をコミット後に後続処理として投入する（重複排除なし）。"""
+    transaction.on_commit(lambda: _dispatch(name, func, args, kwargs))
+
+
+def submit_deduplicated(
+    key: str,
+    func: Callable[..., Any],
+    *args: Any,
+    window: int = DEFAULT_DEDUPE_WINDOW_SECONDS,
+    **kwargs: Any,
+) -> bool:
+    """key ごとに window 秒に 1 回だけ func を後続処理として投入する。
+
+    この時点で同じキーが確保されていなければ True（コミット時に先を越されていたら投入しない）。
+    """
+    cache_key = f"background:{key}"
+    if cache.get(cache_key) is not None:
+        return False
+
+    def claim_and_dispatch() -> None:
+        if cache.add(cache_key, 1, timeout=window):
+            _dispatch(key, func, args, kwargs)
+
+    transaction.on_commit(claim_and_dispatch)
+    return True
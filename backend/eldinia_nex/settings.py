@@ -85,6 +85,10 @@ _extend_cloud_hosts(ALLOWED_HOSTS, CSRF_TRUSTED_ORIGINS)
 # Next.js ↔ Django internal API auth (empty = dev-only open access)
 INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
 
+# リクエスト後の後続処理（eldinia_nex.background）。EAGER=true でその場で実行（テスト・デバッグ用）
+BACKGROUND_TASK_WORKERS = int(os.getenv("BACKGROUND_TASK_WORKERS", "2"))
+BACKGROUND_TASKS_EAGER = os.getenv("BACKGROUND_TASKS_EAGER", "False").lower() == "true"
+
 # Application definition
 
 INSTALLED_APPS = [
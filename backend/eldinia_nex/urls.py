@@ -21,9 +21,16 @@ from django.http import JsonResponse
 from django.urls import path
 from django.views.generic import RedirectView
 
-from users.views import referral_program_status, sync_plans_view, sync_supabase_user_view
+from users.views import (
+    referral_program_status,
+    sync_plans_view,
+    sync_supabase_user_view,
+    sync_supabase_users_batch_view,
+)
 from marketplace.catalog_views import sync_supabase_catalog_view
+from marketplace.referral_views import referral_analytics_view
 from content.views import footer_partners_list
+from gamification.views import leaderboard_view
 from .views import community_page
 
 
@@ -47,10 +54,13 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/health/", api_health_check, name="api_health"),
     path("api/v1/referrals/status/", referral_program_status, name="referral_program_status"),
+    path("api/v1/referrals/analytics/", referral_analytics_view, name="referral_analytics"),
     path("api/v1/users/sync/", sync_supabase_user_view, name="sync_supabase_user"),
+    path("api/v1/users/sync/batch/", sync_supabase_users_batch_view, name="sync_supabase_users_batch"),
     path("api/v1/plans/sync/", sync_plans_view, name="sync_plans"),
     path("api/v1/catalog/sync/", sync_supabase_catalog_view, name="sync_supabase_catalog"),
     path("api/v1/footer/partners/", footer_partners_list, name="footer_partners"),
+    path("api/v1/leaderboard/", leaderboard_view, name="leaderboard"),
     path("community/", community_page, name="community"),
     # path('api/v1/users/', include('users.urls')),
     # path('api/v1/content/', include('content.urls')),
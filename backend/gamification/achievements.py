@@ -0,0 +1,176 @@
+"""実績（Achievement）評価エンジン。
+
+condition_type:
+- "total_exp"   … users.total_exp が condition_value 以上
+- "level"       … users.current_level が condition_value 以上
+- それ以外       … ExpAction.action_type とみなし、その行動の回数（user_exp_log + user_exp_daily）
+
+award_exp から evaluate_exp_event() を呼び、影響するユーザーの進捗だけをまとめて更新する。
+全ユーザーの再計算は backfill_achievements()（集計クエリをユーザー ID チャンク単位で実行）。
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Iterable
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Achievement, UserAchievement, UserExpDaily, UserExpLog
+
+CONDITION_TOTAL_EXP = "total_exp"
+CONDITION_LEVEL = "level"
+USER_FIELD_CONDITIONS = {
+    CONDITION_TOTAL_EXP: "total_exp",
+    CONDITION_LEVEL: "current_level",
+}
+INDEX_CACHE_KEY = "achievements:active_index"
+INDEX_CACHE_SECONDS = 600
+BACKFILL_CHUNK_SIZE = 1000
+
+AchievementIndex = dict[str, list[tuple[int, int]]]
+
+
+def active_achievement_index() -> AchievementIndex:
+    """condition_type → [(achievement_id, condition_value)]（有効な実績のみ、キャッシュ）。"""
+    index = cache.get(INDEX_CACHE_KEY)
+    if index is None:
+        index = defaultdict(list)
+        for achievement_id, condition_type, condition_value in Achievement.objects.filter(
+            is_active=True
+        ).values_list("pk", "condition_type", "condition_value"):
+            index[condition_type].append((achievement_id, condition_value))
+        index = dict(index)
+        cache.set(INDEX_CACHE_KEY, index, INDEX_CACHE_SECONDS)
+    return index
+
+
+def invalidate_achievement_index() -> None:
+    cache.delete(INDEX_CACHE_KEY)
+
+
+def _collect_metrics(
+    condition_types: Iterable[str],
+    user_ids: list[int],
+) -> dict[str, dict[int, int]]:
+    """condition_type ごとの {user_id: 現在値}。条件種別あたり最大 1 クエリ。"""
+    metrics: dict[str, dict[int, int]] = {}
+    types = set(condition_types)
+
+    user_fields = [field for condition, field in USER_FIELD_CONDITIONS.items() if condition in types]
+    if user_fields:
+        User = get_user_model()
+        rows = User.objects.filter(pk__in=user_ids).values("pk", *user_fields)
+        for condition, field in USER_FIELD_CONDITIONS.items():
+            if condition in types:
+                metrics[condition] = {row["pk"]: int(row[field] or 0) for row in rows}
+
+    action_types = sorted(types - set(USER_FIELD_CONDITIONS))
+    if action_types:
+        for action_type in action_types:
+            metrics[action_type] = {}
+        for row in (
+            UserExpLog.objects.filter(user_id__in=user_ids, action_id__in=action_types)
+            .values("user_id", "action_id")
+            .annotate(count=Count("id"))
+        ):
+            metrics[row["action_id"]][row["user_id"]] = row["count"]
+        # 保持期間外の行は user_exp_daily にロールアップ済み
+        for row in (
+            UserExpDaily.objects.filter(user_id__in=user_ids, action_id__in=action_types)
+            .values("user_id", "action_id")
+            .annotate(count=Sum("count"))
+        ):
+            counts = metrics[row["action_id"]]
+            counts[row["user_id"]] = counts.get(row["user_id"], 0) + int(row["count"] or 0)
+
+    return metrics
+
+
+def _apply_progress(
+    index: AchievementIndex,
+    metrics: dict[str, dict[int, int]],
+    user_ids: list[int],
+) -> int:
+    """UserAchievement を一括 upsert。新たに達成した件数を返す（達成日時は一度だけ記録）。"""
+    achievement_ids = [
+        achievement_id for condition in metrics for achievement_id, _value in index[condition]
+    ]
+    existing = {
+        (row.user_id, row.achievement_id): row
+        for row in UserAchievement.objects.filter(
+            achievement_id__in=achievement_ids,
+            user_id__in=user_ids,
+        )
+    }
+
+    now = timezone.now()
+    to_create: list[UserAchievement] = []
+    to_update: list[UserAchievement] = []
+    completed = 0
+    for condition, values in metrics.items():
+        for achievement_id, target in index[condition]:
+            for user_id, value in values.items():
+                progress = min(value, target)
+                reached = value >= target
+                row = existing.get((user_id, achievement_id))
+                if row is None:
+                    if progress <= 0:
+                        continue
+                    to_create.append(
+                        UserAchievement(
+                            user_id=user_id,
+                            achievement_id=achievement_id,
+                            progress=progress,
+                            completed_at=now if reached else None,
+                        )
+                    )
+                    completed += int(reached)
+                    continue
+                if row.completed_at is not None or (row.progress == progress and not reached):
+                    continue
+                row.progress = progress
+                if reached:
+                    row.completed_at = now
+                    completed += 1
+                to_update.append(row)
+
+    if to_create:
+        UserAchievement.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        UserAchievement.objects.bulk_update(to_update, ["progress", "completed_at"])
+    return completed
+
+
+def evaluate_users(user_ids: Iterable[int], condition_types: Iterable[str]) -> int:
+    """指定ユーザーについて、該当する condition_type の実績進捗だけを更新する。"""
+    index = active_achievement_index()
+    types = [condition for condition in set(condition_types) if condition in index]
+    ids = sorted({int(user_id) for user_id in user_ids if user_id})
+    if not types or not ids:
+        return 0
+    return _apply_progress(index, _collect_metrics(types, ids), ids)
+
+
+def evaluate_exp_event(user: Any, action_type: str) -> int:
+    """EXP 付与（エンゲージメント）イベント後の実績評価。"""
+    return evaluate_users([user.pk], (CONDITION_TOTAL_EXP, CONDITION_LEVEL, action_type))
+
+
+def backfill_achievements(*, chunk_size: int = BACKFILL_CHUNK_SIZE) -> dict[str, int]:
+    """全ユーザーの実績進捗を集計クエリで再計算する（ユーザー ID チャンク単位）。"""
+    invalidate_achievement_index()
+    index = active_achievement_index()
+    if not index:
+        return {"users": 0, "completed": 0}
+
+    User = get_user_model()
+    user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+    completed = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start : start + chunk_size]
+        completed += _apply_progress(index, _collect_metrics(index.keys(), chunk), chunk)
+    return {"users": len(user_ids), "completed": completed}
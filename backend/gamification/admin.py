@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from eldinia_nex.admin_pagination import KeysetPaginationAdmin
+
 from .models import Achievement, ExpAction, UserAchievement, UserExpLog
 
 
@@ -21,13 +23,14 @@ class ExpActionAdmin(admin.ModelAdmin):  # type: ignore
 
 
 @admin.register(UserExpLog)
-class UserExpLogAdmin(admin.ModelAdmin):  # type: ignore
+class UserExpLogAdmin(KeysetPaginationAdmin):
     list_display = ("user", "action", "exp_gained", "created_at")
 
 
 @admin.register(Achievement)
 class AchievementAdmin(admin.ModelAdmin):  # type: ignore
-    list_display = ("name", "category", "rarity")
+    list_display = ("name", "category", "condition_type", "condition_value", "rarity", "is_active")
+    list_filter = ("condition_type", "is_active")
 
 
 @admin.register(UserAchievement)
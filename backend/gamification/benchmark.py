@@ -0,0 +1,292 @@
+"""EXP 付与ホットパスのベンチマーク（benchmark_exp 管理コマンドから実行）。
+
+シナリオ:
+- award_exp  … award_exp() を直接呼ぶ（日次上限なしのベンチ用アクション）
+- signals    … Comment の post_save を送り、レシーバー経由で付与する
+- profile    … award_profile_completion_exp()（初回のみ入力済み項目ぶん付与、以降は冪等キーで弾かれる）
+
+DB は settings の DATABASES（DATABASE_TYPE=sqlite / postgresql）をそのまま使う。
+ベンチ用ユーザーを作成・削除するため、DB 名が test_ で始まらない DB では
+allow_non_test_database=True（--allow-non-test-database）を渡さない限り実行しない。
+SQLite は書き込みロックが DB 単位のため、並列度 2 以上では "database is locked" が errors に計上される。
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models.signals import post_save
+
+from .models import ExpAction
+from .services import award_exp, award_profile_completion_exp
+
+SCENARIOS: tuple[str, ...] = ("award_exp", "signals", "profile")
+BENCH_ACTION = "bench.award"
+BENCH_USER_PREFIX = "bench_"
+# 比較対象の指標と「大きいほど良い」か
+COMPARED_METRICS: dict[str, bool] = {
+    "ops_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "queries_per_op": False,
+}
+
+
+@dataclass
+class _BenchRun:
+    """1 回のベンチ実行で作ったものだけを後片付けするための記録。"""
+
+    prefix: str = field(default_factory=lambda: f"{BENCH_USER_PREFIX}{uuid.uuid4().hex[:8]}_")
+    user_pks: list[int] = field(default_factory=list)
+    created_action: bool = False
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    vendor: str
+    users: int
+    actions: int
+    concurrency: int
+    ops: int
+    awarded: int
+    errors: int
+    seconds: float
+    ops_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    queries_per_op: float
+    lock_wait_ms: float
+    first_error: str = ""
+
+
+class _QueryMeter:
+    """execute_wrapper 用。クエリ数と SELECT ... FOR UPDATE の待ち時間を数える。"""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.lock_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if "FOR UPDATE" in sql.upper():
+                self.lock_wait += time.perf_counter() - started
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def is_test_database() -> bool:
+    """接続先が使い捨ての DB（名前が test_ で始まる / SQLite のメモリ DB）か。"""
+    name = str(connection.settings_dict.get("NAME") or "")
+    if connection.vendor == "sqlite" and (name == ":memory:" or "mode=memory" in name):
+        return True
+    return Path(name).name.startswith("test_")
+
+
+def seed_users(run: _BenchRun, scenario: str, count: int) -> list[Any]:
+    """シグナルを発火させずにベンチ用ユーザーを作る。"""
+    User = get_user_model()
+    prefix = f"{run.prefix}{scenario}_"
+    users = [
+        User(
+            username=f"{prefix}{index}",
+            email=f"{prefix}{index}@example.invalid",
+            display_name=f"Bench {index}",
+            bio="benchmark",
+            location="Tokyo",
+        )
+        for index in range(count)
+    ]
+    User.objects.bulk_create(users)
+    seeded = list(User.objects.filter(username__startswith=prefix).order_by("pk"))
+    run.user_pks.extend(user.pk for user in seeded)
+    return seeded
+
+
+def cleanup(run: _BenchRun) -> None:
+    """この実行で作ったユーザー（pk で特定）とベンチ用アクションだけを消す。"""
+    User = get_user_model()
+    for start in range(0, len(run.user_pks), 500):
+        User.objects.filter(pk__in=run.user_pks[start:start + 500]).delete()
+    if run.created_action:
+        ExpAction.objects.filter(action_type=BENCH_ACTION).delete()
+
+
+def _operation(run: _BenchRun, scenario: str) -> Callable[[Any, int], int]:
+    if scenario == "award_exp":
+        _, created = ExpAction.objects.update_or_create(
+            action_type=BENCH_ACTION,
+            defaults={"base_exp": 1, "description": "benchmark", "max_daily_count": 0, "is_active": True},
+        )
+        run.created_action = run.created_action or created
+        return lambda user, index: award_exp(
+            user, BENCH_ACTION, reference_id=index, reference_type=BENCH_ACTION
+        )
+
+    if scenario == "signals":
+        from marketplace.models import Comment
+
+        def send_comment_saved(user: Any, index: int) -> int:
+            before = user.total_exp
+            post_save.send(sender=Comment, instance=Comment(pk=index, user=user), created=True)
+            return user.total_exp - before
+
+        return send_comment_saved
+
+    if scenario == "profile":
+        return lambda user, index: award_profile_completion_exp(user)
+
+    raise ValueError(f"unknown scenario: {scenario}")
+
+
+def run_scenario(
+    run: _BenchRun,
+    scenario: str,
+    *,
+    users: int,
+    actions: int,
+    concurrency: int,
+) -> ScenarioResult:
+    seeded = seed_users(run, scenario, users)
+    operation = _operation(run, scenario)
+
+    def worker(user: Any, offset: int) -> tuple[list[float], int, list[str], _QueryMeter]:
+        close_old_connections()
+        meter = _QueryMeter()
+        latencies: list[float] = []
+        awarded = 0
+        errors: list[str] = []
+        try:
+            with connection.execute_wrapper(meter):
+                for index in range(actions):
+                    started = time.perf_counter()
+                    try:
+                        awarded += int(operation(user, offset + index) > 0)
+                    except OperationalError as exc:
+                        # SQLite の "database is locked" など
+                        errors.append(str(exc))
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        return latencies, awarded, errors, meter
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(
+            executor.map(worker, seeded, [index * actions for index in range(len(seeded))])
+        )
+    elapsed = time.perf_counter() - started
+
+    latencies = [value for result in results for value in result[0]]
+    ops = len(latencies)
+    queries = sum(result[3].queries for result in results)
+    errors = [message for result in results for message in result[2]]
+    return ScenarioResult(
+        scenario=scenario,
+        vendor=connection.vendor,
+        users=users,
+        actions=actions,
+        concurrency=concurrency,
+        ops=ops,
+        awarded=sum(result[1] for result in results),
+        errors=len(errors),
+        seconds=round(elapsed, 3),
+        ops_per_sec=round(ops / elapsed, 1) if elapsed else 0.0,
+        p50_ms=round(statistics.median(latencies) * 1000, 3) if latencies else 0.0,
+        p99_ms=round(_percentile(latencies, 99) * 1000, 3),
+        queries_per_op=round(queries / ops, 2) if ops else 0.0,
+        lock_wait_ms=round(sum(result[3].lock_wait for result in results) * 1000, 3),
+        first_error=errors[0] if errors else "",
+    )
+
+
+def run_benchmark(
+    scenarios: list[str],
+    *,
+    users: int,
+    actions: int,
+    concurrency: int,
+    allow_non_test_database: bool = False,
+) -> list[ScenarioResult]:
+    if not (allow_non_test_database or is_test_database()):
+        raise RuntimeError(
+            f"refusing to benchmark against non-test database {connection.settings_dict.get('NAME')!r}"
+        )
+    run = _BenchRun()
+    try:
+        return [
+            run_scenario(run, scenario, users=users, actions=actions, concurrency=concurrency)
+            for scenario in scenarios
+        ]
+    finally:
+        cleanup(run)
+
+
+def save_baseline(path: Path, results: list[ScenarioResult]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {f"{result.vendor}:{result.scenario}": asdict(result) for result in results}
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+
+@dataclass
+class BaselineComparison:
+    """ベースラインとの比較結果。compared が空なら何も比べていない。"""
+
+    compared: list[str] = field(default_factory=list)
+    # 同じシナリオのベースラインはあるが負荷条件（users / actions / concurrency）が違う
+    load_mismatch: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)
+    regressions: list[str] = field(default_factory=list)
+
+
+def compare_with_baseline(
+    path: Path,
+    results: list[ScenarioResult],
+    *,
+    tolerance: float,
+) -> BaselineComparison:
+    """tolerance（0.2 = 20%）を超えて悪化した指標と、実際に比べたシナリオを返す。"""
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    comparison = BaselineComparison()
+    for result in results:
+        name = f"{result.vendor}:{result.scenario}"
+        previous = baseline.get(name)
+        if not previous:
+            comparison.missing.append(name)
+            continue
+        # 負荷条件が違う計測同士は比べない
+        if any(previous.get(key) != getattr(result, key) for key in ("users", "actions", "concurrency")):
+            comparison.load_mismatch.append(name)
+            continue
+        comparison.compared.append(name)
+        current = asdict(result)
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before = float(previous.get(metric) or 0)
+            after = float(current[metric])
+            if before <= 0:
+                continue
+            change = (before - after) / before if higher_is_better else (after - before) / before
+            if change > tolerance:
+                comparison.regressions.append(
+                    f"{name} {metric}: {before} -> {after} ({change:+.0%})"
+                )
+    return comparison
@@ -0,0 +1,268 @@
+"""user_exp_log の保持期間管理 — 日次ロールアップと PostgreSQL 月次パーティション。
+
+- rollup_exp_log(): 保持期間より古い行を user_exp_daily に集約して削除する
+- convert_to_partitioned(): user_exp_log を created_at の RANGE パーティション表に変換（一度だけ）
+- ensure_monthly_partitions() / drop_expired_partitions(): cron 用のパーティション保守
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import UserExpDaily, UserExpLog
+
+EXP_LOG_RETENTION_DAYS = 90
+# 月間ランキング・7日間ダッシュボードは生ログを読むため、これより短くはしない
+MIN_RETENTION_DAYS = 35
+
+TABLE = "user_exp_log"
+DEFAULT_PARTITION = f"{TABLE}_default"
+ID_SEQUENCE = f"{TABLE}_part_id_seq"
+
+
+class ExpLogStorageError(Exception):
+    pass
+
+
+def retention_cutoff(retention_days: int, now: datetime | None = None) -> datetime:
+    """保持期間の境界（ローカル日付の 0 時）。"""
+    if retention_days < MIN_RETENTION_DAYS:
+        raise ExpLogStorageError(f"retention_days must be at least {MIN_RETENTION_DAYS}")
+    cutoff_day = timezone.localdate(now) - timedelta(days=retention_days)
+    return timezone.make_aware(datetime.combine(cutoff_day, time.min))
+
+
+def _rollup_candidates(cutoff: datetime):
+    return UserExpLog.objects.filter(created_at__lt=cutoff)
+
+
+def _rollup_day(day: date, cutoff: datetime) -> tuple[int, int]:
+    """1 日分を集約して削除する。戻り値は (集約行数, 削除したログ行数)。"""
+    day_start = timezone.make_aware(datetime.combine(day, time.min))
+    day_rows = _rollup_candidates(cutoff).filter(
+        created_at__gte=day_start,
+        created_at__lt=day_start + timedelta(days=1),
+    )
+    aggregates = list(
+        day_rows.values("user_id", "action_id").annotate(
+            count=Count("id"),
+            exp=Sum("exp_gained"),
+        )
+    )
+    existing = {
+        (row.user_id, row.action_id): row
+        for row in UserExpDaily.objects.filter(day=day).select_for_update()
+    }
+
+    to_create: list[UserExpDaily] = []
+    to_update: list[UserExpDaily] = []
+    for row in aggregates:
+        key = (row["user_id"], row["action_id"])
+        current = existing.get(key)
+        if current:
+            current.count += row["count"]
+            current.exp_gained += row["exp"] or 0
+            to_update.append(current)
+        else:
+            to_create.append(
+                UserExpDaily(
+                    user_id=row["user_id"],
+                    action_id=row["action_id"],
+                    day=day,
+                    count=row["count"],
+                    exp_gained=row["exp"] or 0,
+                )
+            )
+    UserExpDaily.objects.bulk_create(to_create)
+    UserExpDaily.objects.bulk_update(to_update, ["count", "exp_gained"])
+    deleted, _ = day_rows.delete()
+    return len(aggregates), deleted
+
+
+def rollup_exp_log(
+    *,
+    retention_days: int = EXP_LOG_RETENTION_DAYS,
+    now: datetime | None = None,
+    apply: bool = True,
+) -> dict[str, Any]:
+    """保持期間外の user_exp_log を日次集計へ移す（1 日ずつトランザクション）。"""
+    cutoff = retention_cutoff(retention_days, now)
+    candidates = _rollup_candidates(cutoff)
+    days = sorted(
+        candidates.annotate(day=TruncDate("created_at"))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+    if not apply:
+        return {"cutoff": cutoff.isoformat(), "days": len(days), "rows": candidates.count()}
+
+    aggregated = 0
+    deleted = 0
+    for day in days:
+        with transaction.atomic():
+            day_aggregated, day_deleted = _rollup_day(day, cutoff)
+        aggregated += day_aggregated
+        deleted += day_deleted
+    return {
+        "cutoff": cutoff.isoformat(),
+        "days": len(days),
+        "aggregated": aggregated,
+        "deleted": deleted,
+    }
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL パーティション
+# ---------------------------------------------------------------------------
+
+
+def _require_postgresql() -> None:
+    if connection.vendor != "postgresql":
+        raise ExpLogStorageError("user_exp_log のパーティションは PostgreSQL でのみ利用できます。")
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _next_month(value: date) -> date:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _partition_name(month: date) -> str:
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def _create_partition_sql(month: date) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{_partition_name(month)}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+    )
+
+
+def ensure_monthly_partitions(*, months_ahead: int = 3, now: datetime | None = None) -> list[str]:
+    """今月から months_ahead か月先までのパーティションを作成する。"""
+    _require_postgresql()
+    if not is_partitioned():
+        raise ExpLogStorageError("user_exp_log はまだパーティション表ではありません（--convert を実行）。")
+
+    month = _month_start(timezone.localdate(now))
+    created: list[str] = []
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            cursor.execute(_create_partition_sql(month))
+            created.append(_partition_name(month))
+            month = _next_month(month)
+    return created
+
+
+def drop_expired_partitions(
+    *,
+    retention_days: int = EXP_LOG_RETENTION_DAYS,
+    now: datetime | None = None,
+) -> list[str]:
+    """保持期間より前に終わる空の月次パーティション（ロールアップ済み）を削除する。"""
+    _require_postgresql()
+    cutoff_month = _month_start(retention_cutoff(retention_days, now).date())
+    dropped: list[str] = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        partitions = [row[0] for row in cursor.fetchall()]
+        for name in partitions:
+            suffix = name.removeprefix(f"{TABLE}_p")
+            if name == DEFAULT_PARTITION or len(suffix) != 6 or not suffix.isdigit():
+                continue
+            month = date(int(suffix[:4]), int(suffix[4:]), 1)
+            if _next_month(month) > cutoff_month:
+                continue
+            cursor.execute(f'SELECT 1 FROM "{name}" LIMIT 1')
+            if cursor.fetchone():
+                continue
+            cursor.execute(f'DROP TABLE "{name}"')
+            dropped.append(name)
+    return dropped
+
+
+@transaction.atomic
+def convert_to_partitioned(*, months_ahead: int = 3) -> dict[str, Any]:
+    """user_exp_log を月次 RANGE パーティション表に作り替える（既存行はコピー）。
+
+    パーティション表の主キーは (id, created_at) になる。Django 側は id を pk として
+    扱い続けるが、id は専用シーケンスで採番されるため一意性は保たれる。
+    """
+    _require_postgresql()
+    if is_partitioned():
+        return {"converted": False, "rows": 0}
+
+    legacy = f"{TABLE}_unpartitioned"
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN(created_at), MAX(id) FROM "{TABLE}"')
+        oldest, max_id = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS) '
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, created_at)')
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{ID_SEQUENCE}" OWNED BY "{TABLE}".id')
+        cursor.execute("SELECT setval(%s, %s, false)", [ID_SEQUENCE, (max_id or 0) + 1])
+        cursor.execute(
+            f"ALTER TABLE \"{TABLE}\" ALTER COLUMN id SET DEFAULT nextval('{ID_SEQUENCE}')"
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD FOREIGN KEY (user_id) REFERENCES users (id) '
+            "DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD FOREIGN KEY (action_type) '
+            "REFERENCES exp_actions (action_type) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+        month = _month_start(timezone.localtime(oldest).date() if oldest else timezone.localdate())
+        last_month = _month_start(timezone.localdate())
+        for _ in range(months_ahead):
+            last_month = _next_month(last_month)
+        while month <= last_month:
+            cursor.execute(_create_partition_sql(month))
+            month = _next_month(month)
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{legacy}"')
+        rows = cursor.rowcount
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+        cursor.execute(f'CREATE INDEX "{TABLE}_user_id_idx" ON "{TABLE}" (user_id)')
+        cursor.execute(f'CREATE INDEX "{TABLE}_action_type_idx" ON "{TABLE}" (action_type)')
+
+    with connection.schema_editor(atomic=False) as schema_editor:
+        for index in UserExpLog._meta.indexes:
+            schema_editor.add_index(UserExpLog, index)
+
+    return {"converted": True, "rows": rows}
@@ -0,0 +1,310 @@
+"""EXP ランキング — 期間・プラン別の事前集計スコアと順位参照。
+
+- award_exp から record_exp() で増分加算（1 award あたり 2 クエリ）
+- 順位はボードごとの順位スナップショット（相異なるスコアの昇順と累積人数）を
+  RANK_CACHE_SECONDS の間キャッシュし、自分の最新スコアを二分探索して O(log n) で求める
+  （他ユーザーの加算はスナップショットの更新まで反映されない。自分の加算はすぐ反映される）
+- プラン変更時は move_plan_scores() で現在期間のプラン別スコアを新しいプランへ移す
+- compact_leaderboards() を定期実行して正データから再集計・古い期間を削除
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import LeaderboardScore, UserExpLog
+
+ALL_TIME_PERIOD = date(1970, 1, 1)
+BOARDS: tuple[str, ...] = (
+    LeaderboardScore.BOARD_ALL_TIME,
+    LeaderboardScore.BOARD_WEEKLY,
+    LeaderboardScore.BOARD_MONTHLY,
+)
+GLOBAL_SCOPE = ""
+RANK_CACHE_SECONDS = 300
+REBUILD_BATCH_SIZE = 1000
+
+
+def period_start(board: str, now: datetime | None = None) -> date:
+    """ランキング期間の開始日（週は月曜、月は1日、ローカル時刻基準）。"""
+    today = timezone.localdate(now)
+    if board == LeaderboardScore.BOARD_WEEKLY:
+        return today - timedelta(days=today.weekday())
+    if board == LeaderboardScore.BOARD_MONTHLY:
+        return today.replace(day=1)
+    if board == LeaderboardScore.BOARD_ALL_TIME:
+        return ALL_TIME_PERIOD
+    raise ValueError(f"unknown leaderboard board: {board}")
+
+
+def _previous_period_start(board: str, current: date) -> date:
+    if board == LeaderboardScore.BOARD_WEEKLY:
+        return current - timedelta(days=7)
+    if board == LeaderboardScore.BOARD_MONTHLY:
+        return (current - timedelta(days=1)).replace(day=1)
+    return current
+
+
+def _scope_for_plan(plan: str | None) -> str:
+    """User.subscription_plan をプラン別ランキングの plan 値にそろえる（小文字、未設定は free）。"""
+    return (plan or "free").strip().lower() or "free"
+
+
+def _plan_scope(user: Any) -> str:
+    return _scope_for_plan(getattr(user, "subscription_plan", ""))
+
+
+def _requested_scope(plan: str | None) -> str:
+    """API の plan 指定（空なら全体ランキング）。"""
+    return (plan or GLOBAL_SCOPE).strip().lower()
+
+
+def _cache_key(board: str, period: date, plan: str) -> str:
+    return f"leaderboard:ranks:{board}:{period.isoformat()}:{plan or '_'}"
+
+
+def record_exp(user: Any, exp: int, *, now: datetime | None = None) -> None:
+    """全期間・週間・月間 × 全体/プランのスコアに exp を加算する。"""
+    if exp <= 0 or not getattr(user, "pk", None):
+        return
+
+    scopes = (GLOBAL_SCOPE, _plan_scope(user))
+    keys = [(board, period_start(board, now)) for board in BOARDS]
+    LeaderboardScore.objects.bulk_create(
+        [
+            LeaderboardScore(board=board, period_start=period, plan=scope, user_id=user.pk)
+            for board, period in keys
+            for scope in scopes
+        ],
+        ignore_conflicts=True,
+    )
+    period_q = Q()
+    for board, period in keys:
+        period_q |= Q(board=board, period_start=period)
+    LeaderboardScore.objects.filter(period_q, user_id=user.pk, plan__in=scopes).update(
+        score=F("score") + exp
+    )
+
+
+@transaction.atomic
+def move_plan_scores(user: Any, *, now: datetime | None = None) -> int:
+    """現在期間のプラン別スコアを user の今のプランへ移す（プラン変更時）。移した行数を返す。"""
+    if not getattr(user, "pk", None):
+        return 0
+    scope = _plan_scope(user)
+    period_q = Q()
+    for board in BOARDS:
+        period_q |= Q(board=board, period_start=period_start(board, now))
+    stale = list(
+        LeaderboardScore.objects.select_for_update()
+        .filter(period_q, user_id=user.pk)
+        .exclude(plan__in=(GLOBAL_SCOPE, scope))
+    )
+    if not stale:
+        return 0
+
+    LeaderboardScore.objects.bulk_create(
+        [
+            LeaderboardScore(
+                board=row.board, period_start=row.period_start, plan=scope, user_id=user.pk
+            )
+            for row in stale
+        ],
+        ignore_conflicts=True,
+    )
+    for row in stale:
+        LeaderboardScore.objects.filter(
+            board=row.board, period_start=row.period_start, plan=scope, user_id=user.pk
+        ).update(score=F("score") + row.score)
+    LeaderboardScore.objects.filter(pk__in=[row.pk for row in stale]).delete()
+
+    cache_keys = [
+        _cache_key(row.board, row.period_start, plan)
+        for row in stale
+        for plan in (row.plan, scope)
+    ]
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
+    return len(stale)
+
+
+def _board_scores(board: str, period: date, plan: str):
+    return LeaderboardScore.objects.filter(
+        board=board,
+        period_start=period,
+        plan=plan,
+        score__gt=0,
+    )
+
+
+def _rank_snapshot(board: str, period: date, plan: str) -> tuple[list[int], list[int]]:
+    """(相異なるスコアの昇順, そのスコア以下の累積人数) を RANK_CACHE_SECONDS の間キャッシュする。
+
+    スコアごとの GROUP BY 1 回で作るので、件数は参加者数ではなく相異なるスコアの数で決まる。
+    """
+    key = _cache_key(board, period, plan)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        scores: list[int] = []
+        cumulative: list[int] = []
+        running = 0
+        for score, count in (
+            _board_scores(board, period, plan)
+            .values_list("score")
+            .annotate(count=Count("id"))
+            .order_by("score")
+        ):
+            running += count
+            scores.append(score)
+            cumulative.append(running)
+        snapshot = (scores, cumulative)
+        cache.set(key, snapshot, RANK_CACHE_SECONDS)
+    return snapshot
+
+
+def get_user_rank(
+    user: Any,
+    *,
+    board: str = LeaderboardScore.BOARD_ALL_TIME,
+    plan: str | None = None,
+    now: datetime | None = None,
+) -> dict[str, Any] | None:
+    """ユーザーの順位（「あなたは #1,234 位」）。スコアが無ければ None。
+
+    自分のスコアは毎回読み、順位はキャッシュ済みスナップショットの二分探索で求める。
+    """
+    period = period_start(board, now)
+    scope = _requested_scope(plan)
+    score = (
+        LeaderboardScore.objects.filter(
+            board=board,
+            period_start=period,
+            plan=scope,
+            user_id=user.pk,
+        )
+        .values_list("score", flat=True)
+        .first()
+    )
+    if not score:
+        return None
+
+    scores, cumulative = _rank_snapshot(board, period, scope)
+    total = cumulative[-1] if cumulative else 0
+    index = bisect_right(scores, score)
+    at_or_below = cumulative[index - 1] if index else 0
+    rank = total - at_or_below + 1
+    return {
+        "board": board,
+        "period_start": period.isoformat(),
+        "plan": scope,
+        "score": score,
+        "rank": rank,
+        "total": max(total, rank),
+    }
+
+
+def get_top(
+    *,
+    board: str = LeaderboardScore.BOARD_ALL_TIME,
+    plan: str | None = None,
+    limit: int = 50,
+    now: datetime | None = None,
+) -> list[dict[str, Any]]:
+    """上位ランキング。同点は同順位（1, 2, 2, 4 …）。"""
+    period = period_start(board, now)
+    rows = (
+        LeaderboardScore.objects.filter(
+            board=board,
+            period_start=period,
+            plan=_requested_scope(plan),
+            score__gt=0,
+        )
+        .select_related("user")
+        .order_by("-score", "user_id")[:limit]
+    )
+    entries: list[dict[str, Any]] = []
+    rank = 0
+    previous_score = None
+    for index, row in enumerate(rows, start=1):
+        if row.score != previous_score:
+            rank = index
+            previous_score = row.score
+        entries.append(
+            {
+                "rank": rank,
+                "score": row.score,
+                "username": row.user.username,
+                "display_name": row.user.display_name or row.user.username,
+                "external_id": str(row.user.external_id),
+                "current_level": row.user.current_level,
+            }
+        )
+    return entries
+
+
+def _period_totals(board: str, period: date) -> list[tuple[int, str, int]]:
+    """(user_id, plan, score) を正データから集計する。"""
+    if board == LeaderboardScore.BOARD_ALL_TIME:
+        User = get_user_model()
+        return [
+            (user_id, plan, int(total))
+            for user_id, plan, total in User.objects.filter(total_exp__gt=0).values_list(
+                "pk", "subscription_plan", "total_exp"
+            )
+        ]
+
+    since = timezone.make_aware(datetime.combine(period, time.min))
+    return [
+        (row["user_id"], row["user__subscription_plan"], int(row["total"]))
+        for row in UserExpLog.objects.filter(created_at__gte=since)
+        .values("user_id", "user__subscription_plan")
+        .annotate(total=Sum("exp_gained"))
+        if row["total"] and row["total"] > 0
+    ]
+
+
+@transaction.atomic
+def compact_leaderboards(*, now: datetime | None = None) -> dict[str, Any]:
+    """現在期間を再集計して置き換え、前期間より古い行を削除する。"""
+    removed = 0
+    rebuilt: dict[str, int] = {}
+    cache_keys: list[str] = []
+
+    for board in BOARDS:
+        period = period_start(board, now)
+        removed += LeaderboardScore.objects.filter(
+            board=board,
+            period_start__lt=_previous_period_start(board, period),
+        ).delete()[0]
+
+        totals = _period_totals(board, period)
+        LeaderboardScore.objects.filter(board=board, period_start=period).delete()
+
+        rows: list[LeaderboardScore] = []
+        plans = {GLOBAL_SCOPE}
+        for user_id, plan, score in totals:
+            scope = _scope_for_plan(plan)
+            plans.add(scope)
+            rows.append(
+                LeaderboardScore(
+                    board=board, period_start=period, plan=GLOBAL_SCOPE, user_id=user_id, score=score
+                )
+            )
+            rows.append(
+                LeaderboardScore(
+                    board=board, period_start=period, plan=scope, user_id=user_id, score=score
+                )
+            )
+        LeaderboardScore.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+        rebuilt[board] = len(totals)
+        cache_keys.extend(_cache_key(board, period, plan) for plan in plans)
+
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
+    return {"rebuilt": rebuilt, "removed": removed}
@@ -0,0 +1,21 @@
+"""全ユーザーの実績進捗を再計算する管理コマンド"""
+
+from django.core.management.base import BaseCommand
+
+from gamification.achievements import BACKFILL_CHUNK_SIZE, backfill_achievements
+
+
+class Command(BaseCommand):
+    help = "Recompute UserAchievement progress for all users with grouped aggregate queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=BACKFILL_CHUNK_SIZE,
+            help="Number of users aggregated per query batch.",
+        )
+
+    def handle(self, *args, **options):
+        result = backfill_achievements(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"achievements: {result}"))
@@ -0,0 +1,89 @@
+"""EXP 付与ホットパスのベンチマーク
+
+例:
+  python manage.py benchmark_exp --compare   # 既定の負荷は benchmarks/exp_baseline.json と同じ
+  python manage.py benchmark_exp --users 50 --actions 40 --concurrency 8 --save-baseline
+  DATABASE_TYPE=postgresql POSTGRES_DB=test_eldonia_bench python manage.py benchmark_exp --compare
+
+DB 名が test_ で始まらない DB（開発 / 本番 DB）では --allow-non-test-database が必要。
+"""
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gamification.benchmark import SCENARIOS, compare_with_baseline, run_benchmark, save_baseline
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "exp_baseline.json"
+
+
+class Command(BaseCommand):
+    help = "Benchmark award_exp, the EXP signal receivers and profile completion awards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--actions", type=int, default=25, help="Operations per user")
+        # SQLite は並列書き込みで "database is locked" になるため、既定（とベースライン）は 1
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, dest="scenarios")
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument("--save-baseline", action="store_true")
+        parser.add_argument("--compare", action="store_true", help="Fail when worse than the baseline")
+        parser.add_argument("--tolerance", type=float, default=0.2)
+        parser.add_argument(
+            "--allow-non-test-database",
+            action="store_true",
+            help="Run even when the database name does not start with test_",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] <= 0 or options["actions"] <= 0:
+            raise CommandError("--users and --actions must be positive")
+
+        try:
+            results = run_benchmark(
+                options["scenarios"] or list(SCENARIOS),
+                users=options["users"],
+                actions=options["actions"],
+                concurrency=options["concurrency"],
+                allow_non_test_database=options["allow_non_test_database"],
+            )
+        except RuntimeError as exc:
+            raise CommandError(f"{exc}; pass --allow-non-test-database to override") from exc
+        for result in results:
+            self.stdout.write(
+                f"[{result.vendor}] {result.scenario}: {result.ops_per_sec} ops/s "
+                f"(awarded={result.awarded}/{result.ops}, errors={result.errors}) "
+                f"p50={result.p50_ms}ms p99={result.p99_ms}ms "
+                f"queries/op={result.queries_per_op} lock_wait={result.lock_wait_ms}ms"
+            )
+            if result.first_error:
+                self.stdout.write(self.style.WARNING(f"  first error: {result.first_error}"))
+
+        if options["compare"]:
+            if not options["baseline"].exists():
+                raise CommandError(f"baseline not found: {options['baseline']}")
+            comparison = compare_with_baseline(
+                options["baseline"], results, tolerance=options["tolerance"]
+            )
+            if comparison.load_mismatch:
+                raise CommandError(
+                    "baseline was recorded with a different --users/--actions/--concurrency: "
+                    + ", ".join(comparison.load_mismatch)
+                )
+            if not comparison.compared:
+                raise CommandError(
+                    "no baseline entry matched this run: " + ", ".join(comparison.missing)
+                )
+            if comparison.regressions:
+                raise CommandError("regression detected:\n" + "\n".join(comparison.regressions))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"no regression against baseline ({', '.join(comparison.compared)})"
+                )
+            )
+
+        if options["save_baseline"]:
+            save_baseline(options["baseline"], results)
+            self.stdout.write(self.style.SUCCESS(f"baseline saved: {options['baseline']}"))
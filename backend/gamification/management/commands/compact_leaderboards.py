@@ -0,0 +1,13 @@
+"""EXP ランキングを正データから再集計する管理コマンド（cron で定期実行）"""
+
+from django.core.management.base import BaseCommand
+
+from gamification.leaderboard import compact_leaderboards
+
+
+class Command(BaseCommand):
+    help = "Rebuild leaderboard snapshots (all-time / weekly / monthly, per plan) and drop old periods."
+
+    def handle(self, *args, **options):
+        result = compact_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f"leaderboards: {result}"))
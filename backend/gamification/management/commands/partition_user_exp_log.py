@@ -0,0 +1,36 @@
+"""user_exp_log の月次パーティション保守（PostgreSQL のみ）
+
+初回のみ --convert で既存テーブルをパーティション表へ変換する。
+以降は cron で実行し、先の月のパーティション作成と空になった古い月の削除を行う。
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gamification.exp_log_storage import (
+    EXP_LOG_RETENTION_DAYS,
+    ExpLogStorageError,
+    convert_to_partitioned,
+    drop_expired_partitions,
+    ensure_monthly_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = "Create/drop monthly partitions of user_exp_log (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true", help="Convert user_exp_log to a partitioned table")
+        parser.add_argument("--months-ahead", type=int, default=3)
+        parser.add_argument("--days", type=int, default=EXP_LOG_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        try:
+            if options["convert"]:
+                result = convert_to_partitioned(months_ahead=options["months_ahead"])
+                self.stdout.write(self.style.SUCCESS(f"convert: {result}"))
+            created = ensure_monthly_partitions(months_ahead=options["months_ahead"])
+            dropped = drop_expired_partitions(retention_days=options["days"])
+        except ExpLogStorageError as exc:
+            raise CommandError(str(exc)) from exc
+
+        self.stdout.write(self.style.SUCCESS(f"partitions: ensured={created} dropped={dropped}"))
@@ -0,0 +1,24 @@
+"""保持期間を過ぎた user_exp_log を日次集計へロールアップする管理コマンド（cron で日次実行）"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gamification.exp_log_storage import EXP_LOG_RETENTION_DAYS, ExpLogStorageError, rollup_exp_log
+
+
+class Command(BaseCommand):
+    help = "Roll up user_exp_log rows older than the retention window into user_exp_daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=EXP_LOG_RETENTION_DAYS)
+        parser.add_argument("--apply", action="store_true", help="Actually aggregate and delete rows")
+
+    def handle(self, *args, **options):
+        try:
+            result = rollup_exp_log(retention_days=options["days"], apply=options["apply"])
+        except ExpLogStorageError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if not options["apply"]:
+            self.stdout.write(self.style.WARNING(f"dry-run: {result} (use --apply)"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"user_exp_log rollup: {result}"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0003_seed_default_exp_actions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('all_time', 'All time'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=20)),
+                ('period_start', models.DateField()),
+                ('plan', models.CharField(blank=True, default='', max_length=20)),
+                ('score', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'leaderboard_scores',
+                'indexes': [models.Index(fields=['board', 'period_start', 'plan', '-score'], name='leaderboard_board_b4f8eb_idx')],
+                'unique_together': {('board', 'period_start', 'plan', 'user')},
+            },
+        ),
+    ]
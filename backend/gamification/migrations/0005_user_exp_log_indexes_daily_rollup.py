@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamification', '0004_leaderboard_scores'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserExpDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('exp_gained', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'user_exp_daily',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userexplog',
+            index=models.Index(fields=['user', 'action', 'created_at'], name='user_exp_lo_user_id_8c0a55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userexplog',
+            index=models.Index(fields=['created_at', 'user'], name='user_exp_lo_created_ca5f25_idx'),
+        ),
+        migrations.AddField(
+            model_name='userexpdaily',
+            name='action',
+            field=models.ForeignKey(db_column='action_type', on_delete=django.db.models.deletion.CASCADE, to='gamification.expaction', to_field='action_type'),
+        ),
+        migrations.AddField(
+            model_name='userexpdaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userexpdaily',
+            unique_together={('user', 'action', 'day')},
+        ),
+    ]
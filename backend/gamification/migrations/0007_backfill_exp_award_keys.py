@@ -0,0 +1,47 @@
+import hashlib
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def _award_key(user_id, action_type, reference_type, reference_id):
+    raw = f"{user_id}:{action_type}:{reference_type}:{'' if reference_id is None else reference_id}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def backfill_award_keys(apps, schema_editor):  # pylint: disable=unused-argument
+    UserExpLog = apps.get_model("gamification", "UserExpLog")
+    ExpAwardKey = apps.get_model("gamification", "ExpAwardKey")
+
+    rows = (
+        UserExpLog.objects.exclude(reference_type__isnull=True)
+        .exclude(reference_type="")
+        .values_list("user_id", "action_id", "reference_type", "reference_id")
+        .distinct()
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for user_id, action_type, reference_type, reference_id in rows:
+        batch.append(
+            ExpAwardKey(
+                key=_award_key(user_id, action_type, reference_type, reference_id),
+                user_id=user_id,
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            ExpAwardKey.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        ExpAwardKey.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gamification", "0006_exp_award_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_award_keys, migrations.RunPython.noop),
+    ]
@@ -30,6 +30,42 @@ class UserExpLog(models.Model):
 
     class Meta:
         db_table = "user_exp_log"
+        indexes = [
+            # _daily_count_reached
+            models.Index(fields=["user", "action", "created_at"]),
+            # ダッシュボード集計 / 直近アクティブユーザー
+            models.Index(fields=["created_at", "user"]),
+        ]
+
+
+class UserExpDaily(models.Model):
+    """保持期間を過ぎた user_exp_log を日次に集約したもの（rollup_user_exp_log）。"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    action = models.ForeignKey(
+        ExpAction,
+        to_field="action_type",
+        db_column="action_type",
+        on_delete=models.CASCADE,
+    )
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    exp_gained = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "user_exp_daily"
+        unique_together = ("user", "action", "day")
+
+
+class ExpAwardKey(models.Model):
+    """award_exp の冪等キー。sha256(user:action:reference_type:reference_id) を一意制約で確保する。"""
+
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "exp_award_keys"
 
 
 class Achievement(models.Model):
@@ -59,6 +95,34 @@ class UserAchievement(models.Model):
         unique_together = ("user", "achievement")
 
 
+class LeaderboardScore(models.Model):
+    """ランキング用スコア（期間・プラン別）。award_exp で加算し、定期 compaction で再集計する。"""
+
+    BOARD_ALL_TIME = "all_time"
+    BOARD_WEEKLY = "weekly"
+    BOARD_MONTHLY = "monthly"
+    BOARD_CHOICES = [
+        (BOARD_ALL_TIME, "All time"),
+        (BOARD_WEEKLY, "Weekly"),
+        (BOARD_MONTHLY, "Monthly"),
+    ]
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    period_start = models.DateField()
+    # "" = 全体ランキング、それ以外は User.subscription_plan
+    plan = models.CharField(max_length=20, blank=True, default="")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    score = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "leaderboard_scores"
+        unique_together = ("board", "period_start", "plan", "user")
+        indexes = [
+            models.Index(fields=["board", "period_start", "plan", "-score"]),
+        ]
+
+
 """Gamification models module.
 
 Defined models above. Removed trailing template lines.
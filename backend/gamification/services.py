@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import F
 from django.utils import timezone
 
-from .models import ExpAction, UserExpLog
+from .achievements import evaluate_exp_event
+from .leaderboard import record_exp
+from .models import ExpAction, ExpAwardKey, UserExpLog
 
 LEVEL_EXP_STEP = 500
 
@@ -115,6 +118,39 @@ def _daily_count_reached(user: Any, action: ExpAction) -> bool:
     return count >= action.max_daily_count
 
 
+def exp_award_key(
+    user_id: int,
+    action_type: str,
+    reference_type: str,
+    reference_id: int | None,
+) -> str:
+    """冪等キー。reference_id が None の場合は reference_type ごとに一度だけ。
+
+    None のキーは id 付きのキーとは別物なので、id 付きで付与済みでも None の付与は
+    一度だけ通る（旧実装の「None なら同じ reference_type の付与があれば拒否」とは異なる）。
+    """
+    raw = f"{user_id}:{action_type}:{reference_type}:{'' if reference_id is None else reference_id}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _claim_award_key(
+    user: Any,
+    action_type: str,
+    reference_type: str,
+    reference_id: int | None,
+) -> bool:
+    """一意制約つきで冪等キーを INSERT する。既に付与済みなら False。"""
+    try:
+        with transaction.atomic():
+            ExpAwardKey.objects.create(
+                key=exp_award_key(user.pk, action_type, reference_type, reference_id),
+                user_id=user.pk,
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
 @transaction.atomic
 def award_exp(
     user: Any,
@@ -125,7 +161,12 @@ def award_exp(
     description: str | None = None,
     idempotent: bool = True,
 ) -> int:
-    """Quest 設定に基づいて EXP を付与し、付与量を返す。"""
+    """Quest 設定に基づいて EXP を付与し、付与量を返す。
+
+    idempotent かつ reference_type があれば (user, action, reference_type, reference_id)
+    ごとに一度だけ付与する。reference_id=None は「None での付与」1 回分として数える
+    （exp_award_key 参照）。
+    """
     if not user or not getattr(user, "pk", None):
         return 0
 
@@ -133,20 +174,14 @@ def award_exp(
     if not action or action.base_exp <= 0:
         return 0
 
-    if idempotent and reference_type:
-        existing = UserExpLog.objects.filter(
-            user=user,
-            action=action,
-            reference_type=reference_type,
-        )
-        if reference_id is not None:
-            existing = existing.filter(reference_id=reference_id)
-        if existing.exists():
-            return 0
-
     if _daily_count_reached(user, action):
         return 0
 
+    if idempotent and reference_type and not _claim_award_key(
+        user, action_type, reference_type, reference_id
+    ):
+        return 0
+
     UserExpLog.objects.create(
         user=user,
         action=action,
@@ -166,9 +201,22 @@ def award_exp(
     )
     user.total_exp = next_total
     user.current_level = next_level
+    record_exp(user, action.base_exp)
+    evaluate_exp_event(user, action.action_type)
     return action.base_exp
 
 
+def award_signup_exp(user: Any) -> int:
+    """新規登録の EXP（ユーザーごとに一度）。"""
+    return award_exp(
+        user,
+        "user.signup",
+        reference_id=user.pk,
+        reference_type="user.signup",
+        description="新規登録",
+    )
+
+
 def award_profile_completion_exp(user: Any) -> int:
     """入力済みのユーザー情報ごとに一度だけ EXP を付与する。"""
     total = 0
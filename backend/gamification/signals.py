@@ -5,10 +5,15 @@ from __future__ import annotations
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .services import award_exp, award_profile_completion_exp
+from users.signals import user_fields_changed
+
+from .achievements import invalidate_achievement_index
+from .leaderboard import move_plan_scores
+from .models import Achievement
+from .services import award_exp, award_profile_completion_exp, award_signup_exp
 
 
 User = get_user_model()
@@ -17,17 +22,24 @@ User = get_user_model()
 @receiver(post_save, sender=User)
 def award_user_profile_exp(sender: Any, instance: Any, created: bool, **kwargs: Any) -> None:
     if created:
-        award_exp(
-            instance,
-            "user.signup",
-            reference_id=instance.pk,
-            reference_type="user.signup",
-            description="新規登録",
-        )
+        award_signup_exp(instance)
 
     award_profile_completion_exp(instance)
 
 
+@receiver(post_save, sender=User)
+def move_leaderboard_plan_scores(sender: Any, instance: Any, created: bool, **kwargs: Any) -> None:
+    """プランが変わった保存だけ、プラン別ランキングの行を新しいプランへ移す。"""
+    if not created and user_fields_changed(instance, "subscription_plan"):
+        move_plan_scores(instance)
+
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def refresh_achievement_index(sender: Any, instance: Achievement, **kwargs: Any) -> None:
+    invalidate_achievement_index()
+
+
 def _award_created_instance(
     *,
     instance: Any,
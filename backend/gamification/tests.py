@@ -1,14 +1,38 @@
-from datetime import date
+import json
+import tempfile
+from datetime import date, timedelta
 from decimal import Decimal
+from pathlib import Path
 
 # pylint: disable=no-member
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
 from users.models import UserProfile
 
-from .models import ExpAction, UserExpLog
+from .achievements import backfill_achievements
+from .benchmark import (
+    ScenarioResult,
+    _BenchRun,
+    cleanup,
+    compare_with_baseline,
+    run_benchmark,
+    save_baseline,
+    seed_users,
+)
+from .exp_log_storage import rollup_exp_log
+from .leaderboard import compact_leaderboards, get_top, get_user_rank
+from .models import (
+    Achievement,
+    ExpAction,
+    LeaderboardScore,
+    UserAchievement,
+    UserExpDaily,
+    UserExpLog,
+)
 from .services import award_exp, award_profile_completion_exp, calculate_level
 
 
@@ -50,6 +74,18 @@ class ExpAwardServiceTest(TestCase):
         self.assertEqual(self.user.total_exp, 70)
         self.assertEqual(UserExpLog.objects.filter(action__action_type="artwork.upload").count(), 1)
 
+    def test_award_without_reference_id_is_its_own_one_time_key(self):
+        def award(reference_id):
+            return award_exp(
+                self.user, "artwork.upload", reference_id=reference_id, reference_type="artwork"
+            )
+
+        self.assertEqual(award(1), 50)
+        # id 付きの付与があっても、reference_id=None の付与は別のキーとして一度だけ通る
+        self.assertEqual(award(None), 50)
+        self.assertEqual(award(None), 0)
+        self.assertEqual(award(2), 50)
+
     def test_complete_user_information_reaches_level_three(self):
         self.user.display_name = "EXP User"
         self.user.bio = "Creative profile"
@@ -95,3 +131,297 @@ class ExpAwardServiceTest(TestCase):
             for action in ExpAction.objects.filter(action_type__startswith="profile.")
         )
         self.assertEqual(profile_total, 1000)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.alice = User.objects.create_user(username="alice", password="pw")
+        self.bob = User.objects.create_user(username="bob", password="pw")
+        self.bob.subscription_plan = "standard"
+        self.bob.save()
+
+    def test_award_updates_rank_incrementally(self):
+        award_exp(self.bob, "artwork.upload", reference_id=1, reference_type="artwork")
+
+        bob_rank = get_user_rank(self.bob)
+        alice_rank = get_user_rank(self.alice)
+        self.assertEqual(bob_rank["rank"], 1)
+        self.assertEqual(bob_rank["score"], 70)
+        self.assertEqual(alice_rank["rank"], 2)
+        self.assertEqual(get_user_rank(self.bob, board="weekly", plan="standard")["rank"], 1)
+        self.assertIsNone(get_user_rank(self.alice, plan="standard"))
+        self.assertEqual([row["username"] for row in get_top(limit=2)], ["bob", "alice"])
+
+    def test_rank_uses_cached_snapshot_and_own_live_score(self):
+        award_exp(self.bob, "artwork.upload", reference_id=1, reference_type="artwork")
+        self.assertEqual(get_user_rank(self.alice)["rank"], 2)
+
+        for reference_id in range(1, 3):
+            award_exp(self.alice, "artwork.upload", reference_id=reference_id, reference_type="artwork")
+
+        with self.assertNumQueries(1):
+            # 自分のスコアだけ読み、順位はスナップショットから求める
+            self.assertEqual(get_user_rank(self.alice)["rank"], 1)
+        # 他ユーザーの加算はスナップショットの更新まで反映されない
+        self.assertEqual(get_user_rank(self.bob)["rank"], 1)
+        cache.clear()
+        self.assertEqual(get_user_rank(self.bob)["rank"], 2)
+
+    def test_plan_change_moves_plan_scores(self):
+        award_exp(self.bob, "artwork.upload", reference_id=1, reference_type="artwork")
+
+        self.bob.subscription_plan = "Premium"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.save()
+
+        self.assertIsNone(get_user_rank(self.bob, plan="standard"))
+        moved = get_user_rank(self.bob, plan="PREMIUM")
+        self.assertEqual((moved["plan"], moved["score"], moved["rank"]), ("premium", 70, 1))
+        self.assertFalse(LeaderboardScore.objects.filter(user=self.bob, plan="standard").exists())
+
+    def test_compaction_rebuilds_from_source_data(self):
+        LeaderboardScore.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = compact_leaderboards()
+
+        self.assertEqual(result["rebuilt"]["all_time"], 2)
+        self.assertEqual(get_user_rank(self.alice, board="monthly")["score"], 20)
+        self.assertEqual(get_user_rank(self.bob, board="monthly", plan="standard")["rank"], 1)
+
+
+class AchievementEngineTest(TestCase):
+    def setUp(self):
+        self.first_upload = Achievement.objects.create(
+            name="First upload", condition_type="artwork.upload", condition_value=1
+        )
+        self.exp_100 = Achievement.objects.create(
+            name="100 EXP", condition_type="total_exp", condition_value=100
+        )
+        self.user = get_user_model().objects.create_user(username="achiever", password="pw")
+
+    def test_exp_event_updates_progress_and_completes_once(self):
+        award_exp(self.user, "artwork.upload", reference_id=1, reference_type="artwork")
+
+        upload = UserAchievement.objects.get(user=self.user, achievement=self.first_upload)
+        exp = UserAchievement.objects.get(user=self.user, achievement=self.exp_100)
+        self.assertIsNotNone(upload.completed_at)
+        self.assertEqual(exp.progress, 70)
+        self.assertIsNone(exp.completed_at)
+
+        completed_at = upload.completed_at
+        award_exp(self.user, "artwork.upload", reference_id=2, reference_type="artwork")
+        upload.refresh_from_db()
+        exp.refresh_from_db()
+        self.assertEqual(upload.completed_at, completed_at)
+        self.assertEqual(exp.progress, 100)
+        self.assertIsNotNone(exp.completed_at)
+
+    def test_backfill_computes_progress_for_all_users(self):
+        other = get_user_model().objects.create_user(username="other", password="pw")
+        UserAchievement.objects.all().delete()
+
+        result = backfill_achievements()
+
+        self.assertEqual(result["users"], 2)
+        self.assertEqual(
+            UserAchievement.objects.filter(achievement=self.exp_100, progress=20).count(), 2
+        )
+        self.assertFalse(
+            UserAchievement.objects.filter(user=other, achievement=self.first_upload).exists()
+        )
+
+
+class ExpLogRollupTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="veteran", password="pw")
+        for reference_id in (1, 2):
+            award_exp(self.user, "artwork.upload", reference_id=reference_id, reference_type="artwork")
+        UserExpLog.objects.update(created_at=timezone.now() - timedelta(days=120))
+
+    def test_rollup_moves_old_rows_and_keeps_award_idempotency(self):
+        self.assertEqual(rollup_exp_log(apply=False)["rows"], 3)
+
+        result = rollup_exp_log()
+
+        self.assertEqual(result["deleted"], 3)
+        daily = UserExpDaily.objects.get(user=self.user, action_id="artwork.upload")
+        self.assertEqual((daily.count, daily.exp_gained), (2, 100))
+        self.assertFalse(UserExpLog.objects.exists())
+        self.assertEqual(rollup_exp_log()["days"], 0)
+        self.assertEqual(
+            award_exp(self.user, "artwork.upload", reference_id=1, reference_type="artwork"), 0
+        )
+
+    def test_achievement_counts_include_rolled_up_days(self):
+        rollup_exp_log()
+        achievement = Achievement.objects.create(
+            name="Two uploads", condition_type="artwork.upload", condition_value=2
+        )
+
+        backfill_achievements()
+
+        self.assertIsNotNone(
+            UserAchievement.objects.get(user=self.user, achievement=achievement).completed_at
+        )
+
+
+class ExpBenchmarkBaselineTest(TestCase):
+    def _result(self, **overrides):
+        values = {
+            "scenario": "award_exp",
+            "vendor": "sqlite",
+            "users": 1,
+            "actions": 1,
+            "concurrency": 1,
+            "ops": 100,
+            "awarded": 100,
+            "errors": 0,
+            "seconds": 1.0,
+            "ops_per_sec": 100.0,
+            "p50_ms": 5.0,
+            "p99_ms": 10.0,
+            "queries_per_op": 8.0,
+            "lock_wait_ms": 0.0,
+        }
+        values.update(overrides)
+        return ScenarioResult(**values)
+
+    def test_compare_flags_only_metrics_beyond_tolerance(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "baseline.json"
+            save_baseline(path, [self._result()])
+
+            comparison = compare_with_baseline(
+                path,
+                [self._result(ops_per_sec=90.0, queries_per_op=12.0)],
+                tolerance=0.2,
+            )
+            mismatched = compare_with_baseline(path, [self._result(concurrency=4)], tolerance=0.2)
+
+        self.assertEqual(comparison.compared, ["sqlite:award_exp"])
+        self.assertEqual(len(comparison.regressions), 1)
+        self.assertIn("queries_per_op", comparison.regressions[0])
+        self.assertEqual((mismatched.compared, mismatched.load_mismatch), ([], ["sqlite:award_exp"]))
+
+    def test_committed_baseline_matches_command_defaults(self):
+        from django.conf import settings
+
+        from .management.commands.benchmark_exp import Command
+
+        parser = Command().create_parser("manage.py", "benchmark_exp")
+        defaults = vars(parser.parse_args([]))
+        baseline = json.loads(
+            (Path(settings.BASE_DIR) / "benchmarks" / "exp_baseline.json").read_text(encoding="utf-8")
+        )
+
+        for entry in baseline.values():
+            self.assertEqual(
+                (entry["users"], entry["actions"], entry["concurrency"]),
+                (defaults["users"], defaults["actions"], defaults["concurrency"]),
+            )
+
+    def test_cleanup_deletes_only_users_seeded_by_the_run(self):
+        real = get_user_model().objects.create_user(username="bench_real", email="real@example.com")
+        run = _BenchRun()
+        seed_users(run, "award_exp", 3)
+
+        cleanup(run)
+
+        self.assertEqual(list(get_user_model().objects.values_list("pk", flat=True)), [real.pk])
+
+    def test_refuses_non_test_database_without_flag(self):
+        from unittest.mock import patch
+
+        from django.db import connection
+
+        with patch.dict(connection.settings_dict, {"NAME": "eldonia_nex"}):
+            with self.assertRaises(RuntimeError):
+                run_benchmark(["award_exp"], users=1, actions=1, concurrency=1)
+
+
+class UserExpLogAdminKeysetTest(TestCase):
+    def test_next_link_pages_by_primary_key(self):
+        from unittest.mock import patch
+
+        from .admin import UserExpLogAdmin
+
+        User = get_user_model()
+        admin_user = User.objects.create_superuser(username="ops", email="ops@example.com", password="pw")
+        UserExpLog.objects.all().delete()
+        UserExpLog.objects.bulk_create(
+            [
+                UserExpLog(user=admin_user, action_id="artwork.upload", exp_gained=index)
+                for index in range(5)
+            ]
+        )
+        newest_first = list(UserExpLog.objects.order_by("-pk").values_list("pk", flat=True))
+        self.client.force_login(admin_user)
+
+        with patch.object(UserExpLogAdmin, "list_per_page", 2):
+            first = self.client.get("/admin/gamification/userexplog/")
+            second = self.client.get("/admin/gamification/userexplog/", {"after": newest_first[1]})
+            last = self.client.get("/admin/gamification/userexplog/", {"after": newest_first[3]})
+
+        self.assertEqual([row.pk for row in first.context["cl"].result_list], newest_first[:2])
+        self.assertEqual(first.context["cl"].keyset_next_url, f"?after={newest_first[1]}")
+        self.assertEqual([row.pk for row in second.context["cl"].result_list], newest_first[2:4])
+        self.assertEqual([row.pk for row in last.context["cl"].result_list], newest_first[4:])
+        self.assertIsNone(last.context["cl"].keyset_next_url)
+        self.assertContains(last, "« 最新")
+        # 件数は after より後ろの残りではなく一覧全体
+        self.assertEqual(
+            [response.context["cl"].result_count for response in (first, second, last)], [5, 5, 5]
+        )
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="counted", password="pw")
+        UserExpLog.objects.all().delete()
+        UserExpLog.objects.bulk_create(
+            [UserExpLog(user=user, action_id="artwork.upload", exp_gained=index) for index in range(3)]
+        )
+
+    def _paginator(self, queryset, *, reltuples=None):
+        from unittest.mock import MagicMock, patch
+
+        from eldinia_nex.admin_pagination import EstimatedCountPaginator
+
+        connection = MagicMock(vendor="postgresql")
+        connection.cursor.return_value.__enter__.return_value.fetchone.return_value = (reltuples,)
+        paginator = EstimatedCountPaginator(queryset.order_by("-pk"), 2)
+        with patch("eldinia_nex.admin_pagination.connections", {queryset.db: connection}):
+            paginator.count  # pylint: disable=pointless-statement
+        return paginator
+
+    def test_unfiltered_list_uses_reltuples_and_allows_pages_past_the_estimate(self):
+        paginator = self._paginator(UserExpLog.objects.all(), reltuples=25000)
+
+        self.assertEqual(paginator.count, 25000)
+        self.assertTrue(paginator.count_is_estimated)
+        self.assertEqual(list(paginator.page(20000).object_list), [])
+        self.assertEqual(len(paginator.page(1).object_list), 2)
+
+    def test_filtered_list_uses_explain_rows(self):
+        from unittest.mock import patch
+
+        from django.db.models.query import QuerySet
+
+        plan = json.dumps([{"Plan": {"Plan Rows": 12000}}])
+        with patch.object(QuerySet, "explain", return_value=plan):
+            paginator = self._paginator(UserExpLog.objects.filter(exp_gained__gte=0))
+
+        self.assertEqual((paginator.count, paginator.count_is_estimated), (12000, True))
+
+    def test_small_or_unanalyzed_estimates_fall_back_to_exact_count(self):
+        from django.core.paginator import EmptyPage
+
+        for reltuples in (50, -1):
+            paginator = self._paginator(UserExpLog.objects.all(), reltuples=reltuples)
+            self.assertEqual((paginator.count, paginator.count_is_estimated), (3, False))
+            with self.assertRaises(EmptyPage):
+                paginator.page(3)
@@ -1,4 +1,56 @@
-"""Views for gamification app.
+"""Gamification API（Next.js 向け内部 API）"""
 
-Currently no view implementations; placeholder module.
-"""
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .leaderboard import BOARDS, get_top, get_user_rank, period_start
+
+MAX_LEADERBOARD_LIMIT = 100
+
+
+def _authorize_internal(request) -> bool:
+    internal_token = getattr(settings, "INTERNAL_API_TOKEN", "")
+    if not internal_token:
+        return True
+    return request.headers.get("x-internal-api-token") == internal_token
+
+
+@require_GET
+def leaderboard_view(request):
+    """EXP ランキング上位と、指定ユーザー（Supabase user id）の順位を返す。"""
+    if not _authorize_internal(request):
+        return JsonResponse({"error": "unauthorized"}, status=401)
+
+    board = (request.GET.get("board") or "all_time").strip().lower()
+    if board not in BOARDS:
+        return JsonResponse({"error": f"board must be one of {', '.join(BOARDS)}"}, status=400)
+    plan = (request.GET.get("plan") or "").strip().lower()
+    try:
+        limit = min(max(int(request.GET.get("limit") or 50), 1), MAX_LEADERBOARD_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+
+    me = None
+    supabase_user_id = (request.GET.get("supabase_user_id") or "").strip()
+    if supabase_user_id:
+        try:
+            external_id = uuid.UUID(supabase_user_id)
+        except ValueError:
+            return JsonResponse({"error": "supabase_user_id must be a valid UUID"}, status=400)
+        user = get_user_model().objects.filter(external_id=external_id).first()
+        if user:
+            me = get_user_rank(user, board=board, plan=plan)
+
+    return JsonResponse(
+        {
+            "board": board,
+            "period_start": period_start(board).isoformat(),
+            "plan": plan,
+            "entries": get_top(board=board, plan=plan, limit=limit),
+            "me": me,
+        }
+    )
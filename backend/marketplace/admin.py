@@ -1,6 +1,10 @@
 from django.contrib import admin, messages
 
+from eldinia_nex.admin_pagination import EstimatedCountAdmin, KeysetPaginationAdmin
+from eldinia_nex.admin_search import IndexedSearchMixin
+
 from .models import (
+    VERIFY_ARTWORK_Q,
     Artwork,
     Category,
     Comment,
@@ -15,14 +19,19 @@ from .models import (
     Transaction,
 )
 from .admin_filters import (
+    ArtworkStatusFilter,
     CreatorFilter,
     GalleryCategoryFilter,
+    ShopActiveFilter,
+    ShopCategoryFilter,
+    ShopProductTypeFilter,
     VerifyArtworkFilter,
     gallery_category_label,
     infer_gallery_category,
 )
+from .facets import invalidate_facet_counts
 from .supabase_sync import (
-    hide_supabase_artworks_by_title_prefix,
+    hide_supabase_verify_artworks,
     resolve_artwork_supabase_ids,
     set_supabase_artworks_visibility,
     set_supabase_shop_products_active,
@@ -32,6 +41,7 @@ from .supabase_sync import (
 def _apply_gallery_visibility(modeladmin, request, queryset, *, is_public: bool, status: str) -> None:
     supabase_ids, resolved_from_title, still_missing = resolve_artwork_supabase_ids(queryset)
     updated = queryset.update(status=status)
+    invalidate_facet_counts(Artwork)
     synced = 0
     sync_errors: list[str] = []
     if supabase_ids:
@@ -87,12 +97,13 @@ def make_artworks_private(modeladmin, request, queryset):
 def hide_verify_test_artworks(modeladmin, request, queryset):
     del queryset
     try:
-        hidden = hide_supabase_artworks_by_title_prefix("[verify]%")
+        hidden = hide_supabase_verify_artworks()
     except Exception as exc:
         modeladmin.message_user(request, str(exc), messages.ERROR)
         return
 
-    updated = Artwork.objects.filter(title__istartswith="[verify]").update(status="draft")
+    updated = Artwork.objects.filter(VERIFY_ARTWORK_Q).update(status="draft")
+    invalidate_facet_counts(Artwork)
     modeladmin.message_user(
         request,
         f"[verify] テスト作品 {hidden} 件を GALLERY 非公開にしました（Django: {updated} 件）。",
@@ -111,7 +122,7 @@ class TagAdmin(admin.ModelAdmin):  # type: ignore
 
 
 @admin.register(Artwork)
-class ArtworkAdmin(admin.ModelAdmin):  # type: ignore
+class ArtworkAdmin(IndexedSearchMixin, EstimatedCountAdmin):
     list_display = (
         "id",
         "supabase_id_short",
@@ -122,19 +133,15 @@ class ArtworkAdmin(admin.ModelAdmin):  # type: ignore
         "created_at",
     )
     list_filter = (
-        "status",
+        ArtworkStatusFilter,
         GalleryCategoryFilter,
         CreatorFilter,
         VerifyArtworkFilter,
     )
-    search_fields = (
-        "title",
-        "description",
-        "supabase_id",
-        "creator__username",
-        "creator__display_name",
-        "creator_display_name",
-    )
+    search_fields = ("title", "description", "creator_display_name")
+    search_uuid_fields = ("supabase_id", "creator__external_id")
+    search_email_fields = ("creator__email",)
+    search_related_fields = {"creator": ("username", "display_name")}
     readonly_fields = ("supabase_id", "gallery_category")
     autocomplete_fields = ("creator",)
     list_select_related = ("creator",)
@@ -159,6 +166,7 @@ class ArtworkAdmin(admin.ModelAdmin):  # type: ignore
 def _apply_shop_product_active(modeladmin, request, queryset, *, is_active: bool) -> None:
     supabase_ids = [row.supabase_id for row in queryset if row.supabase_id]
     updated = queryset.update(is_active=is_active)
+    invalidate_facet_counts(ShopProduct)
     synced = 0
     sync_errors: list[str] = []
     if supabase_ids:
@@ -192,7 +200,7 @@ def make_shop_products_inactive(modeladmin, request, queryset):
 
 
 @admin.register(ShopProduct)
-class ShopProductAdmin(admin.ModelAdmin):  # type: ignore
+class ShopProductAdmin(IndexedSearchMixin, EstimatedCountAdmin):
     list_display = (
         "title",
         "category",
@@ -204,8 +212,17 @@ class ShopProductAdmin(admin.ModelAdmin):  # type: ignore
         "is_nexus_choice",
         "created_at",
     )
-    list_filter = ("is_active", "category", "product_type", "is_nexus_prime", "is_nexus_choice")
-    search_fields = ("title", "description", "supabase_id", "seller__username", "seller__display_name")
+    list_filter = (
+        ShopActiveFilter,
+        ShopCategoryFilter,
+        ShopProductTypeFilter,
+        "is_nexus_prime",
+        "is_nexus_choice",
+    )
+    search_fields = ("title", "description")
+    search_uuid_fields = ("supabase_id", "seller_external_id")
+    search_email_fields = ("seller__email",)
+    search_related_fields = {"seller": ("username", "display_name")}
     readonly_fields = ("supabase_id", "seller_external_id", "created_at", "updated_at")
     autocomplete_fields = ("seller",)
     list_select_related = ("seller",)
@@ -250,7 +267,7 @@ class FanAdmin(admin.ModelAdmin):  # type: ignore
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):  # type: ignore
+class TransactionAdmin(KeysetPaginationAdmin):
     list_display = ("user", "transaction_type", "amount", "created_at")
 
 
@@ -270,5 +287,6 @@ class ReferralAdmin(admin.ModelAdmin):  # type: ignore
 
 
 @admin.register(ReferralTrack)
-class ReferralTrackAdmin(admin.ModelAdmin):  # type: ignore
+class ReferralTrackAdmin(KeysetPaginationAdmin):
     list_display = ("referral", "tracking_type", "visitor_ip", "created_at")
+    list_select_related = ("referral",)
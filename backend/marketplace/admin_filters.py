@@ -1,9 +1,11 @@
 """Django Admin 用 — GALLERY 作品一覧の絞り込み"""
 
 from django.contrib import admin
-from django.db.models import QuerySet
+from django.core.cache import cache
+from django.db.models import Max, Q, QuerySet
 
-from marketplace.models import Artwork
+from marketplace.facets import VERIFY_KIND_TO_CATEGORY, facet_counts, verify_category_q
+from marketplace.models import VERIFY_ARTWORK_Q, Artwork, ShopProduct
 
 GALLERY_CATEGORY_LABELS: dict[str, str] = {
     "illustration": "イラスト",
@@ -17,13 +19,16 @@ GALLERY_CATEGORY_LABELS: dict[str, str] = {
     "other": "その他",
 }
 
-_VERIFY_KIND_TO_CATEGORY = {
-    "image": "illustration",
-    "audio": "music",
-    "document": "document",
-    "model": "3d",
+ARTWORK_STATUS_LABELS: dict[str, str] = {
+    "published": "公開",
+    "draft": "非公開",
 }
 
+ARTWORK_CREATORS_CACHE_KEY = "admin:artwork_creators"
+ARTWORK_CREATORS_CACHE_SECONDS = 600
+# これを超える作者数では選択肢を並べず、ID / 名前の入力欄で絞り込む
+CREATOR_FILTER_CHOICE_LIMIT = 300
+
 
 def gallery_category_label(slug: str) -> str:
     if not slug:
@@ -34,99 +39,195 @@ def gallery_category_label(slug: str) -> str:
 def infer_gallery_category(artwork: Artwork) -> str:
     if artwork.gallery_category:
         return artwork.gallery_category
-    title = (artwork.title or "").strip().lower()
-    if not title.startswith("[verify]"):
-        return ""
-    parts = title.split()
-    if len(parts) < 2:
-        return ""
-    return _VERIFY_KIND_TO_CATEGORY.get(parts[1], "")
+    return VERIFY_KIND_TO_CATEGORY.get(artwork.verify_kind, "")
 
 
-class GalleryCategoryFilter(admin.SimpleListFilter):
-    title = "GALLERYカテゴリ"
-    parameter_name = "gallery_category"
+def _with_count(label: str, count: int) -> str:
+    return f"{label} ({count})"
+
+
+class FacetListFilter(admin.SimpleListFilter):
+    """marketplace.facets の件数から選択肢を作る絞り込み（表示ごとの集計クエリなし）。"""
+
+    facet_model: type = Artwork
+    facet_name = ""
+
+    def facet_values(self) -> dict:
+        return facet_counts(self.facet_model).get(self.facet_name, {})
+
+    def value_label(self, value) -> str:
+        return str(value)
 
     def lookups(self, request, model_admin):
-        slugs = set(
-            Artwork.objects.exclude(gallery_category="")
-            .values_list("gallery_category", flat=True)
-            .distinct()
-        )
-        if Artwork.objects.filter(title__istartswith="[verify]").exists():
-            slugs.update(_VERIFY_KIND_TO_CATEGORY.values())
         return [
-            (slug, gallery_category_label(slug))
-            for slug in sorted(slugs, key=lambda value: gallery_category_label(value))
+            (str(value), _with_count(self.value_label(value), count))
+            for value, count in sorted(
+                self.facet_values().items(), key=lambda item: self.value_label(item[0])
+            )
+            if value not in ("", None)
         ]
 
+    def queryset(self, request, queryset: QuerySet):
+        if self.value():
+            return queryset.filter(**{self.facet_name: self.value()})
+        return queryset
+
+
+class ArtworkStatusFilter(FacetListFilter):
+    title = "status"
+    parameter_name = "status"
+    facet_name = "status"
+
+    def value_label(self, value) -> str:
+        return ARTWORK_STATUS_LABELS.get(value, value)
+
+
+class GalleryCategoryFilter(FacetListFilter):
+    title = "GALLERYカテゴリ"
+    parameter_name = "gallery_category"
+    facet_name = "gallery_category"
+
+    def value_label(self, value) -> str:
+        return gallery_category_label(value)
+
     def queryset(self, request, queryset: QuerySet[Artwork]):
         value = self.value()
         if not value:
             return queryset
+        return queryset.filter(Q(gallery_category=value) | verify_category_q(value))
+
+
+def _creator_label(row: dict) -> str:
+    return (
+        (row["artwork_display_name"] or "").strip()
+        or (row["user_display_name"] or "").strip()
+        or (row["username"] or "").strip()
+        or f"User #{row['creator_id']}"
+    )
+
+
+def artwork_creator_choices() -> list[tuple[str, str]]:
+    """作品を持つ作者の (id, 表示名) 一覧。作者ごとの集計 1 クエリをキャッシュする。"""
+    choices = cache.get(ARTWORK_CREATORS_CACHE_KEY)
+    if choices is not None:
+        return choices
+    rows = (
+        Artwork.objects.values("creator_id")
+        .annotate(
+            artwork_display_name=Max("creator_display_name"),
+            user_display_name=Max("creator__display_name"),
+            username=Max("creator__username"),
+        )
+        .order_by()
+    )
+    choices = sorted(
+        ((str(row["creator_id"]), _creator_label(row)) for row in rows),
+        key=lambda item: item[1].casefold(),
+    )
+    cache.set(ARTWORK_CREATORS_CACHE_KEY, choices, ARTWORK_CREATORS_CACHE_SECONDS)
+    return choices
 
-        from django.db.models import Q
-
-        direct = Q(gallery_category=value)
-        verify_kinds = [kind for kind, cat in _VERIFY_KIND_TO_CATEGORY.items() if cat == value]
-        if not verify_kinds:
-            return queryset.filter(direct)
 
-        verify_q = Q()
-        for kind in verify_kinds:
-            verify_q |= Q(gallery_category="", title__istartswith=f"[verify] {kind}")
-        return queryset.filter(direct | verify_q).distinct()
+def invalidate_artwork_creator_choices() -> None:
+    cache.delete(ARTWORK_CREATORS_CACHE_KEY)
 
 
 class CreatorFilter(admin.SimpleListFilter):
     title = "ユーザー（作者）"
     parameter_name = "creator"
+    input_template = "admin/marketplace/creator_filter_input.html"
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.use_input = len(self.lookup_choices) > CREATOR_FILTER_CHOICE_LIMIT
+        if self.use_input:
+            self.template = self.input_template
 
     def lookups(self, request, model_admin):
-        creators: dict[int, str] = {}
-        for artwork in (
-            Artwork.objects.select_related("creator")
-            .only(
-                "creator_id",
-                "creator_display_name",
-                "creator__username",
-                "creator__display_name",
-            )
-            .order_by("creator_display_name", "creator__username")
-        ):
-            if artwork.creator_id in creators:
-                continue
-            label = (
-                (artwork.creator_display_name or "").strip()
-                or (getattr(artwork.creator, "display_name", "") or "").strip()
-                or (getattr(artwork.creator, "username", "") or "").strip()
-                or f"User #{artwork.creator_id}"
-            )
-            creators[artwork.creator_id] = label
-        return [
-            (str(creator_id), label)
-            for creator_id, label in sorted(creators.items(), key=lambda item: item[1].casefold())
+        return artwork_creator_choices()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        if not self.use_input:
+            yield from super().choices(changelist)
+            return
+        all_choice = next(super().choices(changelist))
+        # 入力フォームで他の絞り込み条件を引き継ぐための hidden 値
+        all_choice["query_parts"] = [
+            (key, value)
+            for key, values in changelist.get_filters_params().items()
+            if key != self.parameter_name
+            for value in (values if isinstance(values, list) else [values])
         ]
+        yield all_choice
 
     def queryset(self, request, queryset: QuerySet[Artwork]):
-        if self.value():
-            return queryset.filter(creator_id=self.value())
-        return queryset
+        value = (self.value() or "").strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(creator_id=value)
+        return queryset.filter(
+            Q(creator__username__istartswith=value)
+            | Q(creator_display_name__icontains=value)
+            | Q(creator__display_name__icontains=value)
+        )
 
 
-class VerifyArtworkFilter(admin.SimpleListFilter):
+class VerifyArtworkFilter(FacetListFilter):
     title = "作品種別"
     parameter_name = "verify"
+    facet_name = "verify"
+    labels = {"real": "本番作品", "verify": "[verify] テスト"}
 
     def lookups(self, request, model_admin):
-        return (
-            ("real", "本番作品"),
-            ("verify", "[verify] テスト"),
-        )
+        counts = self.facet_values()
+        return [
+            (value, _with_count(label, counts.get(value, 0)))
+            for value, label in self.labels.items()
+        ]
 
     def queryset(self, request, queryset: QuerySet[Artwork]):
         if self.value() == "verify":
-            return queryset.filter(title__istartswith="[verify]")
+            return queryset.filter(VERIFY_ARTWORK_Q)
         if self.value() == "real":
-            return queryset.exclude(title__istartswith="[verify]")
+            return queryset.filter(verify_kind="")
+        return queryset
+
+
+class ShopCategoryFilter(FacetListFilter):
+    title = "category"
+    parameter_name = "category"
+    facet_model = ShopProduct
+    facet_name = "category"
+
+
+class ShopProductTypeFilter(FacetListFilter):
+    title = "product type"
+    parameter_name = "product_type"
+    facet_model = ShopProduct
+    facet_name = "product_type"
+
+    def value_label(self, value) -> str:
+        return dict(ShopProduct.PRODUCT_TYPE_CHOICES).get(value, value)
+
+
+class ShopActiveFilter(FacetListFilter):
+    title = "is active"
+    parameter_name = "is_active"
+    facet_model = ShopProduct
+    facet_name = "is_active"
+
+    def lookups(self, request, model_admin):
+        counts = self.facet_values()
+        return [
+            ("1", _with_count("公開", counts.get(True, 0))),
+            ("0", _with_count("非公開", counts.get(False, 0))),
+        ]
+
+    def queryset(self, request, queryset: QuerySet[ShopProduct]):
+        if self.value() in ("0", "1"):
+            return queryset.filter(is_active=self.value() == "1")
         return queryset
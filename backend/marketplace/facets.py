@@ -0,0 +1,98 @@
+"""Admin 絞り込み（ファセット）用の値ごとの件数。
+
+モデルごとにファセット列をまとめて GROUP BY する 1 クエリで全ファセットの件数を求め、
+キャッシュする。作品・商品の保存 / 削除（signals）と Admin の一括更新で無効化する。
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+
+from .models import Artwork, ShopProduct
+
+FACET_CACHE_SECONDS = 600
+
+# [verify] テスト作品の種別 → GALLERY カテゴリ（gallery_category が空のときの推定）
+VERIFY_KIND_TO_CATEGORY = {
+    "image": "illustration",
+    "audio": "music",
+    "document": "document",
+    "model": "3d",
+}
+
+SHOP_PRODUCT_FACET_FIELDS = ("category", "product_type", "is_active")
+
+
+def _artwork_facet_queryset():
+    inferred_category = Case(
+        *[
+            When(gallery_category="", verify_kind=kind, then=Value(category))
+            for kind, category in VERIFY_KIND_TO_CATEGORY.items()
+        ],
+        default=F("gallery_category"),
+        output_field=CharField(),
+    )
+    verify = Case(
+        When(verify_kind="", then=Value("real")),
+        default=Value("verify"),
+        output_field=CharField(),
+    )
+    return (
+        Artwork.objects.annotate(facet_category=inferred_category, facet_verify=verify)
+        .values("status", "facet_category", "facet_verify")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+
+
+def _shop_product_facet_queryset():
+    return (
+        ShopProduct.objects.values(*SHOP_PRODUCT_FACET_FIELDS).annotate(count=Count("pk")).order_by()
+    )
+
+
+# モデル → (GROUP BY クエリ, {クエリの列: ファセット名})
+_FACET_QUERIES = {
+    Artwork: (
+        _artwork_facet_queryset,
+        {"status": "status", "facet_category": "gallery_category", "facet_verify": "verify"},
+    ),
+    ShopProduct: (
+        _shop_product_facet_queryset,
+        {field: field for field in SHOP_PRODUCT_FACET_FIELDS},
+    ),
+}
+
+
+def _cache_key(model: type) -> str:
+    return f"admin:facets:{model._meta.label_lower}"
+
+
+def facet_counts(model: type) -> dict[str, dict[Any, int]]:
+    """{ファセット名: {値: 件数}}。キャッシュが無ければ GROUP BY 1 クエリで求める。"""
+    key = _cache_key(model)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+    build_queryset, columns = _FACET_QUERIES[model]
+    grouped: dict[str, dict[Any, int]] = {facet: defaultdict(int) for facet in columns.values()}
+    for row in build_queryset():
+        for column, facet in columns.items():
+            grouped[facet][row[column]] += row["count"]
+    counts = {facet: dict(values) for facet, values in grouped.items()}
+    cache.set(key, counts, FACET_CACHE_SECONDS)
+    return counts
+
+
+def invalidate_facet_counts(model: type) -> None:
+    cache.delete(_cache_key(model))
+
+
+def verify_category_q(category: str) -> Q:
+    """gallery_category が空の [verify] 作品のうち、category に推定されるもの。"""
+    kinds = [kind for kind, mapped in VERIFY_KIND_TO_CATEGORY.items() if mapped == category]
+    return Q(gallery_category="", verify_kind__in=kinds)
@@ -0,0 +1,24 @@
+"""紹介コード未発行の有料会員へ一括でコードを発行する管理コマンド"""
+
+from django.core.management.base import BaseCommand
+
+from marketplace.referral_service import provision_referral_codes
+
+
+class Command(BaseCommand):
+    help = "Issue referral codes to every paid member that has no open code (set-based backfill)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Apply changes. Without this flag, dry-run only.",
+        )
+
+    def handle(self, *args, **options):
+        result = provision_referral_codes(apply=options["apply"])
+        if not options["apply"]:
+            self.stdout.write(f"Paid members without a referral code: {result['users']}")
+            self.stdout.write(self.style.WARNING("Dry-run only. Rerun with --apply to commit."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"referral codes: {result}"))
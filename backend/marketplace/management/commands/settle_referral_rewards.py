@@ -0,0 +1,13 @@
+"""保留期間を過ぎた完了注文の紹介リベートを精算する管理コマンド（cron で定期実行）"""
+
+from django.core.management.base import BaseCommand
+
+from marketplace.referral_service import settle_referral_rewards
+
+
+class Command(BaseCommand):
+    help = "Pay referral rebates for completed orders whose referral hold period has elapsed."
+
+    def handle(self, *args, **options):
+        result = settle_referral_rewards()
+        self.stdout.write(self.style.SUCCESS(f"referral rewards: {result}"))
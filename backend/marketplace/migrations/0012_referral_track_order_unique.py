@@ -0,0 +1,57 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:10
+
+import logging
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+logger = logging.getLogger(__name__)
+
+
+def dedupe_order_tracks(apps, schema_editor):  # pylint: disable=unused-argument
+    """一意制約の前に重複 track を削除する。削除する行はすべて WARNING で記録する。"""
+    ReferralTrack = apps.get_model("marketplace", "ReferralTrack")
+    duplicates = (
+        ReferralTrack.objects.filter(order_id__isnull=False)
+        .values("order_id", "tracking_type")
+        .annotate(keep_id=Min("id"), rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicates):
+        extra = ReferralTrack.objects.filter(
+            order_id=row["order_id"],
+            tracking_type=row["tracking_type"],
+        ).exclude(pk=row["keep_id"])
+        for track in extra.values(
+            "pk", "referral_id", "converted_user_id", "created_at"
+        ):
+            logger.warning(
+                "removing duplicate referral track id=%s order_id=%s tracking_type=%s "
+                "referral_id=%s converted_user_id=%s created_at=%s (kept id=%s)",
+                track["pk"],
+                row["order_id"],
+                row["tracking_type"],
+                track["referral_id"],
+                track["converted_user_id"],
+                track["created_at"],
+                row["keep_id"],
+            )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0011_shop_product_mirror'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_order_tracks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='referraltrack',
+            constraint=models.UniqueConstraint(fields=('order_id', 'tracking_type'), name='referral_tracks_order_tracking_type_uniq'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0012_referral_track_order_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='referral',
+            index=models.Index(fields=['referrer', 'referred_user'], name='referrals_referre_f65cb8_idx'),
+        ),
+    ]
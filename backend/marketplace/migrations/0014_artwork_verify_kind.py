@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0013_referral_lookup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artwork',
+            name='verify_kind',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='artwork',
+            index=models.Index(fields=['verify_kind', 'status'], name='artworks_verify__b68243_idx'),
+        ),
+    ]
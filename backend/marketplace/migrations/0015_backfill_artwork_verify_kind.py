@@ -0,0 +1,43 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+VERIFY_TITLE_PREFIX = "[verify]"
+
+
+def _verify_kind(title):
+    normalized = (title or "").strip().lower()
+    if not normalized.startswith(VERIFY_TITLE_PREFIX):
+        return ""
+    parts = normalized[len(VERIFY_TITLE_PREFIX):].split()
+    return parts[0][:20] if parts else "other"
+
+
+def backfill_verify_kind(apps, schema_editor):  # pylint: disable=unused-argument
+    Artwork = apps.get_model("marketplace", "Artwork")
+
+    # 一度だけの移行なので title の前方一致スキャンで対象を拾う
+    rows = (
+        Artwork.objects.filter(title__istartswith=VERIFY_TITLE_PREFIX)
+        .only("pk", "title")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for artwork in rows:
+        artwork.verify_kind = _verify_kind(artwork.title)
+        batch.append(artwork)
+        if len(batch) >= BATCH_SIZE:
+            Artwork.objects.bulk_update(batch, ["verify_kind"])
+            batch = []
+    if batch:
+        Artwork.objects.bulk_update(batch, ["verify_kind"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marketplace", "0014_artwork_verify_kind"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_verify_kind, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# Admin 検索の icontains（PostgreSQL では UPPER(col::text) LIKE）に効く pg_trgm GIN インデックス。
+# 大きなテーブルをロックしないよう CONCURRENTLY で作るため、この migration は非アトミック。
+TRGM_INDEXES = [
+    ("artworks_title_trgm_idx", "artworks", "title"),
+    ("artworks_description_trgm_idx", "artworks", "description"),
+    ("artworks_creator_name_trgm_idx", "artworks", "creator_display_name"),
+    ("shop_products_title_trgm_idx", "shop_products_mirror", "title"),
+    ("shop_products_description_trgm_idx", "shop_products_mirror", "description"),
+]
+
+
+def create_trgm_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _table, _column in TRGM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("marketplace", "0015_backfill_artwork_verify_kind"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
@@ -24,6 +24,20 @@ class Tag(models.Model):
         db_table = "tags"
 
 
+VERIFY_TITLE_PREFIX = "[verify]"
+# verify_kind のインデックス範囲検索（<> '' はインデックスを使わないため > '' で書く）
+VERIFY_ARTWORK_Q = models.Q(verify_kind__gt="")
+
+
+def classify_verify_kind(title: str | None) -> str:
+    """[verify] テスト作品の種別（"[verify] image ..." → "image"）。本番作品は空文字。"""
+    normalized = (title or "").strip().lower()
+    if not normalized.startswith(VERIFY_TITLE_PREFIX):
+        return ""
+    parts = normalized[len(VERIFY_TITLE_PREFIX):].split()
+    return parts[0][:20] if parts else "other"
+
+
 class Artwork(models.Model):
     supabase_id = models.UUIDField(
         null=True,
@@ -66,6 +80,8 @@ class Artwork(models.Model):
     download_count = models.IntegerField(default=0)
 
     status = models.CharField(max_length=20, default="published")
+    # title から save() で設定（[verify] テスト作品の種別。本番作品は空文字）
+    verify_kind = models.CharField(max_length=20, blank=True, default="", editable=False)
     featured_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -77,8 +93,20 @@ class Artwork(models.Model):
         indexes = [
             models.Index(fields=["creator", "status"]),
             models.Index(fields=["-created_at"]),
+            models.Index(fields=["verify_kind", "status"]),
         ]
 
+    @property
+    def is_verify(self) -> bool:
+        return bool(self.verify_kind)
+
+    def save(self, *args, **kwargs):
+        self.verify_kind = classify_verify_kind(self.title)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "title" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "verify_kind"}
+        super().save(*args, **kwargs)
+
 
 class ArtworkTag(models.Model):
     artwork = models.ForeignKey(Artwork, on_delete=models.CASCADE)
@@ -277,6 +305,10 @@ class Referral(models.Model):
 
     class Meta:
         db_table = "referrals"
+        indexes = [
+            # ensure_referral_code（referred_user IS NULL）/ 紹介者・被紹介者ペア
+            models.Index(fields=["referrer", "referred_user"]),
+        ]
 
 
 class ReferralTrack(models.Model):
@@ -296,4 +328,10 @@ class ReferralTrack(models.Model):
 
     class Meta:
         db_table = "referral_tracks"
-
+        constraints = [
+            # 1 注文につき reward は 1 行（settle_referral_rewards の冪等性）
+            models.UniqueConstraint(
+                fields=["order_id", "tracking_type"],
+                name="referral_tracks_order_tracking_type_uniq",
+            ),
+        ]
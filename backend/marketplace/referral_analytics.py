@@ -0,0 +1,129 @@
+"""紹介プログラムの紹介者別集計。
+
+1 ページ分の紹介者について、成約数・支払済み報酬・保留中報酬・国別内訳を
+集計クエリでまとめて求める（ページサイズに関係なくクエリ数は一定）。
+ページは referrer_id のキーセット（?after=<前ページ末尾の referrer_id>）で進め、
+OFFSET や全件 COUNT を使わないので深いページでも先頭ページと同じコストで読める。
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from .models import Referral, Transaction
+from .referral_service import ORDER_COMPLETED_STATUS
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _referrer_rows(after: int | None):
+    rows = Referral.objects.all()
+    if after is not None:
+        rows = rows.filter(referrer_id__gt=after)
+    return (
+        rows.values("referrer_id")
+        .annotate(
+            codes=Count("id"),
+            conversions=Count("referred_user", distinct=True),
+        )
+        .order_by("referrer_id")
+    )
+
+
+def _rewards_paid(referrer_ids: list[int]) -> dict[int, dict[str, Any]]:
+    return {
+        row["user_id"]: row
+        for row in Transaction.objects.filter(
+            transaction_type="referral_reward",
+            user_id__in=referrer_ids,
+        )
+        .values("user_id")
+        .annotate(amount=Sum("amount"), count=Count("id"))
+    }
+
+
+def _rewards_pending(referrer_ids: list[int], now) -> dict[int, Decimal]:
+    """保留期間中の紹介に紐づく完了注文の見込みリベート。"""
+    rebate = ExpressionWrapper(
+        F("referred_user__orders__total_amount") * F("rebate_percent") / Decimal("100"),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return {
+        row["referrer_id"]: row["amount"] or Decimal("0")
+        for row in Referral.objects.filter(
+            referrer_id__in=referrer_ids,
+            reward_available_at__gt=now,
+            referred_user__orders__status=ORDER_COMPLETED_STATUS,
+        )
+        .values("referrer_id")
+        .annotate(amount=Sum(rebate))
+    }
+
+
+def _country_breakdown(referrer_ids: list[int]) -> dict[int, dict[str, int]]:
+    breakdown: dict[int, dict[str, int]] = defaultdict(dict)
+    for row in (
+        Referral.objects.filter(referrer_id__in=referrer_ids, referred_user__isnull=False)
+        .values("referrer_id", "country_code")
+        .annotate(count=Count("id"))
+    ):
+        breakdown[row["referrer_id"]][row["country_code"] or "unknown"] = row["count"]
+    return breakdown
+
+
+def referrer_analytics(
+    *,
+    after: int | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    now: Any = None,
+) -> dict[str, Any]:
+    """紹介者別の集計を referrer_id 順に 1 ページ返す。next_after が None なら最終ページ。"""
+    now = now or timezone.now()
+    page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+
+    # 1 行多く読んで次ページの有無を判定する
+    page_rows = list(_referrer_rows(after)[: page_size + 1])
+    has_next = len(page_rows) > page_size
+    page_rows = page_rows[:page_size]
+    referrer_ids = [row["referrer_id"] for row in page_rows]
+    next_after = referrer_ids[-1] if has_next else None
+    if not referrer_ids:
+        return {"after": after, "next_after": None, "page_size": page_size, "results": []}
+
+    users = {
+        row["pk"]: row
+        for row in get_user_model()
+        .objects.filter(pk__in=referrer_ids)
+        .values("pk", "username", "external_id", "subscription_plan")
+    }
+    paid = _rewards_paid(referrer_ids)
+    pending = _rewards_pending(referrer_ids, now)
+    countries = _country_breakdown(referrer_ids)
+
+    results = []
+    for row in page_rows:
+        referrer_id = row["referrer_id"]
+        user = users.get(referrer_id, {})
+        paid_row = paid.get(referrer_id, {})
+        results.append(
+            {
+                "referrer_id": referrer_id,
+                "username": user.get("username"),
+                "external_id": str(user["external_id"]) if user.get("external_id") else None,
+                "subscription_plan": user.get("subscription_plan"),
+                "codes": row["codes"],
+                "conversions": row["conversions"],
+                "rewards_paid": str(paid_row.get("amount") or Decimal("0")),
+                "rewards_paid_count": paid_row.get("count", 0),
+                "rewards_pending": str(pending.get(referrer_id, Decimal("0"))),
+                "countries": countries.get(referrer_id, {}),
+            }
+        )
+    return {"after": after, "next_after": next_after, "page_size": page_size, "results": results}
@@ -6,10 +6,13 @@ from datetime import timedelta
 from decimal import Decimal
 from typing import Any
 
-from django.db import IntegrityError
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q
 from django.utils import timezone
 
-from .models import Referral
+from .models import Order, Referral, ReferralTrack, Transaction
 
 FREE_PLAN_SLUG = "free"
 JAPAN_COUNTRY_CODES = {"JP", "JPN", "JAPAN", "日本"}
@@ -17,6 +20,12 @@ JAPAN_REBATE_PERCENT = Decimal("10")
 GLOBAL_REBATE_PERCENT = Decimal("15")
 REFERRAL_REWARD_DELAY_DAYS = 90
 MAX_REFERRAL_CODE_ATTEMPTS = 8
+PROVISION_BATCH_SIZE = 500
+REFERRAL_CODE_CACHE_SECONDS = 600
+ORDER_COMPLETED_STATUS = "completed"
+REWARD_TRACKING_TYPE = "reward"
+SETTLEMENT_BATCH_SIZE = 500
+SETTLEMENT_MAX_ATTEMPTS = 3
 
 
 def is_paid_member(user: Any) -> bool:
@@ -56,9 +65,11 @@ def ensure_referral_code(user: Any, *, country_code: str | None = None) -> Refer
     }
     existing = Referral.objects.filter(referrer=user, referred_user__isnull=True).first()
     if existing:
-        for field, value in defaults.items():
-            setattr(existing, field, value)
-        existing.save(update_fields=list(defaults))
+        changed = [field for field, value in defaults.items() if getattr(existing, field) != value]
+        for field in changed:
+            setattr(existing, field, defaults[field])
+        if changed:
+            existing.save(update_fields=changed)
         return existing
 
     for attempt in range(MAX_REFERRAL_CODE_ATTEMPTS):
@@ -73,27 +84,244 @@ def ensure_referral_code(user: Any, *, country_code: str | None = None) -> Refer
     raise IntegrityError("Could not generate a unique referral code.")
 
 
+@transaction.atomic
+def provision_referral_codes(*, apply: bool = True, batch_size: int = PROVISION_BATCH_SIZE) -> dict[str, int]:
+    """紹介コード未発行の有料会員全員にまとめてコードを発行する。"""
+    User = get_user_model()
+    open_code = Referral.objects.filter(referrer=OuterRef("pk"), referred_user__isnull=True)
+    users = list(
+        User.objects.exclude(subscription_plan__iexact=FREE_PLAN_SLUG)
+        .exclude(subscription_plan="")
+        .filter(~Exists(open_code))
+        .only("pk", "external_id", "email", "date_joined")
+    )
+    if not apply or not users:
+        return {"users": len(users), "created": 0}
+
+    users_by_pk = {user.pk: user for user in users}
+    pending = dict(users_by_pk)
+    codes: dict[int, str] = {}
+    for attempt in range(MAX_REFERRAL_CODE_ATTEMPTS):
+        candidates = {pk: generate_referral_code(user, attempt=attempt) for pk, user in pending.items()}
+        taken = set(
+            Referral.objects.filter(referral_code__in=candidates.values()).values_list(
+                "referral_code", flat=True
+            )
+        ) | set(codes.values())
+        for pk, code in candidates.items():
+            if code not in taken:
+                codes[pk] = code
+                taken.add(code)
+                del pending[pk]
+        if not pending:
+            break
+
+    rebate = country_rebate_percent(None)
+    Referral.objects.bulk_create(
+        [
+            Referral(
+                referrer_id=pk,
+                referral_code=code,
+                status="active",
+                country_code=None,
+                rebate_percent=rebate,
+                reward_available_at=reward_available_at(users_by_pk[pk].date_joined),
+            )
+            for pk, code in codes.items()
+        ],
+        batch_size=batch_size,
+    )
+    cache.delete_many([_code_cache_key(code) for code in codes.values()])
+    return {"users": len(users), "created": len(codes)}
+
+
+def _code_cache_key(referral_code: str) -> str:
+    return f"referral:code:{referral_code}"
+
+
+def resolve_referral_code(referral_code: str) -> dict[str, Any] | None:
+    """有効な紹介コード → {pk, referrer_id, referral_code, country_code}（キャッシュ）。
+
+    Referral の保存・削除時に invalidate_referral_code() で破棄する。
+    """
+    referral_code = (referral_code or "").strip()
+    if not referral_code:
+        return None
+    key = _code_cache_key(referral_code)
+    resolved = cache.get(key)
+    if resolved is None:
+        resolved = (
+            Referral.objects.filter(referral_code=referral_code, status="active")
+            .values("pk", "referrer_id", "referral_code", "country_code")
+            .first()
+        ) or ""
+        cache.set(key, resolved, REFERRAL_CODE_CACHE_SECONDS)
+    return resolved or None
+
+
+def invalidate_referral_code(referral_code: str) -> None:
+    if referral_code:
+        cache.delete(_code_cache_key(referral_code))
+
+
+def has_open_referral(user: Any) -> bool:
+    return Referral.objects.filter(referrer=user, referred_user__isnull=True).exists()
+
+
+def get_open_referral(user: Any) -> Referral | None:
+    """紹介者が配布中（未使用）の紹介コード。読み取りのみ。"""
+    return Referral.objects.filter(referrer=user, referred_user__isnull=True).first()
+
+
 def attach_referral_code(referred_user: Any, referral_code: str, *, country_code: str | None = None) -> Referral | None:
-    referral = Referral.objects.filter(referral_code=referral_code, status="active").first()
-    if not referral or referral.referrer_id == referred_user.pk:
+    """未使用の紹介コードに被紹介者を紐付ける。使用済み（同時登録で先に取られた）なら None。"""
+    resolved = resolve_referral_code(referral_code)
+    if not resolved or resolved["referrer_id"] == referred_user.pk:
         return None
 
-    referred_user.referred_by_user = referral.referrer
-    referred_user.referral_code_used = referral.referral_code
-    referred_user.save(update_fields=["referred_by_user", "referral_code_used"])
-
-    if referral.referred_user_id is None:
-        referral.referred_user = referred_user
-        referral.country_code = (country_code or "").upper() or referral.country_code
-        referral.rebate_percent = country_rebate_percent(country_code or referral.country_code)
-        referral.reward_available_at = reward_available_at(getattr(referred_user, "date_joined", None))
-        referral.save(
-            update_fields=[
-                "referred_user",
-                "country_code",
-                "rebate_percent",
-                "reward_available_at",
-            ]
+    resolved_country = (country_code or "").upper() or resolved["country_code"]
+    with transaction.atomic():
+        # 未使用の場合だけ紐付ける（条件付き UPDATE で同時登録でも 1 人に限定）
+        claimed = Referral.objects.filter(pk=resolved["pk"], referred_user__isnull=True).update(
+            referred_user=referred_user,
+            country_code=resolved_country,
+            rebate_percent=country_rebate_percent(resolved_country),
+            reward_available_at=reward_available_at(getattr(referred_user, "date_joined", None)),
+        )
+        if not claimed:
+            return None
+        referred_user.referred_by_user_id = resolved["referrer_id"]
+        referred_user.referral_code_used = resolved["referral_code"]
+        referred_user.save(update_fields=["referred_by_user", "referral_code_used"])
+        # update() は post_save を送らないので、キャッシュ済みの解決結果をここで破棄する
+        invalidate_referral_code(resolved["referral_code"])
+    return Referral.objects.filter(pk=resolved["pk"]).first()
+
+
+def _payable_referrals(order_ids: list[int] | None, now) -> Any:
+    """報酬対象の紹介（被紹介者あり・保留期間経過済み・被紹介者ごとに最初の 1 件）。
+
+    User.referred_by_user があればその紹介者の Referral のみを対象にする。
+    """
+    matches_referrer = Q(referred_user__referred_by_user__isnull=True) | Q(
+        referrer=F("referred_user__referred_by_user")
+    )
+    earlier = Referral.objects.filter(
+        matches_referrer,
+        referred_user=OuterRef("referred_user"),
+        pk__lt=OuterRef("pk"),
+    )
+    referrals = (
+        Referral.objects.filter(referred_user__isnull=False)
+        .filter(matches_referrer)
+        .filter(~Exists(earlier))
+        .filter(Q(reward_available_at__isnull=True) | Q(reward_available_at__lte=now))
+    )
+    if order_ids is not None:
+        referrals = referrals.filter(
+            referred_user__in=Order.objects.filter(pk__in=order_ids).values("user_id")
         )
+    return referrals
+
+
+def _settlement_candidates(
+    referrals: list[dict[str, Any]], order_ids: list[int] | None
+) -> list[dict[str, Any]]:
+    """紹介 1 ページぶんの被紹介者の、報酬未払いの完了注文（1 クエリ）。"""
+    by_user = {row["referred_user_id"]: row for row in referrals}
+    rewarded = ReferralTrack.objects.filter(
+        tracking_type=REWARD_TRACKING_TYPE,
+        order_id=OuterRef("pk"),
+    )
+    orders = Order.objects.filter(status=ORDER_COMPLETED_STATUS, user_id__in=by_user).filter(
+        ~Exists(rewarded)
+    )
+    if order_ids is not None:
+        orders = orders.filter(pk__in=order_ids)
+    return [
+        {
+            **row,
+            "referral_id": by_user[row["user_id"]]["pk"],
+            "referrer_id": by_user[row["user_id"]]["referrer_id"],
+            "rebate_percent": by_user[row["user_id"]]["rebate_percent"],
+        }
+        for row in orders.order_by("pk").values("pk", "user_id", "total_amount")
+    ]
 
-    return referral
+
+def _settle_candidates(candidates: list[dict[str, Any]], batch_size: int) -> Decimal:
+    with transaction.atomic():
+        ReferralTrack.objects.bulk_create(
+            [
+                ReferralTrack(
+                    referral_id=row["referral_id"],
+                    tracking_type=REWARD_TRACKING_TYPE,
+                    converted_user_id=row["user_id"],
+                    order_id=row["pk"],
+                )
+                for row in candidates
+            ],
+            batch_size=batch_size,
+        )
+        rebates = [
+            (row["referrer_id"], row["total_amount"] * row["rebate_percent"] / Decimal("100"))
+            for row in candidates
+        ]
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    user_id=referrer_id,
+                    transaction_type="referral_reward",
+                    amount=rebate,
+                    fee_amount=Decimal("0"),
+                    net_amount=rebate,
+                )
+                for referrer_id, rebate in rebates
+            ],
+            batch_size=batch_size,
+        )
+    return sum((rebate for _user, rebate in rebates), Decimal("0"))
+
+
+def settle_referral_rewards(
+    order_ids: list[int] | None = None,
+    *,
+    now: Any = None,
+    batch_size: int = SETTLEMENT_BATCH_SIZE,
+) -> dict[str, Any]:
+    """保留期間を過ぎた完了注文の紹介リベートをまとめて支払う。
+
+    紹介（Referral）側から pk 順に batch_size 件ずつ読み、その被紹介者の未払い注文だけを
+    精算してページごとにコミットする。紹介の無い注文は走査しない。
+    ReferralTrack(order_id, tracking_type) の一意制約で二重払いを防ぎ、並行実行で
+    衝突したページは候補を取り直して再試行する。
+    """
+    now = now or timezone.now()
+    referrals = _payable_referrals(order_ids, now).order_by("pk")
+    settled = 0
+    amount = Decimal("0")
+    last_pk = 0
+    while True:
+        page = list(
+            referrals.filter(pk__gt=last_pk).values(
+                "pk", "referred_user_id", "referrer_id", "rebate_percent"
+            )[:batch_size]
+        )
+        if not page:
+            break
+        last_pk = page[-1]["pk"]
+        for attempt in range(SETTLEMENT_MAX_ATTEMPTS):
+            candidates = _settlement_candidates(page, order_ids)
+            if not candidates:
+                break
+            try:
+                amount += _settle_candidates(candidates, batch_size)
+            except IntegrityError:
+                if attempt == SETTLEMENT_MAX_ATTEMPTS - 1:
+                    raise IntegrityError(
+                        "Could not settle referral rewards after concurrent updates."
+                    ) from None
+                continue
+            settled += len(candidates)
+            break
+    return {"orders": settled, "amount": amount}
@@ -0,0 +1,29 @@
+"""紹介プログラム分析 API（Next.js / 運用向け内部 API）"""
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from marketplace.referral_analytics import DEFAULT_PAGE_SIZE, referrer_analytics
+
+
+def _authorize_internal(request) -> bool:
+    internal_token = getattr(settings, "INTERNAL_API_TOKEN", "")
+    if not internal_token:
+        return True
+    return request.headers.get("x-internal-api-token") == internal_token
+
+
+@require_GET
+def referral_analytics_view(request):
+    """紹介者別の成約数・支払済み/保留中リベート・国別内訳（referrer_id 順、?after= で次ページ）。"""
+    if not _authorize_internal(request):
+        return JsonResponse({"error": "unauthorized"}, status=401)
+
+    try:
+        after = int(request.GET["after"]) if request.GET.get("after") else None
+        page_size = int(request.GET.get("page_size") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "after and page_size must be integers"}, status=400)
+
+    return JsonResponse(referrer_analytics(after=after, page_size=page_size))
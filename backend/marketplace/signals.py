@@ -1,76 +1,133 @@
-from decimal import Decimal
 from typing import Any
 
 # pylint: disable=no-member,unused-argument,broad-exception-caught
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.utils import timezone
 
+from .admin_filters import invalidate_artwork_creator_choices
+from .facets import SHOP_PRODUCT_FACET_FIELDS, invalidate_facet_counts
+from .models import Artwork, Order, Referral, ShopProduct
+from .referral_service import (
+    ORDER_COMPLETED_STATUS,
+    invalidate_referral_code,
+    settle_referral_rewards,
+)
 
-@receiver(post_save)
-def give_referral_rebate(
-    sender: Any, instance: Any, created: bool, **kwargs: Any
+
+_UNCHANGED = object()
+
+
+def _stored_values(instance: Any, fields: tuple[str, ...], update_fields: Any) -> Any:
+    """保存前の DB 上の fields の値（pre_save 用、1 クエリ）。
+
+    読み込み時（post_init）に毎回控えを取る代わりに、保存時に必要な分だけ読む。
+    新規作成は None、update_fields に fields が含まれない保存は _UNCHANGED（読まない）。
+    """
+    if instance._state.adding or instance.pk is None:
+        return None
+    if update_fields is not None and not set(fields).intersection(update_fields):
+        return _UNCHANGED
+    return type(instance)._default_manager.filter(pk=instance.pk).values_list(*fields).first()
+
+
+def _current_values(instance: Any, fields: tuple[str, ...]) -> tuple[Any, ...]:
+    return tuple(getattr(instance, field) for field in fields)
+
+
+@receiver(pre_save, sender=Order)
+def remember_stored_order_status(
+    sender: Any, instance: Order, update_fields: Any = None, **kwargs: Any
 ) -> None:
-    """When an Order is completed, give rebate to the referrer if present.
+    instance._stored_status = _stored_values(instance, ("status",), update_fields)
+
 
-    Rebate rate is configured in the operations settings panel.
+@receiver(post_save, sender=Order)
+def give_referral_rebate_on_completion(
+    sender: Any, instance: Order, created: bool, **kwargs: Any
+) -> None:
+    """Order が completed に遷移したときだけ紹介者へリベートを付与する。
+
+    Rebate rate is configured in the operations settings panel. 保留期間中の注文は
+    settle_referral_rewards コマンドの定期実行で後から支払われる。
     """
-    # only care about completed orders
+    stored = instance.__dict__.pop("_stored_status", None)
+    if stored is _UNCHANGED:
+        return
+    previous = stored[0] if stored else None
+    if instance.status != ORDER_COMPLETED_STATUS or previous == ORDER_COMPLETED_STATUS:
+        return
+
     try:
-        from .models import Order as OrderModel  # type: ignore
-        from .models import Referral, ReferralTrack, Transaction
-
-        # ensure handler only acts on Order instances
-        if not isinstance(instance, OrderModel):
-            return
-
-        if getattr(instance, "status", None) != "completed":
-            return
-
-        user = instance.user
-
-        # prefer explicit field on User added by users app
-        referrer = getattr(user, "referred_by_user", None)
-        if not referrer:
-            referral = Referral.objects.filter(referred_user=user).first()
-            if referral:
-                referrer = referral.referrer
-            else:
-                return
-
-        # idempotency: check if this order has already generated a reward
-        existing = ReferralTrack.objects.filter(
-            tracking_type="reward", order_id=instance.id
-        )
-        if existing.exists():
-            return
-
-        referral = Referral.objects.filter(
-            referrer=referrer, referred_user=user
-        ).first()
-        if not referral:
-            return
-
-        if referral.reward_available_at and timezone.now() < referral.reward_available_at:
-            return
-
-        # create referral track marking this reward (allowing referral to be null)
-        ReferralTrack.objects.create(
-            referral=referral,
-            tracking_type="reward",
-            converted_user=user,
-            order_id=instance.id,
-        )
-
-        rebate = instance.total_amount * referral.rebate_percent / Decimal("100")
-        Transaction.objects.create(
-            user=referrer,
-            transaction_type="referral_reward",
-            amount=rebate,
-            fee_amount=Decimal("0"),
-            net_amount=rebate,
-        )
+        settle_referral_rewards(order_ids=[instance.pk])
     except Exception:
         # Best-effort: do not raise from signals
         return
+
+
+@receiver(post_save, sender=Referral)
+@receiver(post_delete, sender=Referral)
+def refresh_referral_code_cache(sender: Any, instance: Referral, **kwargs: Any) -> None:
+    invalidate_referral_code(instance.referral_code)
+
+
+# Admin の作者一覧・ファセット件数に影響する列（変わったときだけキャッシュを捨てる）
+# [verify] 判定は title から save() で求める verify_kind を見る（title の編集だけでは捨てない）
+ARTWORK_ADMIN_INDEX_FIELDS = (
+    "creator_id",
+    "creator_display_name",
+    "status",
+    "gallery_category",
+    "verify_kind",
+)
+
+
+@receiver(pre_save, sender=Artwork)
+def remember_stored_artwork_index_fields(
+    sender: Any, instance: Artwork, update_fields: Any = None, **kwargs: Any
+) -> None:
+    instance._stored_index_fields = _stored_values(
+        instance, ARTWORK_ADMIN_INDEX_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=Artwork)
+def refresh_artwork_admin_index_on_save(
+    sender: Any, instance: Artwork, created: bool, **kwargs: Any
+) -> None:
+    """作者一覧（CreatorFilter）とファセット件数は関係する列が変わったときだけ作り直す。"""
+    stored = instance.__dict__.pop("_stored_index_fields", None)
+    if stored is _UNCHANGED:
+        return
+    if created or stored != _current_values(instance, ARTWORK_ADMIN_INDEX_FIELDS):
+        invalidate_artwork_creator_choices()
+        invalidate_facet_counts(Artwork)
+
+
+@receiver(post_delete, sender=Artwork)
+def refresh_artwork_admin_index_on_delete(sender: Any, instance: Artwork, **kwargs: Any) -> None:
+    invalidate_artwork_creator_choices()
+    invalidate_facet_counts(Artwork)
+
+
+@receiver(pre_save, sender=ShopProduct)
+def remember_stored_shop_product_facets(
+    sender: Any, instance: ShopProduct, update_fields: Any = None, **kwargs: Any
+) -> None:
+    instance._stored_facets = _stored_values(instance, SHOP_PRODUCT_FACET_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=ShopProduct)
+def refresh_shop_product_facets_on_save(
+    sender: Any, instance: ShopProduct, created: bool, **kwargs: Any
+) -> None:
+    stored = instance.__dict__.pop("_stored_facets", None)
+    if stored is _UNCHANGED:
+        return
+    if created or stored != _current_values(instance, SHOP_PRODUCT_FACET_FIELDS):
+        invalidate_facet_counts(ShopProduct)
+
+
+@receiver(post_delete, sender=ShopProduct)
+def refresh_shop_product_facets_on_delete(sender: Any, instance: ShopProduct, **kwargs: Any) -> None:
+    invalidate_facet_counts(ShopProduct)
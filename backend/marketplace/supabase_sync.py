@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import logging
 import os
 import uuid
 from typing import Any
@@ -9,9 +10,18 @@ from typing import Any
 import requests
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models.functions import Upper
 
+from eldinia_nex.background import submit_deduplicated
 from marketplace.models import Artwork
-from users.sync_service import sync_supabase_user
+from users.sync_service import sync_supabase_user, sync_supabase_users
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SYNC_BATCH_SIZE = 500
+# 同じクリエイターの作品同期は 60 秒に 1 回へまとめる（ログイン同期の連打対策）
+CREATOR_ARTWORK_SYNC_WINDOW_SECONDS = 60
 
 
 class SupabaseSyncError(Exception):
@@ -275,8 +285,61 @@ def sync_supabase_artworks(*, creator_id: str | None = None) -> dict[str, int]:
     }
 
 
+def _sync_creator_artworks(creator_id: str) -> None:
+    try:
+        stats = sync_supabase_artworks(creator_id=creator_id)
+    except SupabaseSyncError as exc:
+        logger.warning("creator artwork sync skipped for %s: %s", creator_id, exc)
+        return
+    logger.info("creator artwork sync for %s: %s", creator_id, stats)
+
+
+def queue_creator_artwork_sync(creator_id: str) -> bool:
+    """クリエイター単位の作品同期を後続処理として投入する（投入済みなら False）。"""
+    return submit_deduplicated(
+        f"creator-artwork-sync:{creator_id}",
+        _sync_creator_artworks,
+        creator_id,
+        window=CREATOR_ARTWORK_SYNC_WINDOW_SECONDS,
+    )
+
+
+def _resolve_django_users(profiles: list[dict[str, Any]]) -> dict[int, Any]:
+    """_resolve_django_user の一括版（external_id / email / username の __in 検索 3 回）。"""
+    User = get_user_model()
+    external_ids = {_parse_uuid(profile.get("id")) for profile in profiles} - {None}
+    emails = {(profile.get("email") or "").strip().upper() for profile in profiles} - {""}
+    usernames = {(profile.get("username") or "").strip().upper() for profile in profiles} - {""}
+
+    by_external = {user.external_id: user for user in User.objects.filter(external_id__in=external_ids)}
+    by_email: dict[str, Any] = {}
+    if emails:
+        for user in User.objects.annotate(email_upper=Upper("email")).filter(email_upper__in=emails):
+            by_email.setdefault(user.email_upper, user)
+    by_username: dict[str, Any] = {}
+    if usernames:
+        for user in User.objects.annotate(username_upper=Upper("username")).filter(
+            username_upper__in=usernames
+        ):
+            by_username.setdefault(user.username_upper, user)
+
+    resolved: dict[int, Any] = {}
+    for index, profile in enumerate(profiles):
+        user = (
+            by_external.get(_parse_uuid(profile.get("id")))
+            or by_email.get((profile.get("email") or "").strip().upper())
+            or by_username.get((profile.get("username") or "").strip().upper())
+        )
+        if user:
+            resolved[index] = user
+    return resolved
+
+
 def sync_supabase_profiles() -> dict[str, int]:
-    """Supabase profiles → Django User に upsert（作品同期の前処理用）。"""
+    """Supabase profiles → Django User に upsert（作品同期の前処理用）。
+
+    既存ユーザーの照合と新規ユーザーの作成（ユーザー名の割り当てを含む）はまとめて行う。
+    """
     url, key = _supabase_config()
     profiles = _fetch_paginated(
         url,
@@ -284,19 +347,38 @@ def sync_supabase_profiles() -> dict[str, int]:
         "profiles",
         select="id,username,display_name,avatar_url,subscription_plan",
     )
-    created = 0
+    resolved = _resolve_django_users(profiles)
     updated = 0
     unchanged = 0
-    for profile in profiles:
-        user = _resolve_django_user(profile)
+    new_users: list[dict[str, Any]] = []
+    for index, profile in enumerate(profiles):
+        user = resolved.get(index)
         if user:
             if _refresh_user_from_profile(user, profile):
                 updated += 1
             else:
                 unchanged += 1
             continue
-        if _ensure_user_from_profile(profile):
-            created += 1
+        profile_id = str(profile.get("id") or "").strip()
+        if not profile_id:
+            continue
+        # auth.users の email は profiles に無いため、仮メールで upsert
+        username = (profile.get("username") or "user").strip()
+        new_users.append(
+            {
+                "supabase_user_id": profile_id,
+                "email": f"{username}+{profile_id[:8]}@supabase.local",
+                "username": username,
+                "display_name": profile.get("display_name"),
+                "subscription_plan": _normalize_subscription_plan(profile.get("subscription_plan")),
+                "is_email_verified": True,
+            }
+        )
+
+    created = 0
+    for start in range(0, len(new_users), PROFILE_SYNC_BATCH_SIZE):
+        results = sync_supabase_users(new_users[start : start + PROFILE_SYNC_BATCH_SIZE])
+        created += sum(1 for result in results if result.get("created"))
     return {
         "profiles": len(profiles),
         "created": created,
@@ -372,13 +454,13 @@ def find_supabase_artwork_id_by_title(title: str) -> uuid.UUID | None:
     return _parse_uuid(rows[0].get("id"))
 
 
-def hide_supabase_artworks_by_title_prefix(prefix: str) -> int:
-    """タイトル prefix に一致する Supabase 作品を一括非公開（verify テスト作品向け）。"""
+def hide_supabase_verify_artworks() -> int:
+    """公開中の [verify] テスト作品を Supabase で一括非公開（artworks.is_verify の部分インデックス）。"""
     url, key = _supabase_config()
     response = requests.patch(
         f"{url}/rest/v1/artworks",
         headers={**_headers(key), "Prefer": "return=representation"},
-        params={"title": f"ilike.{prefix}"},
+        params={"is_verify": "is.true", "is_public": "is.true", "select": "id"},
         json={"is_public": False},
         timeout=30,
     )
@@ -5,9 +5,18 @@ from unittest.mock import patch
 # pylint: disable=no-member
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+from .models import Artwork
+from .referral_service import (
+    provision_referral_codes,
+    resolve_referral_code,
+    settle_referral_rewards,
+)
+
 
 class ReferralRebateTest(TestCase):
     def test_paid_member_gets_referral_code(self):
@@ -43,6 +52,47 @@ class ReferralRebateTest(TestCase):
 
         self.assertTrue(Referral.objects.filter(referrer=user, status="active").exists())
 
+    def test_paid_member_resave_does_not_write_referral(self):
+        user = get_user_model().objects.create_user(
+            username="quiet-paid", password="pw", subscription_plan="premium"
+        )
+
+        from .models import Referral
+
+        referral = Referral.objects.get(referrer=user, referred_user__isnull=True)
+        user.last_name = "Quiet"
+        with patch("marketplace.referral_service.ensure_referral_code") as ensure:
+            with CaptureQueriesContext(connection) as queries:
+                user.save()
+        ensure.assert_not_called()
+        # プランが変わらない保存では紹介コードの有無も調べない
+        self.assertFalse(
+            [query for query in queries.captured_queries if Referral._meta.db_table in query["sql"]]
+        )
+
+        user.subscription_plan = "business"
+        user.save()
+        referral.refresh_from_db()
+        self.assertEqual(referral.status, "active")
+
+    def test_provision_referral_codes_backfills_paid_members(self):
+        User = get_user_model()
+        from .models import Referral
+
+        paid = [
+            User.objects.create_user(username=f"bulk-{index}", password="pw", subscription_plan="premium")
+            for index in range(3)
+        ]
+        User.objects.create_user(username="bulk-free", password="pw")
+        Referral.objects.all().delete()
+
+        self.assertEqual(provision_referral_codes(apply=False), {"users": 3, "created": 0})
+        self.assertEqual(provision_referral_codes()["created"], 3)
+        self.assertEqual(
+            Referral.objects.filter(referrer__in=paid, referred_user__isnull=True).count(), 3
+        )
+        self.assertEqual(provision_referral_codes()["users"], 0)
+
     def test_referral_code_retries_on_collision(self):
         User = get_user_model()
 
@@ -67,6 +117,42 @@ class ReferralRebateTest(TestCase):
         referral = Referral.objects.get(referrer=target, referred_user__isnull=True)
         self.assertEqual(referral.referral_code, "ENX-UNIQUE01")
 
+    def test_referral_code_resolver_is_cached_and_invalidated_on_save(self):
+        referrer = get_user_model().objects.create_user(username="cache-ref", password="pw")
+
+        from .models import Referral
+
+        self.assertIsNone(resolve_referral_code("ENX-CACHED"))
+        referral = Referral.objects.create(referrer=referrer, referral_code="ENX-CACHED")
+        self.assertEqual(resolve_referral_code("ENX-CACHED")["pk"], referral.pk)
+
+        with self.assertNumQueries(1):  # cache hit (DatabaseCache) only
+            resolve_referral_code("ENX-CACHED")
+
+        referral.status = "inactive"
+        referral.save(update_fields=["status"])
+        self.assertIsNone(resolve_referral_code("ENX-CACHED"))
+
+    def test_attach_does_not_link_user_when_code_already_claimed(self):
+        from .models import Referral
+        from .referral_service import attach_referral_code
+
+        User = get_user_model()
+        referrer = User.objects.create_user(username="claim-ref", password="pw")
+        first = User.objects.create_user(username="claim-first", password="pw")
+        second = User.objects.create_user(username="claim-second", password="pw")
+        referral = Referral.objects.create(referrer=referrer, referral_code="ENX-CLAIM", country_code="US")
+        self.assertEqual(resolve_referral_code("ENX-CLAIM")["country_code"], "US")
+
+        self.assertEqual(attach_referral_code(first, "ENX-CLAIM", country_code="JP").pk, referral.pk)
+        self.assertIsNone(attach_referral_code(second, "ENX-CLAIM"))
+
+        second.refresh_from_db()
+        self.assertIsNone(second.referred_by_user_id)
+        self.assertEqual(Referral.objects.get(pk=referral.pk).referred_user_id, first.pk)
+        # 条件付き UPDATE でも解決キャッシュは破棄される
+        self.assertEqual(resolve_referral_code("ENX-CLAIM")["country_code"], "JP")
+
     def test_referral_rebate_waits_until_third_month(self):
         """紹介料は紹介成立から3か月目以降に支払う。"""
         User = get_user_model()
@@ -96,7 +182,12 @@ class ReferralRebateTest(TestCase):
 
         referral.reward_available_at = timezone.now() - timedelta(days=1)
         referral.save(update_fields=["reward_available_at"])
+        # 完了済みのまま保存しても遷移ではないので支払わない（定期精算で支払う）
         order.save()
+        self.assertFalse(Transaction.objects.filter(transaction_type="referral_reward").exists())
+
+        result = settle_referral_rewards()
+        self.assertEqual(result["orders"], 1)
 
         txs = Transaction.objects.filter(
             user=referrer, transaction_type="referral_reward"
@@ -109,7 +200,11 @@ class ReferralRebateTest(TestCase):
         self.assertTrue(tracks.exists())
 
         # saving order completed again should not create another transaction
+        order.status = "pending"
+        order.save(update_fields=["status"])
+        order.status = "completed"
         order.save()
+        self.assertEqual(settle_referral_rewards()["orders"], 0)
         self.assertEqual(
             Transaction.objects.filter(
                 user=referrer, transaction_type="referral_reward"
@@ -139,4 +234,303 @@ class ReferralRebateTest(TestCase):
         tx = Transaction.objects.get(user=referrer, transaction_type="referral_reward")
         self.assertEqual(tx.amount, Decimal("30.00"))
 
+    def test_rebate_only_runs_on_transition_into_completed(self):
+        User = get_user_model()
+
+        referrer = User.objects.create_user(username="transition-ref", password="pw")
+        referred = User.objects.create_user(username="transition-refed", password="pw")
+
+        from .models import Order, Referral
+
+        Referral.objects.create(
+            referrer=referrer,
+            referred_user=referred,
+            referral_code="TR",
+            rebate_percent=Decimal("10"),
+            reward_available_at=timezone.now() - timedelta(days=1),
+        )
+        order = Order.objects.create(user=referred, total_amount=Decimal("100.00"))
+
+        with patch("marketplace.signals.settle_referral_rewards") as settle:
+            order.save()
+            order.status = "completed"
+            order.save()
+            order.save()
+            Order.objects.get(pk=order.pk).save()
+
+        settle.assert_called_once_with(order_ids=[order.pk])
+
+    def test_status_is_read_only_when_the_save_can_change_it(self):
+        from .models import Order
+
+        user = get_user_model().objects.create_user(username="status-reader", password="pw")
+        order = Order.objects.create(user=user, total_amount=Decimal("100.00"))
+        order = Order.objects.get(pk=order.pk)
+        self.assertFalse(hasattr(order, "_stored_status"))
+
+        order.total_amount = Decimal("120.00")
+        with patch("marketplace.signals.settle_referral_rewards") as settle:
+            with self.assertNumQueries(1):
+                order.save(update_fields=["total_amount"])
+            order.status = "completed"
+            with self.assertNumQueries(2):
+                # 保存前の status を 1 回読み、UPDATE する
+                order.save(update_fields=["status"])
+
+        settle.assert_called_once_with(order_ids=[order.pk])
+
+    def test_settlement_pages_through_referrals_and_skips_unreferred_orders(self):
+        User = get_user_model()
+
+        from .models import Order, Referral, Transaction
+
+        referrer = User.objects.create_user(username="page-ref", password="pw")
+        stranger = User.objects.create_user(username="page-stranger", password="pw")
+        past = timezone.now() - timedelta(days=1)
+        referred = []
+        for index in range(3):
+            user = User.objects.create_user(username=f"page-refed-{index}", password="pw")
+            Referral.objects.create(
+                referrer=referrer,
+                referred_user=user,
+                referral_code=f"PG{index}",
+                rebate_percent=Decimal("10"),
+                reward_available_at=past,
+            )
+            referred.append(user)
+        with patch("marketplace.signals.settle_referral_rewards"):
+            for user in referred + [stranger]:
+                Order.objects.create(user=user, total_amount=Decimal("100.00"), status="completed")
+
+        result = settle_referral_rewards(batch_size=2)
+
+        self.assertEqual(result, {"orders": 3, "amount": Decimal("30.00")})
+        self.assertEqual(
+            Transaction.objects.filter(user=referrer, transaction_type="referral_reward").count(), 3
+        )
+        self.assertEqual(settle_referral_rewards()["orders"], 0)
+
+
+class ReferralAnalyticsTest(TestCase):
+    def setUp(self):
+        from .models import Order, Referral, Transaction
+
+        User = get_user_model()
+        self.referrers = []
+        for index in range(3):
+            referrer = User.objects.create_user(username=f"analytics-ref-{index}", password="pw")
+            self.referrers.append(referrer)
+            for offset, country in enumerate(("JP", "US")[: index + 1]):
+                referred = User.objects.create_user(
+                    username=f"analytics-refed-{index}-{offset}", password="pw"
+                )
+                Referral.objects.create(
+                    referrer=referrer,
+                    referred_user=referred,
+                    referral_code=f"AN-{index}-{offset}",
+                    country_code=country,
+                    rebate_percent=Decimal("10"),
+                    reward_available_at=timezone.now() + timedelta(days=30),
+                )
+                Order.objects.create(user=referred, total_amount=Decimal("100.00"), status="completed")
+        Transaction.objects.create(
+            user=self.referrers[0],
+            transaction_type="referral_reward",
+            amount=Decimal("5.00"),
+            net_amount=Decimal("5.00"),
+        )
+
+    def test_endpoint_returns_per_referrer_aggregates(self):
+        response = self.client.get("/api/v1/referrals/analytics/", {"page_size": 2})
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(
+            [row["username"] for row in payload["results"]], ["analytics-ref-0", "analytics-ref-1"]
+        )
+        second = payload["results"][1]
+        self.assertEqual(second["conversions"], 2)
+        self.assertEqual(second["countries"], {"JP": 1, "US": 1})
+        self.assertEqual(Decimal(second["rewards_pending"]), Decimal("20"))
+        self.assertEqual(payload["next_after"], self.referrers[1].pk)
+
+    def test_next_page_continues_after_the_last_referrer(self):
+        response = self.client.get(
+            "/api/v1/referrals/analytics/", {"page_size": 2, "after": self.referrers[1].pk}
+        )
+
+        payload = response.json()
+        self.assertEqual([row["username"] for row in payload["results"]], ["analytics-ref-2"])
+        self.assertEqual(payload["results"][0]["conversions"], 2)
+        self.assertIsNone(payload["next_after"])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        with self.assertNumQueries(5):
+            self.client.get("/api/v1/referrals/analytics/", {"page_size": 1})
+        with self.assertNumQueries(5):
+            self.client.get(
+                "/api/v1/referrals/analytics/", {"page_size": 3, "after": self.referrers[0].pk}
+            )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CreatorFilterTest(TestCase):
+    def setUp(self):
+        from .admin_filters import invalidate_artwork_creator_choices
+
+        invalidate_artwork_creator_choices()
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(username="ops", email="ops@example.com", password="pw")
+        self.alice = User.objects.create_user(username="alice", display_name="Alice", password="pw")
+        self.bob = User.objects.create_user(username="bob", password="pw")
+        for creator in (self.alice, self.alice, self.bob):
+            Artwork.objects.create(creator=creator, title="A", file_url="http://example.local/a.png")
+
+    def test_creator_choices_are_aggregated_and_cached(self):
+        from .admin_filters import artwork_creator_choices
+
+        with self.assertNumQueries(1):
+            choices = artwork_creator_choices()
+        with self.assertNumQueries(0):
+            self.assertEqual(artwork_creator_choices(), choices)
+        self.assertEqual([label for _, label in choices], ["Alice", "bob"])
+
+        carol = get_user_model().objects.create_user(username="carol", password="pw")
+        Artwork.objects.create(creator=carol, title="C", file_url="http://example.local/c.png")
+        self.assertIn((str(carol.pk), "carol"), artwork_creator_choices())
+
+    def test_changelist_switches_to_input_filter_for_many_creators(self):
+        self.client.force_login(self.admin)
+        url = "/admin/marketplace/artwork/"
+
+        response = self.client.get(url)
+        self.assertContains(response, f"?creator={self.alice.pk}")
+
+        with patch("marketplace.admin_filters.CREATOR_FILTER_CHOICE_LIMIT", 1):
+            response = self.client.get(url, {"creator": "ali", "status": "published"})
+        self.assertNotContains(response, f"?creator={self.alice.pk}")
+        self.assertContains(response, 'name="status" value="published"')
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class FacetCountsTest(TestCase):
+    def setUp(self):
+        from .facets import invalidate_facet_counts
+
+        invalidate_facet_counts(Artwork)
+        self.creator = get_user_model().objects.create_user(username="maker", password="pw")
+        Artwork.objects.create(
+            creator=self.creator, title="Sky", file_url="http://example.local/a.png", gallery_category="photo"
+        )
+        Artwork.objects.create(
+            creator=self.creator, title="[verify] image 1", file_url="http://example.local/b.png", status="draft"
+        )
+
+    def test_counts_come_from_one_grouped_query_and_refresh_on_change(self):
+        from .facets import facet_counts
+
+        with self.assertNumQueries(1):
+            counts = facet_counts(Artwork)
+        with self.assertNumQueries(0):
+            facet_counts(Artwork)
+        self.assertEqual(counts["status"], {"published": 1, "draft": 1})
+        self.assertEqual(counts["gallery_category"], {"photo": 1, "illustration": 1})
+        self.assertEqual(counts["verify"], {"real": 1, "verify": 1})
+
+        artwork = Artwork.objects.get(title="Sky")
+        artwork.view_count = 10
+        artwork.save()
+        artwork.title = "Sky at noon"
+        artwork.save()
+        with self.assertNumQueries(0):
+            facet_counts(Artwork)
+
+        artwork.title = "[verify] image 2"
+        artwork.save()
+        self.assertEqual(facet_counts(Artwork)["verify"], {"verify": 2})
+
+        artwork.status = "draft"
+        artwork.save()
+        self.assertEqual(facet_counts(Artwork)["status"], {"draft": 2})
+
+    def test_admin_sidebar_shows_counts(self):
+        admin_user = get_user_model().objects.create_superuser(
+            username="ops", email="ops@example.com", password="pw"
+        )
+        self.client.force_login(admin_user)
+
+        response = self.client.get("/admin/marketplace/artwork/", {"gallery_category": "illustration"})
+
+        self.assertContains(response, "写真 (1)")
+        self.assertContains(response, "[verify] テスト (1)")
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+
+class ArtworkVerifyKindTest(TestCase):
+    def test_verify_kind_follows_title_and_drives_filters(self):
+        from .admin_filters import infer_gallery_category
+        from .models import VERIFY_ARTWORK_Q
+
+        creator = get_user_model().objects.create_user(username="tester", password="pw")
+        artwork = Artwork.objects.create(
+            creator=creator, title="  [Verify] Audio sample", file_url="http://example.local/a.mp3"
+        )
+        Artwork.objects.create(creator=creator, title="Real work", file_url="http://example.local/b.png")
+
+        self.assertEqual(artwork.verify_kind, "audio")
+        self.assertTrue(artwork.is_verify)
+        self.assertEqual(infer_gallery_category(artwork), "music")
+        self.assertEqual(list(Artwork.objects.filter(VERIFY_ARTWORK_Q)), [artwork])
+
+        artwork.title = "Renamed"
+        artwork.save(update_fields=["title"])
+        artwork.refresh_from_db()
+        self.assertEqual(artwork.verify_kind, "")
+        self.assertFalse(Artwork.objects.filter(VERIFY_ARTWORK_Q).exists())
+
+
+class ArtworkAdminSearchTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_superuser(
+            username="ops", email="ops@example.com", password="pw"
+        )
+        self.creator = User.objects.create_user(
+            username="painter", email="painter@example.com", password="pw", display_name="Mika"
+        )
+        self.target = Artwork.objects.create(
+            creator=self.creator,
+            title="Harbor at dusk",
+            file_url="http://example.local/a.png",
+            supabase_id="3f2a1b9c-0000-4000-8000-000000000001",
+        )
+        self.other = Artwork.objects.create(
+            creator=self.admin_user, title="Mountain", file_url="http://example.local/b.png"
+        )
+        self.client.force_login(self.admin_user)
+
+    def _search(self, term):
+        response = self.client.get("/admin/marketplace/artwork/", {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["cl"].result_list)
+
+    def test_search_shortcuts_and_related_names(self):
+        self.assertEqual(self._search("3f2a1b9c-0000-4000-8000-000000000001"), [self.target])
+        self.assertEqual(self._search("3f2a1b9c…"), [self.target])
+        self.assertEqual(self._search(str(self.creator.external_id)), [self.target])
+        self.assertEqual(self._search("PAINTER@example.com"), [self.target])
+        self.assertEqual(self._search("mika"), [self.target])
+        self.assertEqual(self._search("harbor dusk"), [self.target])
+        self.assertEqual(self._search("harbor mountain"), [])
+
+    def test_related_name_search_does_not_join(self):
+        from django.contrib.admin.sites import site
+
+        model_admin = site._registry[Artwork]
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            None, Artwork.objects.all(), "mika"
+        )
 
+        self.assertFalse(may_have_duplicates)
+        self.assertNotIn("JOIN", str(queryset.query))
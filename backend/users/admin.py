@@ -1,8 +1,12 @@
 from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
-from .models import Plan, User, UserProfile
+from eldinia_nex.admin_search import IndexedSearchMixin
+
+from .models import AnnouncementDelivery, Plan, User, UserProfile
 
 
 def _plan_choices() -> list[tuple[str, str]]:
@@ -19,8 +23,16 @@ def _plan_choices() -> list[tuple[str, str]]:
     return choices
 
 
+def _plan_labels() -> dict[str, str]:
+    """slug → 一覧表示用ラベル（User 一覧 1 リクエストにつき 1 クエリ）。"""
+    return {
+        slug: f"{name}（{int(price)}円）"
+        for slug, name, price in Plan.objects.values_list("slug", "name", "price")
+    }
+
+
 @admin.register(User)
-class UserAdmin(DjangoUserAdmin):  # type: ignore
+class UserAdmin(IndexedSearchMixin, DjangoUserAdmin):  # type: ignore
     model = User
     exclude = ("subscription", "subscription_type")
     _fieldsets = list(DjangoUserAdmin.fieldsets)
@@ -45,33 +57,60 @@ class UserAdmin(DjangoUserAdmin):  # type: ignore
         "username",
         "email",
         "display_name",
-        "subscription_plan_label",
+        # サブスクプランの列は get_list_display で display_name の後ろに差し込む
         "is_active",
         "account_status",
         "referred_by_user",
         "referred_users_count",
     ]
+    # referred_by_user は null 可のため、明示しないと行ごとに紹介者を引く
+    list_select_related = ("referred_by_user",)
     list_filter = ("subscription_plan", "is_active", "account_status")
+    # first_name / last_name は使っていないので検索しない（trigram インデックスのある列だけ）
+    search_fields = ("username", "display_name", "email")
+    search_uuid_fields = ("external_id",)
+    search_email_fields = ("email",)
     readonly_fields = ("external_id",)
 
-    def subscription_plan_label(self, obj: User) -> str:
-        plan = Plan.objects.filter(slug=obj.subscription_plan).first()
-        if plan:
-            return f"{plan.name}（{int(plan.price)}円）"
-        return obj.subscription_plan or "free"
+    def get_list_display(self, request):
+        # プランのラベルは行ごとに Plan を引かず、リクエストごとに 1 回まとめて読む
+        plan_labels = _plan_labels()
 
-    subscription_plan_label.short_description = "サブスクプラン"
-    subscription_plan_label.admin_order_field = "subscription_plan"
+        def subscription_plan_label(obj: User) -> str:
+            return plan_labels.get(obj.subscription_plan) or obj.subscription_plan or "free"
+
+        subscription_plan_label.short_description = "サブスクプラン"
+        subscription_plan_label.admin_order_field = "subscription_plan"
+        list_display = list(super().get_list_display(request))
+        list_display.insert(list_display.index("display_name") + 1, subscription_plan_label)
+        return list_display
 
     def formfield_for_dbfield(self, db_field, request, **kwargs):
         if db_field.name == "subscription_plan":
             kwargs["widget"] = forms.Select(choices=_plan_choices())
         return super().formfield_for_dbfield(db_field, request, **kwargs)
 
+    def get_queryset(self, request):
+        # 一覧の「紹介した人数」を行ごとの COUNT ではなく相関サブクエリで求める
+        # （GROUP BY を伴わないので、件数の COUNT や検索・autocomplete には影響しない）
+        referred = (
+            User.objects.filter(referred_by_user=OuterRef("pk"))
+            .order_by()
+            .values("referred_by_user")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return super().get_queryset(request).annotate(
+            _referred_users_count=Coalesce(Subquery(referred, output_field=IntegerField()), 0)
+        )
+
     def referred_users_count(self, obj):
+        if hasattr(obj, "_referred_users_count"):
+            return obj._referred_users_count
         return obj.referred_users.count()
 
     referred_users_count.short_description = "紹介した人数"
+    referred_users_count.admin_order_field = "_referred_users_count"
 
 
 @admin.register(UserProfile)
@@ -107,3 +146,26 @@ class PlanAdmin(admin.ModelAdmin):  # type: ignore
             )
             return redirect(reverse("admin:ops_subscription_plans"))
         return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(AnnouncementDelivery)
+class AnnouncementDeliveryAdmin(admin.ModelAdmin):  # type: ignore
+    list_display = (
+        "id",
+        "title",
+        "target",
+        "mode",
+        "priority",
+        "status",
+        "delivered_count",
+        "batch_count",
+        "attempts",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status", "mode", "target", "priority")
+    search_fields = ("title",)
+    readonly_fields = [field.name for field in AnnouncementDelivery._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
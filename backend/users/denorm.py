@@ -0,0 +1,94 @@
+"""User → 非正規化フィールド（Artwork.creator_* / ShopProduct.seller_external_id）の反映。
+
+User の保存ごとに即時 UPDATE せず、対象ユーザーをスレッドごとのキューに積み、
+トランザクションのコミット後に後続処理（eldinia_nex.background）としてまとめて反映する
+（リクエストの応答は反映を待たない）。同じトランザクション内で何度保存しても反映は 1 回にまとまる。
+更新対象の行は pk のキーセットでチャンクごとに読むので、作品数が多くても id を全件メモリに載せない。
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Iterable
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from eldinia_nex.background import submit
+
+DENORM_CHUNK_SIZE = 500
+
+_state = threading.local()
+
+
+def _pending() -> set[int]:
+    if not hasattr(_state, "user_ids"):
+        _state.user_ids = set()
+    return _state.user_ids
+
+
+def schedule_user_denorm(user_id: int) -> None:
+    """コミット後の反映対象にユーザーを追加する。"""
+    _pending().add(user_id)
+    # ロールバックで破棄されたコールバックがあっても、次のコミットで残りを処理する
+    transaction.on_commit(flush_user_denorm)
+
+
+def flush_user_denorm() -> int:
+    """キューに溜まったユーザーの反映を後続処理に投入し、投入したユーザー数を返す。"""
+    pending = _pending()
+    if not pending:
+        return 0
+    user_ids = sorted(pending)
+    pending.clear()
+    submit("user-denorm", refresh_user_denorm, user_ids)
+    return len(user_ids)
+
+
+def _chunked_update(queryset: Any, values: dict[str, Any], chunk_size: int) -> int:
+    updated = 0
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        ids = list(page.values_list("pk", flat=True)[:chunk_size])
+        if ids:
+            updated += queryset.model.objects.filter(pk__in=ids).update(**values)
+        if len(ids) < chunk_size:
+            return updated
+        last_pk = ids[-1]
+
+
+def refresh_user_denorm(user_ids: Iterable[int], *, chunk_size: int = DENORM_CHUNK_SIZE) -> int:
+    """現在の User の値で、値が食い違っている行だけを更新する。"""
+    from marketplace.admin_filters import invalidate_artwork_creator_choices
+    from marketplace.models import Artwork, ShopProduct
+
+    User = get_user_model()
+    updated = 0
+    artworks_updated = 0
+    for user in User.objects.filter(pk__in=list(user_ids)).values(
+        "pk", "username", "display_name", "avatar_url", "external_id"
+    ):
+        artwork_values = {
+            "creator_display_name": user["display_name"] or user["username"],
+            "creator_avatar_url": user["avatar_url"] or "",
+            "creator_external_id": user["external_id"],
+        }
+        artworks_updated += _chunked_update(
+            Artwork.objects.filter(creator_id=user["pk"]).exclude(**artwork_values),
+            artwork_values,
+            chunk_size,
+        )
+        updated += _chunked_update(
+            ShopProduct.objects.filter(seller_id=user["pk"]).exclude(
+                seller_external_id=user["external_id"]
+            ),
+            {"seller_external_id": user["external_id"]},
+            chunk_size,
+        )
+    if artworks_updated:
+        # 作者名が変わったので Admin の作者一覧を作り直す
+        invalidate_artwork_creator_choices()
+    return updated + artworks_updated
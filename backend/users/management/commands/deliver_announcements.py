@@ -0,0 +1,39 @@
+"""待機中・失敗した告知配信ジョブを配信する管理コマンド（cron で定期実行）"""
+
+from django.core.management.base import BaseCommand
+
+from users.operations.announcement_delivery import (
+    STALE_RUNNING_MINUTES,
+    run_announcement_delivery,
+    run_pending_deliveries,
+)
+
+
+class Command(BaseCommand):
+    help = "Deliver queued announcements and resume failed or stalled deliveries from their cursor."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--id", type=int, help="Deliver only this AnnouncementDelivery.")
+        parser.add_argument(
+            "--stale-minutes",
+            type=int,
+            default=STALE_RUNNING_MINUTES,
+            help="Treat running deliveries with no progress for this long as stalled.",
+        )
+
+    def handle(self, *args, **options):
+        if options["id"]:
+            delivery = run_announcement_delivery(
+                options["id"], stale_minutes=options["stale_minutes"]
+            )
+            if delivery is None:
+                self.stdout.write(self.style.WARNING("Delivery is not claimable (running or done)."))
+                return
+            result = {
+                "status": delivery.status,
+                "delivered": delivery.delivered_count,
+                "error": delivery.last_error,
+            }
+        else:
+            result = run_pending_deliveries(stale_minutes=options["stale_minutes"])
+        self.stdout.write(self.style.SUCCESS(f"announcement deliveries: {result}"))
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_user_iexact_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnouncementDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=120)),
+                ('body', models.TextField(blank=True)),
+                ('href', models.CharField(blank=True, max_length=500)),
+                ('target', models.CharField(max_length=20)),
+                ('target_email', models.EmailField(blank=True, max_length=254)),
+                ('priority', models.CharField(default='normal', max_length=20)),
+                ('status', models.CharField(choices=[('queued', '待機中'), ('running', '配信中'), ('completed', '完了'), ('failed', '失敗')], db_index=True, default='queued', max_length=20)),
+                ('cursor', models.CharField(blank=True, max_length=64)),
+                ('delivered_count', models.IntegerField(default=0)),
+                ('batch_count', models.IntegerField(default=0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '告知配信',
+                'verbose_name_plural': '告知配信',
+                'db_table': 'announcement_deliveries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
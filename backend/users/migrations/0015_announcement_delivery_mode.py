@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_announcement_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcementdelivery',
+            name='mode',
+            field=models.CharField(choices=[('broadcast', '全体告知（1 件保存・読み取り時に展開）'), ('fanout', '個別通知（ユーザーごとに保存）')], default='fanout', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='announcementdelivery',
+            name='delivered_count',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# UserAdmin 検索（username / display_name / email の icontains）用の pg_trgm GIN インデックス。
+# email の完全一致は既存の users_email_upper_idx を使う。
+TRGM_INDEXES = [
+    ("users_username_trgm_idx", "username"),
+    ("users_display_name_trgm_idx", "display_name"),
+    ("users_email_trgm_idx", "email"),
+]
+
+
+def create_trgm_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" '
+            f'ON "users" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _column in TRGM_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("users", "0015_announcement_delivery_mode"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
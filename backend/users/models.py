@@ -2,6 +2,7 @@ import uuid
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class User(AbstractUser):
@@ -74,6 +75,9 @@ class User(AbstractUser):
             models.Index(fields=["total_exp"]),
             models.Index(fields=["subscription_plan"]),
             models.Index(fields=["subscription"]),
+            # email__iexact / username__iexact（PostgreSQL は UPPER(col) で比較する）
+            models.Index(Upper("email"), name="users_email_upper_idx"),
+            models.Index(Upper("username"), name="users_username_upper_idx"),
         ]
 
     def save(self, *args, **kwargs):
@@ -160,3 +164,63 @@ class OpsSetting(models.Model):
 
 Defined models above. Removed trailing template lines.
 """
+
+
+class AnnouncementDelivery(models.Model):
+    """告知の配信ジョブ。個別通知は配信済みの位置（cursor）と件数を保存し、失敗時はそこから再開する。"""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "待機中"),
+        (STATUS_RUNNING, "配信中"),
+        (STATUS_COMPLETED, "完了"),
+        (STATUS_FAILED, "失敗"),
+    ]
+    MODE_BROADCAST = "broadcast"
+    MODE_FANOUT = "fanout"
+    MODE_CHOICES = [
+        (MODE_BROADCAST, "全体告知（1 件保存・読み取り時に展開）"),
+        (MODE_FANOUT, "個別通知（ユーザーごとに保存）"),
+    ]
+
+    title = models.CharField(max_length=120)
+    body = models.TextField(blank=True)
+    href = models.CharField(max_length=500, blank=True)
+    target = models.CharField(max_length=20)
+    target_email = models.EmailField(blank=True)
+    priority = models.CharField(max_length=20, default="normal")
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default=MODE_FANOUT)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True
+    )
+    # 個別通知: 最後に配信し終えたページの末尾 profile id（キーセットの再開位置）
+    cursor = models.CharField(max_length=64, blank=True)
+    # 個別通知: 保存した通知数 / 全体告知: 配信時点の対象人数（数えられなければ空）
+    delivered_count = models.IntegerField(default=0, null=True, blank=True)
+    batch_count = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        "users.User", null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "announcement_deliveries"
+        ordering = ["-created_at"]
+        verbose_name = "告知配信"
+        verbose_name_plural = "告知配信"
+
+    def __str__(self) -> str:
+        return f"#{self.pk} {self.title} ({self.status})"
+
+    @property
+    def delivery_key(self) -> str:
+        """user_notifications.delivery_key（再送しても同じユーザーに重複しない）。"""
+        return f"django-announcement:{self.pk}"
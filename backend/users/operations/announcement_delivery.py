@@ -0,0 +1,209 @@
+"""告知配信ジョブ（AnnouncementDelivery）の投入と実行。
+
+管理画面はジョブを作って後続処理に投入するだけで、配信はワーカーが行う。
+配信方式は 2 つ:
+- 全体告知（mode=broadcast, target=all / creators のみ）: announcement_broadcasts に 1 行書くだけ（件数に依存しない）。
+- 個別通知（mode=fanout）: 対象ユーザーごとに user_notifications へ 1 行ずつ書く。
+  ページ（profile id のキーセット）単位で読み、ページ内のバッチは並列に INSERT する。
+ページを配信し終えるごとに cursor と件数を保存するので、失敗したジョブは
+deliver_announcements コマンドで最後に配信し終えたページの次から再開できる。
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from eldinia_nex.background import submit_deduplicated
+from users.models import AnnouncementDelivery
+
+from .announcement_service import (
+    BROADCAST_TARGETS,
+    SupabaseAnnouncementError,
+    count_announcement_recipients,
+    insert_announcement_broadcast,
+    insert_announcement_rows,
+    iter_announcement_recipient_batches,
+    notification_rows,
+)
+
+DELIVERY_PAGE_SIZE = 2000
+DELIVERY_BATCH_SIZE = 500
+DELIVERY_WORKERS = 4
+MAX_DELIVERY_ATTEMPTS = 5
+# この時間 cursor が進まない running ジョブはワーカーが落ちたものとみなして再開する
+STALE_RUNNING_MINUTES = 30
+
+
+def enqueue_announcement_delivery(
+    *,
+    title: str,
+    body: str,
+    href: str | None,
+    target: str,
+    email: str | None = None,
+    priority: str = "normal",
+    mode: str = AnnouncementDelivery.MODE_BROADCAST,
+    created_by: Any = None,
+) -> AnnouncementDelivery:
+    """配信ジョブを作成し、コミット後に後続処理へ投入する。
+
+    全体告知は target=all / creators のときだけ選べる（target=email は常に個別通知）。
+    """
+    delivery = AnnouncementDelivery.objects.create(
+        title=title[:120],
+        body=body or "",
+        href=(href or "")[:500],
+        target=target,
+        target_email=email or "",
+        priority="critical" if priority == "critical" else "normal",
+        mode=(
+            AnnouncementDelivery.MODE_BROADCAST
+            if mode == AnnouncementDelivery.MODE_BROADCAST and target in BROADCAST_TARGETS
+            else AnnouncementDelivery.MODE_FANOUT
+        ),
+        created_by=created_by if getattr(created_by, "pk", None) else None,
+    )
+    submit_deduplicated(
+        f"announcement-delivery:{delivery.pk}", run_announcement_delivery, delivery.pk
+    )
+    return delivery
+
+
+def claimable_deliveries(*, stale_minutes: int = STALE_RUNNING_MINUTES):
+    stale_before = timezone.now() - timedelta(minutes=stale_minutes)
+    return AnnouncementDelivery.objects.filter(
+        Q(status=AnnouncementDelivery.STATUS_QUEUED)
+        | Q(status=AnnouncementDelivery.STATUS_FAILED, attempts__lt=MAX_DELIVERY_ATTEMPTS)
+        | Q(status=AnnouncementDelivery.STATUS_RUNNING, updated_at__lt=stale_before)
+    )
+
+
+def _claim(delivery_id: int, *, stale_minutes: int) -> bool:
+    now = timezone.now()
+    return bool(
+        claimable_deliveries(stale_minutes=stale_minutes)
+        .filter(pk=delivery_id)
+        .update(
+            status=AnnouncementDelivery.STATUS_RUNNING,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            updated_at=now,
+        )
+    )
+
+
+def _finish(delivery_id: int, *, status: str, error: str = "") -> None:
+    now = timezone.now()
+    AnnouncementDelivery.objects.filter(pk=delivery_id).update(
+        status=status,
+        last_error=error,
+        finished_at=now if status == AnnouncementDelivery.STATUS_COMPLETED else None,
+        updated_at=now,
+    )
+
+
+def _run_broadcast(delivery: AnnouncementDelivery) -> AnnouncementDelivery:
+    try:
+        insert_announcement_broadcast(
+            audience=delivery.target,
+            title=delivery.title,
+            body=delivery.body,
+            href=delivery.href or None,
+            priority=delivery.priority,
+            delivery_id=delivery.pk,
+        )
+    except SupabaseAnnouncementError as exc:
+        _finish(delivery.pk, status=AnnouncementDelivery.STATUS_FAILED, error=str(exc))
+    else:
+        # 件数は読み取り時に決まるので、配信時点の対象人数を記録する（数えられなければ空のまま）
+        try:
+            audience = count_announcement_recipients(target=delivery.target)
+        except SupabaseAnnouncementError:
+            audience = None
+        AnnouncementDelivery.objects.filter(pk=delivery.pk).update(
+            delivered_count=audience, batch_count=1
+        )
+        _finish(delivery.pk, status=AnnouncementDelivery.STATUS_COMPLETED)
+    delivery.refresh_from_db()
+    return delivery
+
+
+def run_announcement_delivery(
+    delivery_id: int,
+    *,
+    page_size: int = DELIVERY_PAGE_SIZE,
+    batch_size: int = DELIVERY_BATCH_SIZE,
+    workers: int = DELIVERY_WORKERS,
+    stale_minutes: int = STALE_RUNNING_MINUTES,
+) -> AnnouncementDelivery | None:
+    """ジョブを 1 件配信する。他のワーカーが処理中などで取得できなければ None。"""
+    if not _claim(delivery_id, stale_minutes=stale_minutes):
+        return None
+    delivery = AnnouncementDelivery.objects.get(pk=delivery_id)
+    if delivery.mode == AnnouncementDelivery.MODE_BROADCAST:
+        return _run_broadcast(delivery)
+    delivery_key = delivery.delivery_key
+
+    def insert(chunk: list[dict[str, Any]]) -> int:
+        return insert_announcement_rows(chunk, delivery_key=delivery_key)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for user_ids in iter_announcement_recipient_batches(
+                target=delivery.target,
+                email=delivery.target_email or None,
+                after=delivery.cursor or None,
+                page_size=page_size,
+            ):
+                rows = notification_rows(
+                    user_ids,
+                    title=delivery.title,
+                    body=delivery.body,
+                    href=delivery.href or None,
+                    priority=delivery.priority,
+                )
+                chunks = [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+                delivered = sum(pool.map(insert, chunks))
+                AnnouncementDelivery.objects.filter(pk=delivery_id).update(
+                    cursor=user_ids[-1],
+                    delivered_count=F("delivered_count") + delivered,
+                    batch_count=F("batch_count") + len(chunks),
+                    updated_at=timezone.now(),
+                )
+    except SupabaseAnnouncementError as exc:
+        _finish(delivery_id, status=AnnouncementDelivery.STATUS_FAILED, error=str(exc))
+    else:
+        delivery.refresh_from_db(fields=["delivered_count"])
+        if delivery.delivered_count:
+            _finish(delivery_id, status=AnnouncementDelivery.STATUS_COMPLETED)
+        else:
+            _finish(
+                delivery_id,
+                status=AnnouncementDelivery.STATUS_FAILED,
+                error="配信対象ユーザーが 0 件です。",
+            )
+    delivery.refresh_from_db()
+    return delivery
+
+
+def run_pending_deliveries(*, stale_minutes: int = STALE_RUNNING_MINUTES) -> dict[str, int]:
+    """待機中・失敗（再試行回数内）・停止した配信ジョブを古い順に処理する。"""
+    result = {"completed": 0, "failed": 0, "skipped": 0}
+    for delivery_id in (
+        claimable_deliveries(stale_minutes=stale_minutes)
+        .order_by("created_at")
+        .values_list("pk", flat=True)
+    ):
+        delivery = run_announcement_delivery(delivery_id, stale_minutes=stale_minutes)
+        if delivery is None:
+            result["skipped"] += 1
+        elif delivery.status == AnnouncementDelivery.STATUS_COMPLETED:
+            result["completed"] += 1
+        else:
+            result["failed"] += 1
+    return result
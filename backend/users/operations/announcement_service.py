@@ -3,7 +3,8 @@
 from __future__ import annotations
 
 import os
-from typing import Any
+import time
+from typing import Any, Iterator
 
 import requests
 
@@ -36,101 +37,146 @@ def _headers(key: str) -> dict[str, str]:
     }
 
 
-def fetch_supabase_profile_ids(
-    *,
-    target: str,
-    email: str | None = None,
-) -> list[str]:
-    """配信対象の Supabase profile id 一覧"""
-    url, key = _supabase_config()
-    params: dict[str, str] = {"select": "id,user_settings(notify_announcement)"}
+# 全体告知は announcement_broadcasts に 1 行だけ保存し、読み取り時に対象ユーザーへ展開する
+BROADCAST_TARGETS = ("all", "creators")
+RECIPIENT_PAGE_SIZE = 1000
+INSERT_ATTEMPTS = 3
+INSERT_RETRY_BACKOFF_SECONDS = 2
 
-    if target == "creators":
-        params["is_creator"] = "eq.true"
 
-    if target == "email":
-        if not email:
-            raise SupabaseAnnouncementError("メールアドレスを指定してください。")
-        auth_url = f"{url}/auth/v1/admin/users"
-        resp = requests.get(
-            auth_url,
-            headers=_headers(key),
-            params={"email": email},
-            timeout=30,
-        )
-        if resp.status_code >= 400:
-            raise SupabaseAnnouncementError(
-                f"ユーザー検索に失敗しました: {resp.text[:200]}"
-            )
-        users = resp.json().get("users") or resp.json()
-        if isinstance(users, dict):
-            users = users.get("users", [])
-        if not users:
-            raise SupabaseAnnouncementError(f"メール {email} のユーザーが見つかりません。")
-        return [str(users[0]["id"])]
-
-    rest_url = f"{url}/rest/v1/profiles"
-    resp = requests.get(rest_url, headers=_headers(key), params=params, timeout=30)
+def _find_user_id_by_email(url: str, key: str, email: str) -> str:
+    resp = requests.get(
+        f"{url}/auth/v1/admin/users",
+        headers=_headers(key),
+        params={"email": email},
+        timeout=30,
+    )
     if resp.status_code >= 400:
         raise SupabaseAnnouncementError(
-            f"プロフィール取得に失敗しました: {resp.text[:200]}"
+            f"ユーザー検索に失敗しました: {resp.text[:200]}"
         )
-    rows = resp.json()
-    ids: list[str] = []
-    for row in rows:
-        if not row.get("id"):
-            continue
-        settings_row = row.get("user_settings")
-        if isinstance(settings_row, list):
-            settings_row = settings_row[0] if settings_row else None
-        if settings_row and settings_row.get("notify_announcement") is False:
-            continue
-        ids.append(str(row["id"]))
-    return ids
+    users = resp.json().get("users") or resp.json()
+    if isinstance(users, dict):
+        users = users.get("users", [])
+    if not users:
+        raise SupabaseAnnouncementError(f"メール {email} のユーザーが見つかりません。")
+    return str(users[0]["id"])
+
 
+def _audience_params(*, target: str) -> dict[str, str]:
+    """告知を受け取る profiles の絞り込み条件（件数確認と個別配信のページ取得で共用）。
 
-def _filter_announcement_recipients(user_ids: list[str]) -> list[str]:
-    if not user_ids:
-        return []
+    user_settings を notify_announcement=false の行だけに絞って埋め込み、
+    埋め込みが空（= 設定なし or 受け取る）の profile だけを対象にする（サーバー側のアンチジョイン）。
+    """
+    params: dict[str, str] = {
+        "select": "id,user_settings(notify_announcement)",
+        "user_settings.notify_announcement": "is.false",
+        "user_settings": "is.null",
+    }
+    if target == "creators":
+        params["is_creator"] = "eq.true"
+    return params
+
+
+def resolve_announcement_recipient(email: str | None) -> str | None:
+    """個別通知の宛先 profile id。告知を受け取らない設定なら None。"""
+    if not email:
+        raise SupabaseAnnouncementError("メールアドレスを指定してください。")
     url, key = _supabase_config()
+    user_id = _find_user_id_by_email(url, key, email)
     resp = requests.get(
         f"{url}/rest/v1/user_settings",
         headers=_headers(key),
         params={
-            "user_id": f"in.({','.join(user_ids)})",
-            "select": "user_id,notify_announcement",
+            "user_id": f"eq.{user_id}",
+            "notify_announcement": "is.false",
+            "select": "user_id",
         },
         timeout=30,
     )
-    if resp.status_code >= 400:
-        return user_ids
-    opted_out = {
-        str(row["user_id"])
-        for row in resp.json()
-        if row.get("notify_announcement") is False
-    }
-    return [uid for uid in user_ids if uid not in opted_out]
+    if resp.status_code >= 400 or not resp.json():
+        return user_id
+    return None
 
 
-def send_announcement(
+def iter_announcement_recipient_batches(
     *,
-    title: str,
-    body: str,
-    href: str | None,
     target: str,
     email: str | None = None,
-    priority: str = "normal",
-) -> int:
-    """user_notifications に announcement を一括 INSERT。配信件数を返す。"""
+    after: str | None = None,
+    page_size: int = RECIPIENT_PAGE_SIZE,
+) -> Iterator[list[str]]:
+    """配信対象の Supabase profile id をページ単位で返す（全件を一度にメモリへ載せない）。
+
+    id 昇順のキーセットで読み、after を渡すとその id より後ろから再開する（配信ジョブの cursor）。
+    """
+    if target == "email":
+        user_id = resolve_announcement_recipient(email)
+        if user_id:
+            yield [user_id]
+        return
+
+    url, key = _supabase_config()
+    while True:
+        params = {**_audience_params(target=target), "order": "id.asc", "limit": str(page_size)}
+        if after:
+            params["id"] = f"gt.{after}"
+        resp = requests.get(
+            f"{url}/rest/v1/profiles",
+            headers=_headers(key),
+            params=params,
+            timeout=30,
+        )
+        if resp.status_code >= 400:
+            raise SupabaseAnnouncementError(
+                f"プロフィール取得に失敗しました: {resp.text[:200]}"
+            )
+        rows = resp.json()
+        ids = [str(row["id"]) for row in rows if row.get("id")]
+        if ids:
+            yield ids
+        if len(rows) < page_size:
+            return
+        after = str(rows[-1]["id"])
+
+
+def _parse_content_range_total(value: str | None) -> int | None:
+    """PostgREST の Content-Range（例: "0-24/3573" / "*/0"）から総件数を取り出す。"""
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def count_announcement_recipients(*, target: str, email: str | None = None) -> int:
+    """配信対象の人数（id 一覧は取得せず、HEAD + Prefer: count=exact で件数だけ数える）。"""
+    if target == "email":
+        return int(resolve_announcement_recipient(email) is not None)
+
     url, key = _supabase_config()
-    user_ids = _filter_announcement_recipients(
-        fetch_supabase_profile_ids(target=target, email=email)
+    resp = requests.head(
+        f"{url}/rest/v1/profiles",
+        headers={**_headers(key), "Prefer": "count=exact"},
+        params=_audience_params(target=target),
+        timeout=30,
     )
-    if not user_ids:
-        raise SupabaseAnnouncementError("配信対象ユーザーが 0 件です。")
+    total = _parse_content_range_total(resp.headers.get("Content-Range"))
+    if resp.status_code >= 400 or total is None:
+        raise SupabaseAnnouncementError(
+            f"配信対象の件数を取得できませんでした ({resp.status_code})"
+        )
+    return total
 
-    priority_value = "critical" if priority == "critical" else "normal"
 
+def notification_rows(
+    user_ids: list[str],
+    *,
+    title: str,
+    body: str,
+    href: str | None,
+    priority: str,
+) -> list[dict[str, Any]]:
     rows: list[dict[str, Any]] = []
     for user_id in user_ids:
         row: dict[str, Any] = {
@@ -138,30 +184,84 @@ def send_announcement(
             "kind": "announcement",
             "title": title[:120],
             "body": body[:2000] if body else None,
-            "priority": priority_value,
+            "priority": priority,
         }
         if href:
             row["href"] = href[:500]
         rows.append(row)
+    return rows
 
-    rest_url = f"{url}/rest/v1/user_notifications"
-    batch_size = 100
-    sent = 0
-    for i in range(0, len(rows), batch_size):
-        chunk = rows[i : i + batch_size]
-        resp = requests.post(
-            rest_url,
-            headers=_headers(key),
-            json=chunk,
-            timeout=60,
-        )
-        if resp.status_code >= 400:
-            raise SupabaseAnnouncementError(
-                f"告知送信に失敗しました ({resp.status_code}): {resp.text[:300]}"
+
+def insert_announcement_rows(
+    rows: list[dict[str, Any]],
+    *,
+    delivery_key: str,
+    attempts: int = INSERT_ATTEMPTS,
+) -> int:
+    """user_notifications に 1 バッチ INSERT する（失敗時は間隔を空けて再試行）。
+
+    (user_id, delivery_key) の一意制約で重複を無視するので、同じバッチを再送しても二重配信にならない。
+    """
+    if not rows:
+        return 0
+    url, key = _supabase_config()
+    payload = [{**row, "delivery_key": delivery_key} for row in rows]
+    last_error = ""
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(INSERT_RETRY_BACKOFF_SECONDS * attempt)
+        try:
+            resp = requests.post(
+                f"{url}/rest/v1/user_notifications",
+                headers={**_headers(key), "Prefer": "resolution=ignore-duplicates,return=minimal"},
+                params={"on_conflict": "user_id,delivery_key"},
+                json=payload,
+                timeout=60,
             )
-        sent += len(chunk)
+        except requests.RequestException as exc:
+            last_error = str(exc)
+            continue
+        if resp.status_code < 400:
+            return len(rows)
+        last_error = f"({resp.status_code}): {resp.text[:300]}"
+        if resp.status_code < 500 and resp.status_code != 429:
+            break
+    raise SupabaseAnnouncementError(f"告知送信に失敗しました {last_error}")
+
 
-    return sent
+def insert_announcement_broadcast(
+    *,
+    audience: str,
+    title: str,
+    body: str,
+    href: str | None,
+    priority: str,
+    delivery_id: int,
+) -> None:
+    """announcement_broadcasts に 1 行 INSERT（同じ配信ジョブの再実行は無視される）。"""
+    url, key = _supabase_config()
+    row: dict[str, Any] = {
+        "audience": audience,
+        "title": title[:120],
+        "body": body[:2000] if body else None,
+        "href": href[:500] if href else None,
+        "priority": priority,
+        "django_delivery_id": delivery_id,
+    }
+    try:
+        resp = requests.post(
+            f"{url}/rest/v1/announcement_broadcasts",
+            headers={**_headers(key), "Prefer": "resolution=ignore-duplicates,return=minimal"},
+            params={"on_conflict": "django_delivery_id"},
+            json=row,
+            timeout=30,
+        )
+    except requests.RequestException as exc:
+        raise SupabaseAnnouncementError(f"告知送信に失敗しました: {exc}") from exc
+    if resp.status_code >= 400:
+        raise SupabaseAnnouncementError(
+            f"告知送信に失敗しました ({resp.status_code}): {resp.text[:300]}"
+        )
 
 
 def preview_announcement(
@@ -172,9 +272,14 @@ def preview_announcement(
     target: str,
     email: str | None = None,
     priority: str = "normal",
+    mode: str = "broadcast",
+    recipient_count: int | None = None,
 ) -> list[dict[str, str]]:
-    user_ids = _filter_announcement_recipients(
-        fetch_supabase_profile_ids(target=target, email=email)
+    """確認画面の表示内容。recipient_count を渡すと件数の再取得を省く（確認フロー中のキャッシュ）。"""
+    recipients = (
+        recipient_count
+        if recipient_count is not None
+        else count_announcement_recipients(target=target, email=email)
     )
     target_label = {
         "all": "全ユーザー",
@@ -184,8 +289,14 @@ def preview_announcement(
     priority_label = (
         "最重要（Frontend モーダル）" if priority == "critical" else "通常（通知ベル）"
     )
+    mode_label = (
+        "全体告知（1 件保存・読み取り時に展開）"
+        if mode == "broadcast" and target in BROADCAST_TARGETS
+        else "個別通知（ユーザーごとに保存）"
+    )
     return [
-        {"label": "配信先", "value": f"{target_label} — {len(user_ids)} 件"},
+        {"label": "配信先", "value": f"{target_label} — {recipients} 件"},
+        {"label": "配信方式", "value": mode_label},
         {"label": "重要度", "value": priority_label},
         {"label": "タイトル", "value": title},
         {"label": "本文", "value": body or "（なし）"},
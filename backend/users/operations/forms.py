@@ -321,6 +321,10 @@ class AnnouncementBroadcastForm(forms.Form):
         ("creators", "クリエイターのみ"),
         ("email", "メールアドレス指定（1名）"),
     ]
+    MODE_CHOICES = [
+        ("broadcast", "全体告知（1 件保存・読み取り時に展開）"),
+        ("fanout", "個別通知（ユーザーごとに保存）"),
+    ]
 
     target = forms.ChoiceField(
         label="配信先",
@@ -337,6 +341,13 @@ class AnnouncementBroadcastForm(forms.Form):
             }
         ),
     )
+    mode = forms.ChoiceField(
+        label="配信方式",
+        choices=MODE_CHOICES,
+        initial="broadcast",
+        help_text="メールアドレス指定は常に個別通知になります。",
+        widget=forms.Select(attrs={"class": "ops-select"}),
+    )
     title = forms.CharField(
         label="タイトル",
         max_length=120,
@@ -190,7 +190,8 @@ def run_manual_plan_push(*, reason: str = "manual_admin") -> dict[str, Any]:
         result = push_django_plans_to_supabase()
         msg = (
             f"Supabase へ同期完了（push={result.get('pushed')}, "
-            f"archive={result.get('archived')}, reason={reason}）"
+            f"archive={result.get('archived')}, unchanged={result.get('unchanged', 0)}, "
+            f"reason={reason}）"
         )
         _record_sync_meta(ok=True, message=msg, result=result)
         return {"ok": True, "message": msg, "result": result}
@@ -17,10 +17,11 @@ from .forms import (
     QuestSettingsForm,
     SubscriptionPlanPricesForm,
 )
+from .announcement_delivery import enqueue_announcement_delivery
 from .announcement_service import (
     SupabaseAnnouncementError,
+    count_announcement_recipients,
     preview_announcement,
-    send_announcement,
 )
 from .services import (
     SESSION_KEY,
@@ -488,6 +489,7 @@ def announcement_broadcast_view(request: HttpRequest) -> HttpResponse:
             payload = {
                 "target": form.cleaned_data["target"],
                 "target_email": form.cleaned_data.get("target_email") or "",
+                "mode": form.cleaned_data["mode"],
                 "title": form.cleaned_data["title"],
                 "body": form.cleaned_data.get("body") or "",
                 "href": form.cleaned_data.get("href") or "",
@@ -521,6 +523,13 @@ def announcement_broadcast_confirm_view(request: HttpRequest) -> HttpResponse:
         return redirect("admin:ops_announcement_broadcast")
 
     try:
+        # 件数は確認フローの最初に 1 回だけ数え、セッションに保持する
+        if pending.get("recipient_count") is None:
+            pending["recipient_count"] = count_announcement_recipients(
+                target=pending["target"],
+                email=pending["target_email"] or None,
+            )
+            request.session[SESSION_KEY_ANNOUNCEMENT] = pending
         preview = preview_announcement(
             title=pending["title"],
             body=pending["body"],
@@ -528,6 +537,8 @@ def announcement_broadcast_confirm_view(request: HttpRequest) -> HttpResponse:
             target=pending["target"],
             email=pending["target_email"] or None,
             priority=pending.get("priority") or "normal",
+            mode=pending.get("mode") or "broadcast",
+            recipient_count=pending["recipient_count"],
         )
     except SupabaseAnnouncementError as exc:
         messages.error(request, str(exc))
@@ -538,24 +549,27 @@ def announcement_broadcast_confirm_view(request: HttpRequest) -> HttpResponse:
         if form.is_valid():
             if not request.user.check_password(form.cleaned_data["admin_password"]):
                 form.add_error("admin_password", "パスワードが正しくありません。")
+            elif not pending["recipient_count"]:
+                messages.error(request, "配信対象ユーザーが 0 件です。")
+                return redirect("admin:ops_announcement_broadcast")
             else:
-                try:
-                    count = send_announcement(
-                        title=pending["title"],
-                        body=pending["body"],
-                        href=pending["href"] or None,
-                        target=pending["target"],
-                        email=pending["target_email"] or None,
-                        priority=pending.get("priority") or "normal",
-                    )
-                except SupabaseAnnouncementError as exc:
-                    messages.error(request, str(exc))
-                    return redirect("admin:ops_announcement_broadcast")
+                delivery = enqueue_announcement_delivery(
+                    title=pending["title"],
+                    body=pending["body"],
+                    href=pending["href"] or None,
+                    target=pending["target"],
+                    email=pending["target_email"] or None,
+                    priority=pending.get("priority") or "normal",
+                    mode=pending.get("mode") or "broadcast",
+                    created_by=request.user,
+                )
                 del request.session[SESSION_KEY_ANNOUNCEMENT]
                 priority = pending.get("priority") or "normal"
                 extra = "（最重要モーダル）" if priority == "critical" else ""
                 messages.success(
-                    request, f"告知を {count} 件のユーザーに送信しました{extra}。"
+                    request,
+                    f"告知の配信を開始しました{extra}（配信 #{delivery.pk}）。"
+                    "進捗は「告知配信」一覧で確認できます。",
                 )
                 return redirect("admin:ops_announcement_broadcast")
     else:
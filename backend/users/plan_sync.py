@@ -3,13 +3,17 @@
 方針:
 - 新しいデータ（updated_at / synced_at / version）を優先
 - 上書きされる側の旧定義は subscription_plan_archives に格納（物理削除しない）
+- 内容ハッシュが一致するプランは archive / push しない（version を進めない）
+- archive と upsert はそれぞれ 1 回の一括 POST にまとめる
 """
 
 from __future__ import annotations
 
+import hashlib
+import json
 import os
 from datetime import datetime, timezone
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from typing import Any
 
 import requests
@@ -98,35 +102,103 @@ def _supabase_row_from_plan(plan: Plan, *, version: int, source: str) -> dict[st
     }
 
 
+# 内容比較の対象（version / source / synced_at などのメタ情報は含めない）
+PLAN_CONTENT_FIELDS = (
+    "slug",
+    "name",
+    "price_yen",
+    "currency",
+    "billing_cycle",
+    "shop_fee_percent",
+    "features",
+    "trial_days",
+    "is_active",
+    "sort_order",
+)
+
+
+def _normalize_number(value: Any) -> str | None:
+    if value is None or value == "":
+        return None
+    try:
+        return str(Decimal(str(value)).normalize())
+    except InvalidOperation:
+        return str(value)
+
+
+def _plan_content(row: dict[str, Any]) -> dict[str, Any]:
+    """Supabase 行（または _supabase_row_from_plan の結果）から比較用の内容を取り出す。"""
+    features = row.get("features") or {}
+    if isinstance(features, dict):
+        # Supabase 側を取り込んだときの退避データは内容に含めない
+        features = {k: v for k, v in features.items() if k != "_archived_django"}
+    return {
+        "slug": row.get("slug"),
+        "name": row.get("name") or "",
+        "price_yen": int(Decimal(str(row.get("price_yen") or 0))),
+        "currency": row.get("currency") or "JPY",
+        "billing_cycle": row.get("billing_cycle") or "monthly",
+        "shop_fee_percent": _normalize_number(row.get("shop_fee_percent")),
+        "features": features,
+        "trial_days": int(row.get("trial_days") or 0),
+        "is_active": bool(row.get("is_active", True)),
+        "sort_order": int(row.get("sort_order") or 0),
+    }
+
+
+def plan_content_hash(row: dict[str, Any]) -> str:
+    content = _plan_content(row)
+    encoded = json.dumps(
+        [content[field] for field in PLAN_CONTENT_FIELDS],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _plan_unchanged(plan: Plan, row: dict[str, Any]) -> bool:
+    return plan_content_hash(_supabase_row_from_plan(plan, version=1, source="django")) == (
+        plan_content_hash(row)
+    )
+
+
 def _ensure_django_catalog() -> None:
     """カタログに無い slug だけ作成。既存 Plan の料金は上書きしない（Admin 変更を守る）。"""
+    existing = set(Plan.objects.values_list("slug", flat=True))
     for slot in LP_PLAN_CATALOG:
-        Plan.objects.get_or_create(slug=slot["slug"], defaults=plan_defaults(slot))
-    Plan.objects.filter(slug="pro").update(is_active=False)
-
-
-def _archive_supabase_plan(url: str, key: str, row: dict[str, Any], reason: str) -> None:
-    slug = row["slug"]
-    version = int(row.get("version") or 1)
-    payload = {
-        "slug": slug,
-        "version": version,
-        "snapshot": row,
-        "archived_reason": reason,
-        "archived_by": "django_plan_sync",
-    }
+        if slot["slug"] not in existing:
+            Plan.objects.get_or_create(slug=slot["slug"], defaults=plan_defaults(slot))
+    Plan.objects.filter(slug="pro", is_active=True).update(is_active=False)
+
+
+def _archive_supabase_plans(url: str, key: str, rows: list[dict[str, Any]], reason: str) -> int:
+    """上書きされる Supabase 行をまとめて archive する（1 回の POST、同じ version は無視）。"""
+    if not rows:
+        return 0
+    payload = [
+        {
+            "slug": row["slug"],
+            "version": int(row.get("version") or 1),
+            "snapshot": row,
+            "archived_reason": reason,
+            "archived_by": "django_plan_sync",
+        }
+        for row in rows
+    ]
     response = requests.post(
         f"{url}/rest/v1/subscription_plan_archives",
         headers={**_headers(key), "Prefer": "resolution=ignore-duplicates,return=minimal"},
+        params={"on_conflict": "slug,version"},
         json=payload,
         timeout=30,
     )
+    # unique conflict is fine (already archived)
     if response.status_code not in (200, 201, 409):
-        # unique conflict is fine (already archived)
-        if response.status_code != 409:
-            raise PlanSyncError(
-                f"archive failed: {response.status_code} {response.text[:200]}"
-            )
+        raise PlanSyncError(
+            f"archive failed: {response.status_code} {response.text[:200]}"
+        )
+    return len(rows)
 
 
 def _fetch_supabase_plans(url: str, key: str) -> list[dict[str, Any]]:
@@ -143,20 +215,25 @@ def _fetch_supabase_plans(url: str, key: str) -> list[dict[str, Any]]:
     return response.json()
 
 
-def _upsert_supabase_plan(url: str, key: str, row: dict[str, Any]) -> None:
+def _upsert_supabase_plans(url: str, key: str, rows: list[dict[str, Any]]) -> int:
+    """subscription_plans をまとめて upsert する（1 回の POST）。"""
+    if not rows:
+        return 0
     response = requests.post(
         f"{url}/rest/v1/subscription_plans",
         headers={
             **_headers(key),
             "Prefer": "resolution=merge-duplicates,return=minimal",
         },
-        json=row,
+        params={"on_conflict": "slug"},
+        json=rows,
         timeout=30,
     )
     if not response.ok:
         raise PlanSyncError(
             f"upsert subscription_plans failed: {response.status_code} {response.text[:200]}"
         )
+    return len(rows)
 
 
 @transaction.atomic
@@ -168,9 +245,10 @@ def sync_plans_bidirectional(*, prefer: str = "newest") -> dict[str, Any]:
     django_plans = {p.slug: p for p in Plan.objects.exclude(slug="pro")}
     supabase_rows = {r["slug"]: r for r in _fetch_supabase_plans(url, key)}
 
-    pushed = 0
+    to_archive: list[dict[str, Any]] = []
+    to_push: list[dict[str, Any]] = []
     pulled = 0
-    archived = 0
+    unchanged = 0
 
     all_slugs = set(django_plans) | set(supabase_rows) | {s["slug"] for s in LP_PLAN_CATALOG}
 
@@ -179,12 +257,7 @@ def sync_plans_bidirectional(*, prefer: str = "newest") -> dict[str, Any]:
         s_row = supabase_rows.get(slug)
 
         if d_plan and not s_row:
-            _upsert_supabase_plan(
-                url,
-                key,
-                _supabase_row_from_plan(d_plan, version=1, source="django"),
-            )
-            pushed += 1
+            to_push.append(_supabase_row_from_plan(d_plan, version=1, source="django"))
             continue
 
         if s_row and not d_plan:
@@ -207,6 +280,10 @@ def sync_plans_bidirectional(*, prefer: str = "newest") -> dict[str, Any]:
         if not d_plan or not s_row:
             continue
 
+        if _plan_unchanged(d_plan, s_row):
+            unchanged += 1
+            continue
+
         d_ts = _aware(getattr(d_plan, "updated_at", None) or getattr(d_plan, "created_at", None))
         s_ts = _parse_ts(s_row.get("synced_at") or s_row.get("updated_at"))
         s_version = int(s_row.get("version") or 1)
@@ -214,14 +291,8 @@ def sync_plans_bidirectional(*, prefer: str = "newest") -> dict[str, Any]:
         django_newer = d_ts >= s_ts if prefer == "newest" else True
 
         if django_newer:
-            _archive_supabase_plan(url, key, s_row, "superseded_by_django")
-            archived += 1
-            _upsert_supabase_plan(
-                url,
-                key,
-                _supabase_row_from_plan(d_plan, version=s_version + 1, source="django"),
-            )
-            pushed += 1
+            to_archive.append(s_row)
+            to_push.append(_supabase_row_from_plan(d_plan, version=s_version + 1, source="django"))
         else:
             # Supabase newer → archive conceptually by bumping django from remote
             # Keep previous django features by writing into features._previous if present
@@ -240,31 +311,36 @@ def sync_plans_bidirectional(*, prefer: str = "newest") -> dict[str, Any]:
             d_plan.save()
             pulled += 1
 
+    archived = _archive_supabase_plans(url, key, to_archive, "superseded_by_django")
+    pushed = _upsert_supabase_plans(url, key, to_push)
     return {
         "ok": True,
         "pushed": pushed,
         "pulled": pulled,
         "archived": archived,
+        "unchanged": unchanged,
         "slugs": sorted(all_slugs),
     }
 
 
 def push_django_plans_to_supabase() -> dict[str, Any]:
-    """Django を正として Supabase へ押し出し（旧は archive）。"""
+    """Django を正として Supabase へ押し出し（旧は archive）。内容が同じプランは送らない。"""
     _ensure_django_catalog()
     url, key = _supabase_config()
     existing = {r["slug"]: r for r in _fetch_supabase_plans(url, key)}
-    archived = 0
-    pushed = 0
+    to_archive: list[dict[str, Any]] = []
+    to_push: list[dict[str, Any]] = []
+    unchanged = 0
     for plan in Plan.objects.exclude(slug="pro").filter(is_active=True):
         prev = existing.get(plan.slug)
         version = 1
         if prev:
-            _archive_supabase_plan(url, key, prev, "superseded_by_django_push")
-            archived += 1
+            if _plan_unchanged(plan, prev):
+                unchanged += 1
+                continue
+            to_archive.append(prev)
             version = int(prev.get("version") or 1) + 1
-        _upsert_supabase_plan(
-            url, key, _supabase_row_from_plan(plan, version=version, source="django")
-        )
-        pushed += 1
-    return {"ok": True, "pushed": pushed, "archived": archived}
+        to_push.append(_supabase_row_from_plan(plan, version=version, source="django"))
+    archived = _archive_supabase_plans(url, key, to_archive, "superseded_by_django_push")
+    pushed = _upsert_supabase_plans(url, key, to_push)
+    return {"ok": True, "pushed": pushed, "archived": archived, "unchanged": unchanged}
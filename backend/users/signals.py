@@ -1,12 +1,59 @@
-from typing import Any, Dict
+from typing import Any
 
 # pylint: disable=no-member,unused-argument,broad-exception-caught
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 
 from .models import User
 
+# 保存前後の差分を見て後続処理を絞り込む User フィールド
+TRACKED_FIELDS: tuple[str, ...] = (
+    "subscription_plan",
+    "username",
+    "display_name",
+    "avatar_url",
+    "external_id",
+)
+# Artwork.creator_* / ShopProduct.seller_external_id の元になるフィールド
+DENORM_SOURCE_FIELDS: tuple[str, ...] = ("username", "display_name", "avatar_url", "external_id")
+
+
+@receiver(pre_save, sender=User)
+def detect_tracked_user_changes(
+    sender: Any, instance: User, update_fields: Any = None, **kwargs: Any
+) -> None:
+    """instance._changed_fields に今回の保存で変わる追跡フィールドを記録する。
+
+    読み込みのたびに控えを取らず、保存時に DB 上の値と比べる（追跡フィールドを
+    書かない update_fields 付きの保存、たとえばログイン時の last_login は読まない）。
+    """
+    fields = TRACKED_FIELDS if update_fields is None else tuple(
+        field for field in TRACKED_FIELDS if field in update_fields
+    )
+    if not fields:
+        instance._changed_fields = set()
+        return
+    stored = None
+    if not instance._state.adding and instance.pk is not None:
+        stored = (
+            User._default_manager.using(kwargs.get("using"))
+            .filter(pk=instance.pk)
+            .values(*fields)
+            .first()
+        )
+    instance._changed_fields = {
+        field for field in fields if stored is None or stored[field] != getattr(instance, field)
+    }
+
+
+def user_fields_changed(instance: User, *fields: str) -> bool:
+    changed = getattr(instance, "_changed_fields", None)
+    if changed is None:
+        # pre_save を経ていない（post_save.send を直接呼んだ等）場合は変更ありとみなす
+        return True
+    return bool(changed.intersection(fields))
+
 
 @receiver(post_save, sender=User)
 def attach_referral_on_signup(
@@ -32,26 +79,17 @@ def attach_referral_on_signup(
 def sync_artwork_denorm_on_user_update(
     sender: Any, instance: User, created: bool, **kwargs: Any
 ) -> None:
-    """Keep Artwork.denormalized creator fields in sync when a User changes.
+    """Keep Artwork / ShopProduct denormalized creator fields in sync when a User changes.
 
-    This updates all artworks created by the user to reflect the latest
-    display_name, avatar_url and external_id so the frontend can rely on
-    denormalized fields without joins.
+    表示名・アバター・external_id が変わった保存だけを対象に、コミット後に
+    users.denorm でまとめて反映する（ログイン等の保存では何もしない）。
     """
-    # Avoid heavy operations on create when no artworks exist yet
+    if created or not user_fields_changed(instance, *DENORM_SOURCE_FIELDS):
+        return
     try:
-        # Import lazily to avoid circular import at module import time
-        from marketplace.models import Artwork  # type: ignore
-
-        # Build update values
-        update_vals: Dict[str, Any] = {
-            "creator_display_name": instance.display_name or instance.username,
-            "creator_avatar_url": instance.avatar_url or "",
-            "creator_external_id": instance.external_id,
-        }
-
-        # Perform bulk update on all artworks by this creator
-        Artwork.objects.filter(creator_id=instance.pk).update(**update_vals)
+        from .denorm import schedule_user_denorm
+
+        schedule_user_denorm(instance.pk)
     except Exception:
         # Best-effort: do not raise from signal
         return
@@ -61,7 +99,13 @@ def sync_artwork_denorm_on_user_update(
 def ensure_paid_member_referral_code(
     sender: Any, instance: User, created: bool, **kwargs: Any
 ) -> None:
-    """有料会員に紹介コードを付与する。"""
+    """有料会員に紹介コードを付与する（新規作成・プラン変更時のみ）。
+
+    プランが変わらない保存ではクエリを発行しない。コード未発行の既存会員は
+    provision_referral_codes コマンドでまとめて発行する。
+    """
+    if not user_fields_changed(instance, "subscription_plan"):
+        return
     try:
         from marketplace.referral_service import ensure_referral_code
 
@@ -7,10 +7,13 @@ import uuid
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, router, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 USERNAME_MAX_LENGTH = 150
 USERNAME_PATTERN = re.compile(r"[^a-z0-9_]+")
+USERNAME_SAVE_ATTEMPTS = 3
 
 
 def normalize_username(raw: str | None, *, fallback: str) -> str:
@@ -22,18 +25,72 @@ def normalize_username(raw: str | None, *, fallback: str) -> str:
 
 
 def unique_username(base: str) -> str:
+    """base が空いていれば base、使用中なら base_2, base_3 … の最小の空き（1 クエリ）。"""
+    return allocate_usernames([base])[0]
+
+
+def _username_taken_by_other(user: Any) -> bool:
+    return (
+        type(user)._default_manager.filter(username=user.username).exclude(pk=user.pk).exists()
+    )
+
+
+def save_with_unique_username(user: Any, *, attempts: int = USERNAME_SAVE_ATTEMPTS) -> None:
+    """保存時にユーザー名の一意制約に当たったら（同時登録）、割り当て直して再試行する。
+
+    email / external_id など他の一意制約違反はそのまま送出する。
+    """
+    base = user.username
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                user.save()
+            return
+        except IntegrityError:
+            if attempt == attempts - 1 or not _username_taken_by_other(user):
+                raise
+            user.username = unique_username(base)
+
+
+def _suffixed(base: str, index: int) -> str:
+    suffix = f"_{index}"
+    return f"{base[: USERNAME_MAX_LENGTH - len(suffix)]}{suffix}"
+
+
+def _taken_usernames(base: str) -> set[str]:
+    """使用済みの base / base_<数字>（1 クエリ）。"user" のような短い base でも他の名前は読まない。"""
     User = get_user_model()
-    if not User.objects.filter(username=base).exists():
-        return base
+    # 長い base は _suffixed で切り詰められるので、接尾辞ぶん短い接頭辞で検索する
+    prefix = base[: USERNAME_MAX_LENGTH - 8]
+    if prefix == base:
+        pattern = rf"^{re.escape(base)}(_[0-9]+)?$"
+    else:
+        pattern = rf"^({re.escape(base)}|{re.escape(prefix)}.*_[0-9]+)$"
+    # startswith は username の LIKE 用インデックスで範囲を絞り、regex で返す行を限定する
+    return set(
+        User.objects.filter(username__startswith=prefix, username__regex=pattern).values_list(
+            "username", flat=True
+        )
+    )
 
-    for index in range(2, 1000):
-        suffix = f"_{index}"
-        trimmed = base[: USERNAME_MAX_LENGTH - len(suffix)]
-        candidate = f"{trimmed}{suffix}"
-        if not User.objects.filter(username=candidate).exists():
-            return candidate
 
-    return f"user_{uuid.uuid4().hex[:8]}"
+def allocate_usernames(bases: list[str]) -> list[str]:
+    """bases の順に一意なユーザー名を割り当てる（ベース名ごとに 1 クエリ、同一バッチ内も重複なし）。"""
+    taken_by_base: dict[str, set[str]] = {}
+    allocated: list[str] = []
+    in_batch: set[str] = set()
+    for base in bases:
+        if base not in taken_by_base:
+            taken_by_base[base] = _taken_usernames(base)
+        taken = taken_by_base[base]
+        candidate = base
+        index = 2
+        while candidate in taken or candidate in in_batch:
+            candidate = _suffixed(base, index)
+            index += 1
+        in_batch.add(candidate)
+        allocated.append(candidate)
+    return allocated
 
 
 def _parse_supabase_uuid(value: str | None) -> uuid.UUID | None:
@@ -63,6 +120,33 @@ def _find_existing_user(
     return None
 
 
+def _apply_sync_fields(
+    user: Any,
+    *,
+    external_id: uuid.UUID,
+    email: str,
+    display_name: str | None,
+    phone: str | None,
+    subscription_plan: str | None,
+    referral_code_used: str | None,
+    is_email_verified: bool,
+) -> None:
+    user.external_id = external_id
+    user.email = email
+    if display_name is not None:
+        user.display_name = display_name.strip()
+    if phone is not None:
+        user.phone_number = phone.strip()
+    if subscription_plan:
+        plan = subscription_plan.strip().lower() or "free"
+        if plan == "pro":
+            plan = "premium"
+        user.subscription_plan = plan
+    user.is_email_verified = bool(is_email_verified)
+    if referral_code_used and not user.referral_code_used:
+        user.referral_code_used = referral_code_used.strip()
+
+
 @transaction.atomic
 def sync_supabase_user(
     *,
@@ -106,25 +190,256 @@ def sync_supabase_user(
     ).exclude(pk=user.pk).exists():
         user.username = desired_username
 
-    user.external_id = parsed_id
-    user.email = normalized_email
-    if display_name is not None:
-        user.display_name = display_name.strip()
-    if phone is not None:
-        user.phone_number = phone.strip()
-    if subscription_plan:
-        plan = subscription_plan.strip().lower() or "free"
-        if plan == "pro":
-            plan = "premium"
-        user.subscription_plan = plan
-    user.is_email_verified = bool(is_email_verified)
-    if referral_code_used and not user.referral_code_used:
-        user.referral_code_used = referral_code_used.strip()
+    _apply_sync_fields(
+        user,
+        external_id=parsed_id,
+        email=normalized_email,
+        display_name=display_name,
+        phone=phone,
+        subscription_plan=subscription_plan,
+        referral_code_used=referral_code_used,
+        is_email_verified=is_email_verified,
+    )
+
+    save_with_unique_username(user)
+    return user, created
 
+
+SYNC_BATCH_FIELDS = (
+    "username",
+    "external_id",
+    "email",
+    "display_name",
+    "phone_number",
+    "subscription_plan",
+    "subscription",
+    "is_email_verified",
+    "referral_code_used",
+)
+
+
+BATCH_OPTIONAL_STRING_FIELDS = (
+    "username",
+    "display_name",
+    "phone",
+    "subscription_plan",
+    "referral_code_used",
+)
+
+
+def _validate_batch_item(item: Any) -> tuple[uuid.UUID, str]:
+    if not isinstance(item, dict):
+        raise ValueError("each user must be an object")
+    raw_email = item.get("email") or ""
+    raw_id = item.get("supabase_user_id") or ""
+    if not isinstance(raw_email, str) or not isinstance(raw_id, str):
+        raise ValueError("supabase_user_id and email must be strings")
+    for field in BATCH_OPTIONAL_STRING_FIELDS:
+        if item.get(field) is not None and not isinstance(item[field], str):
+            raise ValueError(f"{field} must be a string")
+    normalized_email = raw_email.strip().lower()
+    supabase_user_id = raw_id.strip()
+    if not supabase_user_id or not normalized_email:
+        raise ValueError("supabase_user_id and email are required")
+    parsed_id = _parse_supabase_uuid(supabase_user_id)
+    if not parsed_id:
+        raise ValueError("supabase_user_id must be a valid UUID")
+    return parsed_id, normalized_email
+
+
+def _sync_kwargs(item: dict[str, Any]) -> dict[str, Any]:
+    """1 件ずつ / まとめての同期で共通の入力解釈（display_name は sync_supabase_user と同じくそのまま渡す）。"""
+    return {
+        "display_name": item.get("display_name"),
+        "phone": item.get("phone") or None,
+        "subscription_plan": item.get("subscription_plan") or "free",
+        "referral_code_used": item.get("referral_code_used") or None,
+        "is_email_verified": bool(item.get("is_email_verified")),
+    }
+
+
+def _sync_batch_one_by_one(
+    items: list[tuple[int, dict[str, Any], uuid.UUID, str]],
+) -> list[dict[str, Any]]:
+    results = []
+    for index, item, parsed_id, email in items:
+        try:
+            user, created = sync_supabase_user(
+                supabase_user_id=str(parsed_id),
+                email=email,
+                username=item.get("username") or None,
+                **_sync_kwargs(item),
+            )
+        except (ValueError, IntegrityError) as exc:
+            results.append({"index": index, "ok": False, "error": str(exc)})
+            continue
+        results.append(_batch_result(index, user, created))
+    return results
+
+
+def _batch_result(index: int, user: Any, created: bool) -> dict[str, Any]:
+    return {
+        "index": index,
+        "ok": True,
+        "created": created,
+        "django_user_id": user.pk,
+        "username": user.username,
+        "subscription_plan": user.subscription_plan,
+    }
+
+
+def sync_supabase_users(items: list[Any]) -> list[dict[str, Any]]:
+    """複数の Supabase ユーザーをまとめて upsert する（__in 検索 + bulk_create / bulk_update）。
+
+    既存ユーザーは読み込んだ値と比べて変わった行だけを更新する。bulk 系は save() と
+    シグナルを通らないので、User の post_save と同じ後続処理（EXP 付与・紹介コード・
+    非正規化フィールドの反映）は _after_batch_write で直接呼ぶ。戻り値は入力順の結果。
+    """
+    User = get_user_model()
+    results: dict[int, dict[str, Any]] = {}
+    valid: list[tuple[int, dict[str, Any], uuid.UUID, str]] = []
+    seen: set[Any] = set()
+    for index, item in enumerate(items):
+        try:
+            parsed_id, email = _validate_batch_item(item)
+        except ValueError as exc:
+            results[index] = {"index": index, "ok": False, "error": str(exc)}
+            continue
+        if parsed_id in seen or email in seen:
+            results[index] = _duplicate_result(index)
+            continue
+        seen.update((parsed_id, email))
+        valid.append((index, item, parsed_id, email))
+
+    if valid:
+        for result in _sync_valid_batch(User, valid):
+            results[result["index"]] = result
+    return [results[index] for index in sorted(results)]
+
+
+def _duplicate_result(index: int) -> dict[str, Any]:
+    return {"index": index, "ok": False, "error": "duplicate user in batch"}
+
+
+def _after_batch_write(user: Any, *, created: bool, changed: set[str]) -> None:
+    """User の post_save receiver と同じ後続処理を、bulk で保存したユーザーに直接行う。"""
+    from gamification.leaderboard import move_plan_scores
+    from gamification.services import award_profile_completion_exp, award_signup_exp
+    from marketplace.referral_service import attach_referral_code, ensure_referral_code
+
+    from .denorm import schedule_user_denorm
+    from .signals import DENORM_SOURCE_FIELDS
+
+    if created:
+        if user.referral_code_used:
+            attach_referral_code(user, user.referral_code_used)
+        award_signup_exp(user)
+    elif changed.intersection(DENORM_SOURCE_FIELDS):
+        schedule_user_denorm(user.pk)
+    if created or "subscription_plan" in changed:
+        ensure_referral_code(user)
+        if not created:
+            move_plan_scores(user)
+    award_profile_completion_exp(user)
+
+
+def _sync_valid_batch(
+    User: Any,
+    valid: list[tuple[int, dict[str, Any], uuid.UUID, str]],
+) -> list[dict[str, Any]]:
+    by_external = {
+        user.external_id: user
+        for user in User.objects.filter(external_id__in=[parsed_id for _i, _item, parsed_id, _e in valid])
+    }
+    by_email = {
+        user.email.lower(): user
+        for user in User.objects.annotate(email_upper=Upper("email")).filter(
+            email_upper__in=[email.upper() for *_rest, email in valid]
+        )
+    }
+
+    duplicates: list[dict[str, Any]] = []
+    planned: list[tuple[int, dict[str, Any], uuid.UUID, str, Any, str]] = []
+    resolved: set[int] = set()
+    for index, item, parsed_id, email in valid:
+        user = by_external.get(parsed_id) or by_email.get(email)
+        # external_id と email が別々の入力から同じユーザーに解決された場合は 2 件目を弾く
+        if user is not None:
+            if user.pk in resolved:
+                duplicates.append(_duplicate_result(index))
+                continue
+            resolved.add(user.pk)
+        desired = normalize_username(item.get("username"), fallback=email.split("@")[0])
+        planned.append((index, item, parsed_id, email, user, desired))
+
+    # 既存ユーザーのユーザー名変更は、空いている場合だけ（まとめて 1 クエリで確認）
+    renames = {desired for *_rest, user, desired in planned if user and user.username != desired}
+    taken = set(User.objects.filter(username__in=renames).values_list("username", flat=True))
+    new_usernames = iter(allocate_usernames([desired for *_rest, user, desired in planned if not user]))
+
+    now = timezone.now()
+    created_rows: list[tuple[int, dict[str, Any], uuid.UUID, str, Any]] = []
+    updated_rows: list[tuple[int, dict[str, Any], uuid.UUID, str, Any, set[str]]] = []
+    unchanged: list[tuple[int, Any]] = []
+    for index, item, parsed_id, email, user, desired in planned:
+        if user is None:
+            user = User(username=next(new_usernames), email=email)
+            user.set_unusable_password()
+        loaded = {field: getattr(user, field) for field in SYNC_BATCH_FIELDS}
+        if not user._state.adding and user.username != desired and desired not in taken:
+            taken.add(desired)
+            user.username = desired
+        _apply_sync_fields(user, external_id=parsed_id, email=email, **_sync_kwargs(item))
+        # User.save() と同じ正規化（bulk 系は save() を通らない）
+        user.subscription_plan = (user.subscription_plan or "free").strip() or "free"
+        user.subscription = user.subscription_plan
+        if user._state.adding:
+            created_rows.append((index, item, parsed_id, email, user))
+            continue
+        changed = {field for field in SYNC_BATCH_FIELDS if getattr(user, field) != loaded[field]}
+        if changed:
+            # bulk_update は auto_now を更新しないので明示する
+            user.updated_at = now
+            updated_rows.append((index, item, parsed_id, email, user, changed))
+        else:
+            unchanged.append((index, user))
+
+    results = duplicates + [_batch_result(index, user, False) for index, user in unchanged]
+    results += _write_updates(User, updated_rows)
+    results += _write_creates(User, created_rows)
+    return results
+
+
+def _write_updates(
+    User: Any,
+    rows: list[tuple[int, dict[str, Any], uuid.UUID, str, Any, set[str]]],
+) -> list[dict[str, Any]]:
+    """変わったフィールドだけを bulk_update する。一意制約に当たったらこの組だけ 1 件ずつ同期する。"""
+    if not rows:
+        return []
+    fields = sorted(set().union(*(changed for *_rest, changed in rows)) | {"updated_at"})
     try:
-        user.save()
+        with transaction.atomic(using=router.db_for_write(User)):
+            User.objects.bulk_update([user for *_rest, user, _changed in rows], fields)
+            for *_rest, user, changed in rows:
+                _after_batch_write(user, created=False, changed=changed)
     except IntegrityError:
-        user.username = unique_username(user.username)
-        user.save()
+        return _sync_batch_one_by_one([(index, item, parsed_id, email) for index, item, parsed_id, email, *_rest in rows])
+    return [_batch_result(index, user, False) for index, *_rest, user, _changed in rows]
 
-    return user, created
+
+def _write_creates(
+    User: Any,
+    rows: list[tuple[int, dict[str, Any], uuid.UUID, str, Any]],
+) -> list[dict[str, Any]]:
+    """新規ユーザーを bulk_create する。同時登録などで一意制約に当たったらこの組だけ 1 件ずつ同期する。"""
+    if not rows:
+        return []
+    try:
+        with transaction.atomic(using=router.db_for_write(User)):
+            User.objects.bulk_create([user for *_rest, user in rows])
+            for *_rest, user in rows:
+                _after_batch_write(user, created=True, changed=set(SYNC_BATCH_FIELDS))
+    except IntegrityError:
+        return _sync_batch_one_by_one([(index, item, parsed_id, email) for index, item, parsed_id, email, _user in rows])
+    return [_batch_result(index, user, True) for index, *_rest, user in rows]
@@ -1,7 +1,12 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 
+@override_settings(BACKGROUND_TASKS_EAGER=True)
 class ArtworkDenormSyncTest(TestCase):
     def test_user_update_syncs_artwork_denorm(self):
         """When a User is updated, related Artwork denormalized fields should be updated."""
@@ -27,10 +32,11 @@ class ArtworkDenormSyncTest(TestCase):
         # ensure denorm is stale initially
         self.assertNotEqual(art.creator_display_name, user.display_name)
 
-        # update user profile
+        # update user profile (artworks are refreshed after commit)
         user.display_name = "Bob Updated"
         user.avatar_url = "http://example.local/new-avatar.png"
-        user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
 
         # refresh artwork and assert denormalized fields reflect user
         art.refresh_from_db()
@@ -39,6 +45,62 @@ class ArtworkDenormSyncTest(TestCase):
         # external_id should be copied (both are UUIDs) - compare stringified
         self.assertEqual(str(art.creator_external_id), str(user.external_id))
 
+    def test_unrelated_user_save_does_not_schedule_denorm(self):
+        user = get_user_model().objects.create_user(username="quiet", password="pw")
+
+        user.last_name = "Login"
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.save()
+
+        self.assertEqual(callbacks, [])
+
+    def test_repeated_saves_coalesce_into_one_refresh(self):
+        user = get_user_model().objects.create_user(username="busy", password="pw")
+
+        from marketplace.models import Artwork
+
+        art = Artwork.objects.create(creator=user, title="A", file_url="http://example.local/a.png")
+
+        from users import denorm
+
+        with patch("users.denorm.refresh_user_denorm", wraps=denorm.refresh_user_denorm) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for name in ("First", "Second", "Final"):
+                    user.display_name = name
+                    user.save()
+
+        refresh.assert_called_once_with([user.pk])
+        art.refresh_from_db()
+        self.assertEqual(art.creator_display_name, "Final")
+
+    def test_refresh_pages_rows_by_keyset(self):
+        from marketplace.models import Artwork
+        from users.denorm import refresh_user_denorm
+
+        user = get_user_model().objects.create_user(username="prolific", display_name="Pro", password="pw")
+        for index in range(5):
+            Artwork.objects.create(
+                creator=user,
+                title=f"A{index}",
+                file_url="http://example.local/a.png",
+                creator_display_name="OLD",
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = refresh_user_denorm([user.pk], chunk_size=2)
+
+        self.assertEqual(updated, 5)
+        self.assertFalse(Artwork.objects.exclude(creator_display_name="Pro").exists())
+        artwork_selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(f'SELECT "{Artwork._meta.db_table}"."id"')
+        ]
+        # 2 件ずつ 3 ページ。2 ページ目からは前ページ末尾の pk より後ろを読む
+        self.assertEqual(len(artwork_selects), 3)
+        self.assertIn("LIMIT 2", artwork_selects[0])
+        self.assertIn('"id" >', artwork_selects[1])
+
 
 class ReferralSignupTest(TestCase):
     def test_referral_attach_on_signup(self):
@@ -62,3 +124,250 @@ class ReferralSignupTest(TestCase):
         self.assertIsNotNone(new_user.referred_by_user)
         self.assertEqual(new_user.referred_by_user.id, referrer.id)
         self.assertEqual(ref.referred_user.id, new_user.id)
+
+
+class PlanSyncDiffTest(TestCase):
+    def _supabase_rows(self):
+        from users.models import Plan
+        from users.plan_sync import _supabase_row_from_plan
+
+        return [
+            _supabase_row_from_plan(plan, version=3, source="django")
+            for plan in Plan.objects.exclude(slug="pro").filter(is_active=True)
+        ]
+
+    @patch.dict(
+        "os.environ",
+        {"SUPABASE_URL": "https://example.supabase.co", "SUPABASE_SERVICE_ROLE_KEY": "k"},
+    )
+    def test_push_skips_unchanged_plans_and_batches_writes(self):
+        from users.models import Plan
+        from users.plan_sync import _ensure_django_catalog, push_django_plans_to_supabase
+
+        _ensure_django_catalog()
+        rows = self._supabase_rows()
+
+        with patch("users.plan_sync.requests") as http:
+            http.get.return_value.ok = True
+            http.get.return_value.json.return_value = rows
+            result = push_django_plans_to_supabase()
+        self.assertEqual(http.get.call_count, 1)
+        http.post.assert_not_called()
+        self.assertEqual((result["pushed"], result["archived"]), (0, 0))
+
+        Plan.objects.filter(slug="standard").update(price=1234)
+        with patch("users.plan_sync.requests") as http:
+            http.get.return_value.ok = True
+            http.get.return_value.json.return_value = rows
+            http.post.return_value.ok = True
+            http.post.return_value.status_code = 201
+            result = push_django_plans_to_supabase()
+
+        self.assertEqual((result["pushed"], result["archived"]), (1, 1))
+        self.assertEqual(http.post.call_count, 2)
+        archive_payload = http.post.call_args_list[0].kwargs["json"]
+        upsert_payload = http.post.call_args_list[1].kwargs["json"]
+        self.assertEqual([row["slug"] for row in archive_payload], ["standard"])
+        self.assertEqual(
+            [(row["slug"], row["version"], row["price_yen"]) for row in upsert_payload],
+            [("standard", 4, 1234)],
+        )
+
+
+class AnnouncementRecipientTest(TestCase):
+    @patch.dict(
+        "os.environ",
+        {"SUPABASE_URL": "https://example.supabase.co", "SUPABASE_SERVICE_ROLE_KEY": "k"},
+    )
+    def test_email_recipient_respects_opt_out(self):
+        from users.operations.announcement_service import resolve_announcement_recipient
+
+        with patch("users.operations.announcement_service.requests") as http:
+            http.get.return_value.status_code = 200
+            http.get.return_value.json.side_effect = [{"users": [{"id": "u1"}]}, []]
+            self.assertEqual(resolve_announcement_recipient("fan@example.com"), "u1")
+
+            http.get.return_value.json.side_effect = [{"users": [{"id": "u1"}]}, [{"user_id": "u1"}]]
+            self.assertIsNone(resolve_announcement_recipient("fan@example.com"))
+
+    @patch.dict(
+        "os.environ",
+        {"SUPABASE_URL": "https://example.supabase.co", "SUPABASE_SERVICE_ROLE_KEY": "k"},
+    )
+    def test_recipients_are_keyset_paged_with_server_side_opt_out(self):
+        from users.operations.announcement_service import iter_announcement_recipient_batches
+
+        pages = [[{"id": "a"}, {"id": "b"}], [{"id": "c"}]]
+        with patch("users.operations.announcement_service.requests") as http:
+            http.get.return_value.status_code = 200
+            http.get.return_value.json.side_effect = pages
+            batches = list(iter_announcement_recipient_batches(target="creators", page_size=2))
+
+        self.assertEqual(batches, [["a", "b"], ["c"]])
+        first, second = (call.kwargs["params"] for call in http.get.call_args_list)
+        self.assertEqual(first["user_settings"], "is.null")
+        self.assertEqual(first["user_settings.notify_announcement"], "is.false")
+        self.assertEqual(first["is_creator"], "eq.true")
+        self.assertNotIn("id", first)
+        self.assertEqual(second["id"], "gt.b")
+
+    @patch.dict(
+        "os.environ",
+        {"SUPABASE_URL": "https://example.supabase.co", "SUPABASE_SERVICE_ROLE_KEY": "k"},
+    )
+    def test_recipient_count_uses_head_request(self):
+        from users.operations.announcement_service import count_announcement_recipients
+
+        with patch("users.operations.announcement_service.requests") as http:
+            http.head.return_value.status_code = 206
+            http.head.return_value.headers = {"Content-Range": "*/3573"}
+            total = count_announcement_recipients(target="all")
+
+        self.assertEqual(total, 3573)
+        http.get.assert_not_called()
+        call = http.head.call_args
+        self.assertEqual(call.kwargs["headers"]["Prefer"], "count=exact")
+        self.assertEqual(call.kwargs["params"]["user_settings"], "is.null")
+        self.assertNotIn("limit", call.kwargs["params"])
+
+
+class AnnouncementDeliveryTest(TestCase):
+    def test_failed_fanout_delivery_resumes_from_last_delivered_page(self):
+        from users.models import AnnouncementDelivery
+        from users.operations import announcement_delivery
+        from users.operations.announcement_service import SupabaseAnnouncementError
+
+        pages = {None: [["a", "b"], ["c", "d"]], "b": [["c", "d"]]}
+        requested_after = []
+
+        def fake_pages(*, target, email, after, page_size):
+            requested_after.append(after)
+            return iter(pages[after])
+
+        inserted = []
+        failures = ["c"]
+
+        def fake_insert(chunk, *, delivery_key):
+            user_id = chunk[0]["user_id"]
+            if user_id in failures:
+                failures.remove(user_id)
+                raise SupabaseAnnouncementError("temporary outage")
+            inserted.extend((row["user_id"], delivery_key) for row in chunk)
+            return len(chunk)
+
+        with patch.object(
+            announcement_delivery, "iter_announcement_recipient_batches", fake_pages
+        ), patch.object(
+            announcement_delivery, "insert_announcement_rows", fake_insert
+        ), patch.object(announcement_delivery, "submit_deduplicated"):
+            delivery = announcement_delivery.enqueue_announcement_delivery(
+                title="Maintenance",
+                body="",
+                href=None,
+                target="creators",
+                mode=AnnouncementDelivery.MODE_FANOUT,
+            )
+            first = announcement_delivery.run_announcement_delivery(delivery.pk, batch_size=1)
+            second = announcement_delivery.run_announcement_delivery(delivery.pk, batch_size=1)
+
+        self.assertEqual(first.mode, AnnouncementDelivery.MODE_FANOUT)
+        self.assertEqual((first.status, first.cursor, first.delivered_count), ("failed", "b", 2))
+        self.assertEqual(second.status, AnnouncementDelivery.STATUS_COMPLETED)
+        self.assertEqual((second.delivered_count, second.batch_count, second.attempts), (4, 4, 2))
+        self.assertEqual(requested_after, [None, "b"])
+        # 失敗したページは丸ごと再送する（重複は delivery_key の一意制約で無視される）
+        self.assertEqual({user_id for user_id, _ in inserted}, {"a", "b", "c", "d"})
+        self.assertEqual({key for _, key in inserted}, {delivery.delivery_key})
+
+    def test_email_target_is_always_fanout(self):
+        from users.models import AnnouncementDelivery
+        from users.operations import announcement_delivery
+
+        with patch.object(announcement_delivery, "submit_deduplicated"):
+            delivery = announcement_delivery.enqueue_announcement_delivery(
+                title="Notice",
+                body="",
+                href=None,
+                target="email",
+                email="fan@example.com",
+                mode=AnnouncementDelivery.MODE_BROADCAST,
+            )
+
+        self.assertEqual(delivery.mode, AnnouncementDelivery.MODE_FANOUT)
+
+    def test_platform_wide_announcement_is_written_once(self):
+        from users.models import AnnouncementDelivery
+        from users.operations import announcement_delivery
+
+        with patch.object(
+            announcement_delivery, "insert_announcement_broadcast"
+        ) as insert_broadcast, patch.object(
+            announcement_delivery, "count_announcement_recipients", return_value=3573
+        ), patch.object(
+            announcement_delivery, "insert_announcement_rows"
+        ) as insert_rows, patch.object(announcement_delivery, "submit_deduplicated"):
+            delivery = announcement_delivery.enqueue_announcement_delivery(
+                title="Launch", body="", href=None, target="all", priority="critical"
+            )
+            delivery = announcement_delivery.run_announcement_delivery(delivery.pk)
+
+        self.assertEqual(delivery.mode, AnnouncementDelivery.MODE_BROADCAST)
+        self.assertEqual(delivery.status, AnnouncementDelivery.STATUS_COMPLETED)
+        insert_broadcast.assert_called_once_with(
+            audience="all",
+            title="Launch",
+            body="",
+            href=None,
+            priority="critical",
+            delivery_id=delivery.pk,
+        )
+        insert_rows.assert_not_called()
+        self.assertEqual(delivery.delivered_count, 3573)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class UserAdminChangelistQueryTest(TestCase):
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/users/user/")
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        from users.models import Plan
+
+        User = get_user_model()
+        Plan.objects.create(name="Standard", slug="standard", price=800)
+        admin_user = User.objects.create_superuser(username="ops", email="ops@example.com", password="pw")
+        self.client.force_login(admin_user)
+        referrer = User.objects.create_user(username="ref", password="pw", subscription_plan="standard")
+
+        _response, few = self._changelist_queries()
+        for index in range(10):
+            User.objects.create_user(
+                username=f"member{index}",
+                password="pw",
+                subscription_plan="standard",
+                referred_by_user=referrer,
+            )
+        response, many = self._changelist_queries()
+
+        self.assertEqual(few, many)
+        self.assertContains(response, "Standard（800円）")
+
+    def test_referred_count_does_not_group_the_changelist_count(self):
+        User = get_user_model()
+        admin_user = User.objects.create_superuser(username="ops", email="ops@example.com", password="pw")
+        self.client.force_login(admin_user)
+        referrer = User.objects.create_user(username="ref", password="pw")
+        User.objects.create_user(username="member", password="pw", referred_by_user=referrer)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/users/user/")
+
+        counts = [query["sql"] for query in queries if "COUNT(*)" in query["sql"].upper()]
+        self.assertTrue(counts)
+        self.assertFalse([sql for sql in counts if "GROUP BY" in sql.upper()])
+        self.assertEqual(
+            response.context["cl"].result_list.get(pk=referrer.pk)._referred_users_count, 1
+        )
@@ -1,7 +1,17 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
 
-from users.sync_service import normalize_username, sync_supabase_user
+import json
+from unittest import mock
+
+from users.sync_service import (
+    allocate_usernames,
+    normalize_username,
+    save_with_unique_username,
+    sync_supabase_user,
+    unique_username,
+)
 
 
 class SupabaseUserSyncTest(TestCase):
@@ -60,6 +70,261 @@ class SupabaseUserSyncTest(TestCase):
     def test_normalize_username_sanitizes_invalid_chars(self):
         self.assertEqual(normalize_username("Hello-World!", fallback="user"), "hello_world")
 
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_sync_view_queues_artwork_sync_once_per_creator(self):
+        payload = json.dumps(
+            {
+                "supabase_user_id": "66666666-6666-4666-8666-666666666666",
+                "email": "queued@example.com",
+                "username": "queued",
+            }
+        )
+        with mock.patch("marketplace.supabase_sync.sync_supabase_artworks") as sync_artworks:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.client.post("/api/v1/users/sync/", data=payload, content_type="application/json")
+            with self.captureOnCommitCallbacks(execute=True):
+                second = self.client.post("/api/v1/users/sync/", data=payload, content_type="application/json")
+
+        self.assertTrue(first.json()["artwork_sync_queued"])
+        self.assertFalse(second.json()["artwork_sync_queued"])
+        sync_artworks.assert_called_once_with(creator_id="66666666-6666-4666-8666-666666666666")
+
+    @override_settings(
+        BACKGROUND_TASKS_EAGER=True,
+        # DB キャッシュだとキー自体もロールバックされるので、トランザクション外のキャッシュで確かめる
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    )
+    def test_rolled_back_queue_does_not_claim_the_key(self):
+        from django.db import transaction
+
+        from marketplace.supabase_sync import queue_creator_artwork_sync
+
+        creator_id = "67676767-6767-4676-8676-676767676767"
+        with mock.patch("marketplace.supabase_sync.sync_supabase_artworks") as sync_artworks:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        self.assertTrue(queue_creator_artwork_sync(creator_id))
+                        raise RuntimeError("rollback")
+                except RuntimeError:
+                    pass
+            sync_artworks.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(queue_creator_artwork_sync(creator_id))
+
+        sync_artworks.assert_called_once_with(creator_id=creator_id)
+
+
+class SupabaseUserBatchSyncTest(TestCase):
+    def test_batch_endpoint_creates_and_updates_users(self):
+        User = get_user_model()
+        existing = User.objects.create_user(username="batch_old", email="Batch1@example.com", password="pw")
+        User.objects.create_user(username="taken", email="taken@example.com", password="pw")
+
+        response = self.client.post(
+            "/api/v1/users/sync/batch/",
+            data=json.dumps(
+                {
+                    "users": [
+                        {
+                            "supabase_user_id": "44444444-4444-4444-8444-444444444444",
+                            "email": "batch1@example.com",
+                            "display_name": "Batch One",
+                            "subscription_plan": "pro",
+                        },
+                        {
+                            "supabase_user_id": "55555555-5555-4555-8555-555555555555",
+                            "email": "new@example.com",
+                            "username": "taken",
+                        },
+                        {
+                            "supabase_user_id": "66666666-6666-4666-8666-666666666666",
+                            "email": "new2@example.com",
+                            "username": "taken",
+                        },
+                        {"supabase_user_id": "not-a-uuid", "email": "bad@example.com"},
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["ok"] for result in results], [True, True, True, False])
+        self.assertEqual(results[0]["django_user_id"], existing.pk)
+        existing.refresh_from_db()
+        self.assertEqual(existing.display_name, "Batch One")
+        self.assertEqual((existing.subscription_plan, existing.subscription), ("premium", "premium"))
+        self.assertEqual({results[1]["username"], results[2]["username"]}, {"taken_2", "taken_3"})
+        # bulk 保存でも post_save と同じ後続処理で新規登録 EXP が付与される
+        self.assertEqual(User.objects.get(username="taken_2").total_exp, 20)
+
+    def test_batch_reports_non_string_fields_per_item(self):
+        response = self.client.post(
+            "/api/v1/users/sync/batch/",
+            data=json.dumps(
+                {
+                    "users": [
+                        {"supabase_user_id": 123, "email": "num@example.com"},
+                        {"supabase_user_id": "77777777-7777-4777-8777-777777777777", "email": ["x"]},
+                        {
+                            "supabase_user_id": "88888888-8888-4888-8888-888888888888",
+                            "email": "ok@example.com",
+                            "display_name": True,
+                        },
+                        {"supabase_user_id": "99999999-9999-4999-8999-999999999999", "email": "ok@example.com"},
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["ok"] for result in response.json()["results"]], [False, False, False, True])
+
+    def test_integrity_fallback_reports_failures_per_item(self):
+        from users import sync_service
+
+        items = [
+            {"supabase_user_id": "aaaaaaaa-aaaa-4aaa-8aaa-aaaaaaaaaaaa", "email": "first@example.com"},
+            {"supabase_user_id": "bbbbbbbb-bbbb-4bbb-8bbb-bbbbbbbbbbbb", "email": "second@example.com"},
+        ]
+        original_sync = sync_service.sync_supabase_user
+
+        def flaky_sync(**kwargs):
+            if kwargs["email"] == "first@example.com":
+                raise IntegrityError("duplicate external_id")
+            return original_sync(**kwargs)
+
+        with mock.patch.object(get_user_model().objects, "bulk_create", side_effect=IntegrityError("race")):
+            with mock.patch.object(sync_service, "sync_supabase_user", flaky_sync):
+                results = sync_service.sync_supabase_users(items)
+
+        self.assertEqual([result["ok"] for result in results], [False, True])
+        self.assertIn("duplicate external_id", results[0]["error"])
+
+    def test_batch_writes_only_changed_users_and_bumps_updated_at(self):
+        from users.sync_service import sync_supabase_users
+
+        User = get_user_model()
+        items = [
+            {
+                "supabase_user_id": "77777777-7777-4777-8777-777777777777",
+                "email": "same@example.com",
+                "username": "same",
+                "display_name": "Same",
+            },
+            {
+                "supabase_user_id": "88888888-8888-4888-8888-888888888888",
+                "email": "edit@example.com",
+                "username": "edit",
+                "display_name": "Before",
+            },
+        ]
+        sync_supabase_users(items)
+        stamps = dict(User.objects.values_list("username", "updated_at"))
+
+        items[1]["display_name"] = ""
+        with mock.patch.object(User.objects, "bulk_update", wraps=User.objects.bulk_update) as bulk_update:
+            results = sync_supabase_users(items)
+
+        self.assertEqual([result["ok"] for result in results], [True, True])
+        written, fields = bulk_update.call_args.args
+        self.assertEqual([user.username for user in written], ["edit"])
+        self.assertEqual(fields, ["display_name", "updated_at"])
+        edited = User.objects.get(username="edit")
+        # 空文字は sync_supabase_user と同じく表示名を消す
+        self.assertEqual(edited.display_name, "")
+        self.assertGreater(edited.updated_at, stamps["edit"])
+        self.assertEqual(User.objects.get(username="same").updated_at, stamps["same"])
+
+    def test_batch_rejects_items_resolving_to_the_same_user(self):
+        from users.sync_service import sync_supabase_users
+
+        User = get_user_model()
+        existing = User.objects.create_user(
+            username="twice",
+            email="twice@example.com",
+            password="pw",
+            external_id="99999999-9999-4999-8999-999999999999",
+        )
+
+        results = sync_supabase_users(
+            [
+                {"supabase_user_id": str(existing.external_id), "email": "renamed@example.com"},
+                {"supabase_user_id": "12121212-1212-4121-8121-121212121212", "email": "twice@example.com"},
+            ]
+        )
+
+        self.assertEqual([result["ok"] for result in results], [True, False])
+        self.assertEqual(results[1]["error"], "duplicate user in batch")
+        existing.refresh_from_db()
+        self.assertEqual(existing.email, "renamed@example.com")
+
+    def test_allocate_usernames_uses_one_query_per_base(self):
+        User = get_user_model()
+        User.objects.create_user(username="popular", password="pw")
+        User.objects.create_user(username="popular_2", password="pw")
+
+        with self.assertNumQueries(2):
+            names = allocate_usernames(["popular", "popular", "other"])
+
+        self.assertEqual(names, ["popular_3", "popular_4", "other"])
+
+    def test_taken_usernames_ignores_other_names_sharing_the_prefix(self):
+        from users.sync_service import _taken_usernames
+
+        User = get_user_model()
+        for username in ("user", "user_2", "username", "user_abc", "user_2_x"):
+            User.objects.create_user(username=username, password="pw")
+
+        self.assertEqual(_taken_usernames("user"), {"user", "user_2"})
+        self.assertEqual(unique_username("user"), "user_3")
+
+    def test_unique_username_uses_single_query(self):
+        User = get_user_model()
+        User.objects.create_user(username="popular", password="pw")
+        User.objects.create_user(username="popular_2", password="pw")
+
+        with self.assertNumQueries(1):
+            self.assertEqual(unique_username("popular"), "popular_3")
+
+    def test_save_retries_with_new_username_on_integrity_error(self):
+        User = get_user_model()
+        User.objects.create_user(username="racer", password="pw")
+        user = User(username="racer", email="racer@example.com")
+        original_save = User.save
+        calls = []
+
+        def flaky_save(instance, *args, **kwargs):
+            calls.append(instance.username)
+            if len(calls) == 1:
+                raise IntegrityError("duplicate username")
+            return original_save(instance, *args, **kwargs)
+
+        with mock.patch.object(User, "save", flaky_save):
+            save_with_unique_username(user)
+
+        self.assertEqual(calls, ["racer", "racer_2"])
+        self.assertTrue(User.objects.filter(username="racer_2").exists())
+
+    def test_save_does_not_retry_other_unique_violations(self):
+        User = get_user_model()
+        user = User(username="fresh", email="fresh@example.com")
+        calls = []
+
+        def failing_save(instance, *args, **kwargs):
+            calls.append(instance.username)
+            raise IntegrityError("duplicate external_id")
+
+        with mock.patch.object(User, "save", failing_save):
+            with self.assertRaises(IntegrityError):
+                save_with_unique_username(user)
+
+        self.assertEqual(calls, ["fresh"])
+
 
 class ReferralSyncTest(TestCase):
     def test_referral_code_used_triggers_attachment(self):
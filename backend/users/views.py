@@ -5,10 +5,12 @@ from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 import json
 
-from marketplace.referral_service import ensure_referral_code, is_paid_member
-from marketplace.supabase_sync import SupabaseSyncError, sync_supabase_artworks
+from marketplace.referral_service import ensure_referral_code, get_open_referral, is_paid_member
+from marketplace.supabase_sync import queue_creator_artwork_sync
 from users.plan_sync import PlanSyncError, push_django_plans_to_supabase, sync_plans_bidirectional
-from users.sync_service import sync_supabase_user
+from users.sync_service import sync_supabase_user, sync_supabase_users
+
+MAX_USER_SYNC_BATCH = 500
 
 
 def _authorize_internal(request) -> bool:
@@ -54,7 +56,8 @@ def referral_program_status(request):
             }
         )
 
-    referral = ensure_referral_code(user)
+    # 発行済みならインデックス 1 回の読み取りで返す
+    referral = get_open_referral(user) or ensure_referral_code(user)
     return JsonResponse(
         {
             "eligible": True,
@@ -102,11 +105,8 @@ def sync_supabase_user_view(request):
     except ValueError as exc:
         return JsonResponse({"error": str(exc)}, status=400)
 
-    artwork_sync = None
-    try:
-        artwork_sync = sync_supabase_artworks(creator_id=supabase_user_id)
-    except SupabaseSyncError:
-        artwork_sync = None
+    # 作品の同期は応答後に回す（同じクリエイターの連続呼び出しは 1 回にまとまる）
+    artwork_sync_queued = queue_creator_artwork_sync(str(user.external_id or supabase_user_id))
 
     return JsonResponse(
         {
@@ -115,7 +115,41 @@ def sync_supabase_user_view(request):
             "django_user_id": user.pk,
             "username": user.username,
             "subscription_plan": user.subscription_plan,
-            "artwork_sync": artwork_sync,
+            "artwork_sync_queued": artwork_sync_queued,
+        }
+    )
+
+
+@csrf_exempt
+@require_POST
+def sync_supabase_users_batch_view(request):
+    """Next.js から複数の Supabase ユーザーをまとめて同期する（移行・バックフィル用）。
+
+    作品の同期は行わない（必要なら /api/v1/catalog/sync/ をまとめて呼ぶ）。
+    """
+    if not _authorize_internal(request):
+        return JsonResponse({"error": "unauthorized"}, status=401)
+
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "invalid json"}, status=400)
+
+    users = body.get("users") if isinstance(body, dict) else None
+    if not isinstance(users, list) or not users:
+        return JsonResponse({"error": "users must be a non-empty array"}, status=400)
+    if len(users) > MAX_USER_SYNC_BATCH:
+        return JsonResponse(
+            {"error": f"users must contain at most {MAX_USER_SYNC_BATCH} items"},
+            status=400,
+        )
+
+    results = sync_supabase_users(users)
+    return JsonResponse(
+        {
+            "ok": all(result["ok"] for result in results),
+            "created": sum(1 for result in results if result.get("created")),
+            "results": results,
         }
     )
 
@@ -7,6 +7,7 @@ import { useContent, useLocale } from "@/components/providers/locale-provider";
 import { CollabRespondButtons } from "@/components/gallery/collab-respond-buttons";
 import { createClient, hasBrowserSupabaseConfig } from "@/lib/supabase/client";
 import { notificationKindLabel } from "@/lib/notifications/notification-labels";
+import { markNotificationRead } from "@/lib/notifications/mark-notification";
 import type { CollabNotification } from "@/lib/notifications/get-notifications";
 import type { UserNotification } from "@/types/database";
 
@@ -34,6 +35,14 @@ export function NotificationBell({
 
     const supabase = createClient();
 
+    function prepend(row: CollabNotification) {
+      setNotifications((items) => {
+        if (items.some((item) => item.id === row.id)) return items;
+        return [row, ...items].slice(0, 20);
+      });
+      setUnreadCount((count) => count + 1);
+    }
+
     const channel = supabase
       .channel(`notifications:${userId}`)
       .on(
@@ -47,12 +56,26 @@ export function NotificationBell({
         (payload) => {
           const row = payload.new as UserNotification;
           if (row.is_read) return;
-
-          setNotifications((items) => {
-            if (items.some((item) => item.id === row.id)) return items;
-            return [row as CollabNotification, ...items].slice(0, 20);
+          prepend(row as CollabNotification);
+        },
+      )
+      .on(
+        "postgres_changes",
+        {
+          event: "INSERT",
+          schema: "public",
+          table: "announcement_broadcasts",
+        },
+        async (payload) => {
+          const broadcastId = (payload.new as { id: string }).id;
+          // 配信対象（受信設定・登録日）の判定は読み取り RPC に任せる
+          const { data } = await supabase.rpc("get_broadcast_announcements", {
+            p_limit: 1,
+            p_unread_only: true,
           });
-          setUnreadCount((count) => count + 1);
+          const row = (data as CollabNotification[] | null)?.[0];
+          if (!row || row.id !== broadcastId) return;
+          prepend({ ...row, source: "broadcast" });
         },
       )
       .on(
@@ -87,12 +110,11 @@ export function NotificationBell({
     router.refresh();
   }
 
-  async function markRead(id: string) {
+  async function markRead(item: CollabNotification) {
     if (!hasBrowserSupabaseConfig()) return;
 
-    const supabase = createClient();
-    await supabase.from("user_notifications").update({ is_read: true }).eq("id", id);
-    setNotifications((items) => items.filter((item) => item.id !== id));
+    await markNotificationRead(item);
+    setNotifications((items) => items.filter((entry) => entry.id !== item.id));
     setUnreadCount((count) => Math.max(0, count - 1));
     router.refresh();
   }
@@ -171,7 +193,7 @@ export function NotificationBell({
                       {item.kind !== "collab_request" && !item.href && (
                         <button
                           type="button"
-                          onClick={() => markRead(item.id)}
+                          onClick={() => markRead(item)}
                           className="eldonia-btn-ghost mt-2 text-xs"
                         >
                           {forms.markRead}
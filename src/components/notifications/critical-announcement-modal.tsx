@@ -4,6 +4,7 @@ import Link from "next/link";
 import { useCallback, useEffect, useState, useSyncExternalStore } from "react";
 import { createPortal } from "react-dom";
 import { createClient, hasBrowserSupabaseConfig } from "@/lib/supabase/client";
+import { markNotificationRead } from "@/lib/notifications/mark-notification";
 import type { UserNotification } from "@/types/database";
 
 function subscribe() {
@@ -55,6 +56,26 @@ export function CriticalAnnouncementModal({
           setDismissedId(null);
         },
       )
+      .on(
+        "postgres_changes",
+        {
+          event: "INSERT",
+          schema: "public",
+          table: "announcement_broadcasts",
+        },
+        async (payload) => {
+          const broadcast = payload.new as { id: string; priority?: string };
+          if (broadcast.priority !== "critical") return;
+          const { data } = await supabase.rpc("get_broadcast_announcements", {
+            p_limit: 1,
+            p_critical_only: true,
+          });
+          const row = (data as UserNotification[] | null)?.[0];
+          if (!row || row.id !== broadcast.id) return;
+          setLive({ ...row, source: "broadcast" });
+          setDismissedId(null);
+        },
+      )
       .subscribe();
 
     return () => {
@@ -68,13 +89,7 @@ export function CriticalAnnouncementModal({
     const id = visible.id;
     try {
       if (hasBrowserSupabaseConfig()) {
-        const supabase = createClient();
-        const now = new Date().toISOString();
-        await supabase
-          .from("user_notifications")
-          .update({ dismissed_at: now, is_read: true })
-          .eq("id", id)
-          .eq("user_id", userId);
+        await markNotificationRead({ ...visible, user_id: userId }, { dismiss: true });
       }
       setDismissedId(id);
     } finally {
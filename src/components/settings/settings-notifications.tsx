@@ -5,7 +5,10 @@ import { useMemo, useState } from "react";
 import { useRouter } from "next/navigation";
 import { useContent, useLocale } from "@/components/providers/locale-provider";
 import { CollabRespondButtons } from "@/components/gallery/collab-respond-buttons";
-import { createClient } from "@/lib/supabase/client";
+import {
+  markAllNotificationsRead,
+  markNotificationRead,
+} from "@/lib/notifications/mark-notification";
 import { intlLocale } from "@/lib/i18n/content/messages";
 import {
   matchesNotificationFilter,
@@ -37,20 +40,14 @@ export function SettingsNotifications({
     [initialNotifications, filter],
   );
 
-  async function markRead(id: string) {
-    const supabase = createClient();
-    await supabase.from("user_notifications").update({ is_read: true }).eq("id", id);
+  async function markRead(item: UserNotification) {
+    await markNotificationRead(item);
     router.refresh();
   }
 
   async function markAllRead() {
     setLoading(true);
-    const supabase = createClient();
-    await supabase
-      .from("user_notifications")
-      .update({ is_read: true })
-      .eq("user_id", userId)
-      .eq("is_read", false);
+    await markAllNotificationsRead(userId);
     setLoading(false);
     router.refresh();
   }
@@ -142,7 +139,7 @@ export function SettingsNotifications({
                   {!item.is_read && item.kind !== "collab_request" && (
                     <button
                       type="button"
-                      onClick={() => markRead(item.id)}
+                      onClick={() => markRead(item)}
                       className="eldonia-btn-secondary text-xs"
                     >
                       {forms.markRead}
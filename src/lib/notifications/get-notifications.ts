@@ -5,36 +5,77 @@ export type CollabNotification = UserNotification & {
   collab_request_id: string | null;
 };
 
-export async function getHeaderNotifications(
-  userId: string,
-): Promise<CollabNotification[]> {
-  const supabase = await createClient();
+type SupabaseServerClient = Awaited<ReturnType<typeof createClient>>;
+
+type BroadcastQuery = {
+  limit: number;
+  unreadOnly?: boolean;
+  criticalOnly?: boolean;
+};
 
-  const { data, error } = await supabase
-    .from("user_notifications")
-    .select("*")
-    .eq("user_id", userId)
-    .eq("is_read", false)
-    .order("created_at", { ascending: false })
-    .limit(20);
+/** 全体告知（announcement_broadcasts）を user_notifications と同じ形で取得。 */
+export async function getBroadcastAnnouncements(
+  supabase: SupabaseServerClient,
+  { limit, unreadOnly = false, criticalOnly = false }: BroadcastQuery,
+): Promise<CollabNotification[]> {
+  const { data, error } = await supabase.rpc("get_broadcast_announcements", {
+    p_limit: limit,
+    p_unread_only: unreadOnly,
+    p_critical_only: criticalOnly,
+  });
 
   if (error || !data) {
     return [];
   }
 
-  return data as CollabNotification[];
+  return (data as CollabNotification[]).map((row) => ({ ...row, source: "broadcast" }));
+}
+
+/** created_at の新しい順に結合して先頭 limit 件。 */
+export function mergeNotifications<T extends UserNotification>(
+  direct: T[],
+  broadcast: T[],
+  limit: number,
+): T[] {
+  return [...direct, ...broadcast]
+    .sort((a, b) => b.created_at.localeCompare(a.created_at))
+    .slice(0, limit);
+}
+
+export async function getHeaderNotifications(
+  userId: string,
+): Promise<CollabNotification[]> {
+  const supabase = await createClient();
+
+  const [{ data, error }, broadcast] = await Promise.all([
+    supabase
+      .from("user_notifications")
+      .select("*")
+      .eq("user_id", userId)
+      .eq("is_read", false)
+      .order("created_at", { ascending: false })
+      .limit(20),
+    getBroadcastAnnouncements(supabase, { limit: 20, unreadOnly: true }),
+  ]);
+
+  const direct = error || !data ? [] : (data as CollabNotification[]);
+  return mergeNotifications(direct, broadcast, 20);
 }
 
 export async function getUnreadNotificationCount(userId: string): Promise<number> {
   const supabase = await createClient();
 
-  const { count } = await supabase
-    .from("user_notifications")
-    .select("*", { count: "exact", head: true })
-    .eq("user_id", userId)
-    .eq("is_read", false);
+  const [{ count }, broadcastRes] = await Promise.all([
+    supabase
+      .from("user_notifications")
+      .select("*", { count: "exact", head: true })
+      .eq("user_id", userId)
+      .eq("is_read", false),
+    supabase.rpc("count_unread_broadcast_announcements"),
+  ]);
 
-  return count ?? 0;
+  const broadcastCount = broadcastRes.error ? 0 : Number(broadcastRes.data ?? 0);
+  return (count ?? 0) + broadcastCount;
 }
 
 /** Latest undismissed critical announcement for modal display. */
@@ -43,20 +84,20 @@ export async function getCriticalAnnouncement(
 ): Promise<UserNotification | null> {
   const supabase = await createClient();
 
-  const { data, error } = await supabase
-    .from("user_notifications")
-    .select("*")
-    .eq("user_id", userId)
-    .eq("kind", "announcement")
-    .eq("priority", "critical")
-    .is("dismissed_at", null)
-    .order("created_at", { ascending: false })
-    .limit(1)
-    .maybeSingle();
-
-  if (error || !data) {
-    return null;
-  }
+  const [{ data, error }, broadcast] = await Promise.all([
+    supabase
+      .from("user_notifications")
+      .select("*")
+      .eq("user_id", userId)
+      .eq("kind", "announcement")
+      .eq("priority", "critical")
+      .is("dismissed_at", null)
+      .order("created_at", { ascending: false })
+      .limit(1)
+      .maybeSingle(),
+    getBroadcastAnnouncements(supabase, { limit: 1, criticalOnly: true }),
+  ]);
 
-  return data as UserNotification;
+  const direct = error || !data ? [] : [data as UserNotification];
+  return mergeNotifications(direct, broadcast, 1)[0] ?? null;
 }
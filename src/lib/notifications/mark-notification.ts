@@ -0,0 +1,46 @@
+import { createClient } from "@/lib/supabase/client";
+import type { UserNotification } from "@/types/database";
+
+type MarkOptions = {
+  /** 最重要モーダルを閉じた（dismissed_at も記録） */
+  dismiss?: boolean;
+};
+
+/** 通知を既読にする。全体告知は読み取り状態テーブルへ RPC で記録する。 */
+export async function markNotificationRead(
+  item: Pick<UserNotification, "id" | "user_id" | "source">,
+  { dismiss = false }: MarkOptions = {},
+): Promise<void> {
+  const supabase = createClient();
+
+  if (item.source === "broadcast") {
+    await supabase.rpc("mark_broadcast_announcement", {
+      p_broadcast_id: item.id,
+      p_dismiss: dismiss,
+    });
+    return;
+  }
+
+  const patch = dismiss
+    ? { dismissed_at: new Date().toISOString(), is_read: true }
+    : { is_read: true };
+  await supabase
+    .from("user_notifications")
+    .update(patch)
+    .eq("id", item.id)
+    .eq("user_id", item.user_id);
+}
+
+/** 自分宛ての通知と全体告知をすべて既読にする。 */
+export async function markAllNotificationsRead(userId: string): Promise<void> {
+  const supabase = createClient();
+
+  await Promise.all([
+    supabase
+      .from("user_notifications")
+      .update({ is_read: true })
+      .eq("user_id", userId)
+      .eq("is_read", false),
+    supabase.rpc("mark_all_broadcast_announcements_read"),
+  ]);
+}
@@ -5,6 +5,10 @@ import { buildRecommendations } from "@/lib/settings/recommendations";
 import { getContent } from "@/lib/i18n/content/messages";
 import { getUiLocale } from "@/lib/i18n/get-ui-locale";
 import { isBasicsComplete } from "@/lib/settings/basics-completion";
+import {
+  getBroadcastAnnouncements,
+  mergeNotifications,
+} from "@/lib/notifications/get-notifications";
 import type { Profile, UserNotification, UserOnboarding, UserSettings } from "@/types/database";
 import type { PlanPaymentStatus, UserPlanId } from "@/lib/plans/types";
 import { normalizePlanId } from "@/lib/plans/catalog";
@@ -79,6 +83,7 @@ export async function getSettingsHubData(
     notifRes,
     onboardingRes,
     basicsExpRes,
+    broadcastNotifications,
   ] = await Promise.all([
     supabase.from("user_settings").select("*").eq("user_id", userId).maybeSingle(),
     getPortfolioForUser(userId, { useSampleFallback: false }),
@@ -118,6 +123,7 @@ export async function getSettingsHubData(
       .eq("action_type", "profile.basics")
       .eq("reference_key", "profile.basics")
       .maybeSingle(),
+    getBroadcastAnnouncements(supabase, { limit: 50 }),
   ]);
 
   const userSettings = (settingsRes.data as UserSettings | null) ?? null;
@@ -128,7 +134,11 @@ export async function getSettingsHubData(
     ),
     paymentStatus: onboarding?.payment_status ?? "not_required",
   };
-  const notifications = notifRes.error ? [] : ((notifRes.data ?? []) as UserNotification[]);
+  const notifications = mergeNotifications(
+    notifRes.error ? [] : ((notifRes.data ?? []) as UserNotification[]),
+    broadcastNotifications,
+    50,
+  );
   const unreadCount = notifications.filter((n) => !n.is_read).length;
 
   const paidOrders = orders.filter((o) => o.status === "paid");
@@ -62,6 +62,8 @@ export type UserNotification = {
   priority?: "normal" | "critical";
   dismissed_at?: string | null;
   created_at: string;
+  /** "broadcast" = announcement_broadcasts（全体告知。既読は RPC で記録） */
+  source?: "direct" | "broadcast";
 };
 
 export type UserPlanChange = {
@@ -1628,6 +1630,22 @@ export type Database = {
         };
         Returns: string[];
       };
+      get_broadcast_announcements: {
+        Args: { p_limit?: number; p_unread_only?: boolean; p_critical_only?: boolean };
+        Returns: UserNotification[];
+      };
+      count_unread_broadcast_announcements: {
+        Args: Record<string, never>;
+        Returns: number;
+      };
+      mark_broadcast_announcement: {
+        Args: { p_broadcast_id: string; p_dismiss?: boolean };
+        Returns: undefined;
+      };
+      mark_all_broadcast_announcements_read: {
+        Args: Record<string, never>;
+        Returns: number;
+      };
     };
     Enums: {
       event_ticket_status: EventTicketStatus;
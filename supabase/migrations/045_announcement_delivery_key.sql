@@ -0,0 +1,12 @@
+-- Eldonia-Nex: idempotent announcement delivery from Django
+-- delivery_key = Django AnnouncementDelivery ("django-announcement:<id>")
+-- Re-sending a batch after a failure is ignored per user (no duplicate notifications).
+
+alter table public.user_notifications
+  add column if not exists delivery_key text null;
+
+create unique index if not exists user_notifications_user_delivery_key_uniq
+  on public.user_notifications (user_id, delivery_key);
+
+comment on column public.user_notifications.delivery_key is
+  'Django announcement delivery job key; unique per user so resumed deliveries do not duplicate';
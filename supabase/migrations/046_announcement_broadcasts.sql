@@ -0,0 +1,209 @@
+-- Eldonia-Nex: broadcast announcements (fan-out on read)
+-- target=all / creators の告知はユーザーごとに user_notifications を作らず、
+-- announcement_broadcasts に 1 行だけ保存して読み取り時に対象ユーザーへ展開する。
+-- 既読・閉じた状態は読んだユーザーの分だけ announcement_broadcast_states に保存する。
+
+-- ---------------------------------------------------------------------------
+-- 1) Tables
+-- ---------------------------------------------------------------------------
+
+create table if not exists public.announcement_broadcasts (
+  id uuid primary key default gen_random_uuid(),
+  audience text not null
+    check (audience in ('all', 'creators')),
+  title text not null,
+  body text,
+  href text,
+  priority text not null default 'normal'
+    check (priority in ('normal', 'critical')),
+  django_delivery_id bigint null unique,
+  created_at timestamptz not null default now(),
+  constraint announcement_broadcasts_title_length check (char_length(title) between 1 and 120)
+);
+
+create index if not exists announcement_broadcasts_created_idx
+  on public.announcement_broadcasts (created_at desc);
+
+comment on table public.announcement_broadcasts is
+  'Platform-wide announcements stored once and resolved per user at read time';
+comment on column public.announcement_broadcasts.django_delivery_id is
+  'Django AnnouncementDelivery id (idempotent insert from the delivery worker)';
+
+create table if not exists public.announcement_broadcast_states (
+  broadcast_id uuid not null references public.announcement_broadcasts (id) on delete cascade,
+  user_id uuid not null references public.profiles (id) on delete cascade,
+  read_at timestamptz null,
+  dismissed_at timestamptz null,
+  primary key (broadcast_id, user_id)
+);
+
+create index if not exists announcement_broadcast_states_user_idx
+  on public.announcement_broadcast_states (user_id);
+
+comment on table public.announcement_broadcast_states is
+  'Per-user read / dismiss state for announcement_broadcasts (rows only for users who interacted)';
+
+-- ---------------------------------------------------------------------------
+-- 2) RLS（書き込みは service role と下の RPC のみ）
+-- ---------------------------------------------------------------------------
+
+alter table public.announcement_broadcasts enable row level security;
+alter table public.announcement_broadcast_states enable row level security;
+
+drop policy if exists "announcement_broadcasts_select_audience" on public.announcement_broadcasts;
+create policy "announcement_broadcasts_select_audience"
+  on public.announcement_broadcasts for select
+  using (
+    audience = 'all'
+    or exists (
+      select 1 from public.profiles p
+      where p.id = auth.uid() and p.is_creator
+    )
+  );
+
+drop policy if exists "announcement_broadcast_states_select_own" on public.announcement_broadcast_states;
+create policy "announcement_broadcast_states_select_own"
+  on public.announcement_broadcast_states for select using (auth.uid() = user_id);
+
+grant select on public.announcement_broadcasts to authenticated;
+grant select on public.announcement_broadcast_states to authenticated;
+
+-- ---------------------------------------------------------------------------
+-- 3) Read path RPC（user_notifications と同じ形で返す）
+-- ---------------------------------------------------------------------------
+
+create or replace function public.get_broadcast_announcements(
+  p_limit integer default 20,
+  p_unread_only boolean default false,
+  p_critical_only boolean default false
+)
+returns table (
+  id uuid,
+  user_id uuid,
+  kind text,
+  title text,
+  body text,
+  href text,
+  collab_request_id uuid,
+  is_read boolean,
+  priority text,
+  dismissed_at timestamptz,
+  created_at timestamptz
+)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select
+    b.id,
+    p.id,
+    'announcement'::text,
+    b.title,
+    b.body,
+    b.href,
+    null::uuid,
+    s.read_at is not null,
+    b.priority,
+    s.dismissed_at,
+    b.created_at
+  from public.profiles p
+  join public.announcement_broadcasts b
+    -- 登録前の告知は表示しない（従来の 1 ユーザー 1 行配信と同じ対象）
+    on b.created_at >= p.created_at
+   and (b.audience = 'all' or (b.audience = 'creators' and p.is_creator))
+  left join public.announcement_broadcast_states s
+    on s.broadcast_id = b.id and s.user_id = p.id
+  where p.id = auth.uid()
+    and not exists (
+      select 1 from public.user_settings us
+      where us.user_id = p.id and us.notify_announcement is false
+    )
+    and (not p_unread_only or s.read_at is null)
+    and (not p_critical_only or (b.priority = 'critical' and s.dismissed_at is null))
+  order by b.created_at desc
+  limit greatest(p_limit, 0);
+$$;
+
+create or replace function public.count_unread_broadcast_announcements()
+returns integer
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select count(*)::integer
+  from public.get_broadcast_announcements(1000, true, false);
+$$;
+
+-- ---------------------------------------------------------------------------
+-- 4) Read / dismiss state RPC
+-- ---------------------------------------------------------------------------
+
+create or replace function public.mark_broadcast_announcement(
+  p_broadcast_id uuid,
+  p_dismiss boolean default false
+)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  if auth.uid() is null then
+    raise exception 'not authenticated';
+  end if;
+
+  insert into public.announcement_broadcast_states (broadcast_id, user_id, read_at, dismissed_at)
+  values (
+    p_broadcast_id,
+    auth.uid(),
+    now(),
+    case when p_dismiss then now() else null end
+  )
+  on conflict (broadcast_id, user_id) do update
+    set read_at = coalesce(public.announcement_broadcast_states.read_at, excluded.read_at),
+        dismissed_at = coalesce(public.announcement_broadcast_states.dismissed_at, excluded.dismissed_at);
+end;
+$$;
+
+create or replace function public.mark_all_broadcast_announcements_read()
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_count integer;
+begin
+  if auth.uid() is null then
+    raise exception 'not authenticated';
+  end if;
+
+  insert into public.announcement_broadcast_states (broadcast_id, user_id, read_at)
+  select a.id, auth.uid(), now()
+  from public.get_broadcast_announcements(1000, true, false) a
+  on conflict (broadcast_id, user_id) do update
+    set read_at = coalesce(public.announcement_broadcast_states.read_at, excluded.read_at);
+
+  get diagnostics v_count = row_count;
+  return v_count;
+end;
+$$;
+
+grant execute on function public.get_broadcast_announcements(integer, boolean, boolean) to authenticated;
+grant execute on function public.count_unread_broadcast_announcements() to authenticated;
+grant execute on function public.mark_broadcast_announcement(uuid, boolean) to authenticated;
+grant execute on function public.mark_all_broadcast_announcements_read() to authenticated;
+
+-- ---------------------------------------------------------------------------
+-- 5) Realtime（新しい告知をベル / 最重要モーダルへ）
+-- ---------------------------------------------------------------------------
+
+do $$
+begin
+  alter publication supabase_realtime add table public.announcement_broadcasts;
+exception
+  when duplicate_object then null;
+  when undefined_object then null;
+end $$;
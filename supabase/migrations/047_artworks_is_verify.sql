@@ -0,0 +1,14 @@
+-- Eldonia-Nex: indexed classification for [verify] test artworks
+-- Admin の一括非公開はタイトルの ilike 前方一致（インデックスなし）ではなく、
+-- title から生成する is_verify 列と部分インデックスで対象を探す。
+
+alter table public.artworks
+  add column if not exists is_verify boolean
+    generated always as (lower(btrim(title)) like '[verify]%') stored;
+
+create index if not exists artworks_is_verify_public_idx
+  on public.artworks (is_public)
+  where is_verify;
+
+comment on column public.artworks.is_verify is
+  'True for "[verify] ..." test artworks (generated from title; Django Artwork.verify_kind)';